@@ -1,4 +1,8 @@
-import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'scripts'))
+import ingest  # noqa: E402
 
 # List of 50 Filipino vegetable recipes
 vegetable_recipes = [
@@ -54,83 +58,32 @@ vegetable_recipes = [
     ("Vegetable Lumpia with Sauce", "Vegetable spring rolls with sauce", 200),
 ]
 
-# Generate recipe objects
-new_recipes = []
-for idx, (meal_name, instructions_base, base_price) in enumerate(vegetable_recipes, start=101):
-    recipe = {
-        "idMeal": str(idx),
-        "strMeal": meal_name,
-        "strMealThumb": f"https://encrypted-tbn0.gstatic.com/images?q=tbn:vegetable_{idx}",
-        "strCategory": "Vegetable",
-        "strArea": "Filipino",
-        "strInstructions": f"1. Prepare the vegetables by washing and cutting into bite-sized pieces.\\n2. Heat oil in a pan or wok.\\n3. Sauté onions and garlic until fragrant.\\n4. Add the main vegetables and stir well.\\n5. Season with soy sauce, vinegar, and salt to taste.\\n6. Cook until vegetables are tender but still firm.\\n7. Serve hot with steamed rice.",
-        "strIngredient1": "Mixed Vegetables",
-        "strMeasure1": "500g",
-        "strIngredient2": "Onion",
-        "strMeasure2": "2 pieces",
-        "strIngredient3": "Garlic",
-        "strMeasure3": "4 cloves",
-        "strIngredient4": "Soy Sauce",
-        "strMeasure4": "3 tbsp",
-        "strIngredient5": "Coconut Oil",
-        "strMeasure5": "2 tbsp",
-        "strIngredient6": "Salt and Pepper",
-        "strMeasure6": "to taste",
-        "strIngredient7": "Water",
-        "strMeasure7": "1 cup",
-        "strIngredient8": "",
-        "strMeasure8": "",
-        "strIngredient9": "",
-        "strMeasure9": "",
-        "strIngredient10": "",
-        "strMeasure10": "",
-        "strYoutube": f"https://www.youtube.com/watch?v=example{idx}",
-        "calories": base_price * 2 + 150,
-        "protein": 8,
-        "carbs": 35,
-        "fat": 5,
-        "price": base_price,
-        "calories_per_serving": (base_price * 2 + 150) // 4,
-        "price_per_serving": base_price // 4,
-        "sources": [
-            "USDA FoodData Central",
-            "Local market average",
-            "Supermarket price",
-            "Approximate / local composition"
-        ],
-        "calculated_at": "2026-01-13T02:20:06.292771Z",
-        "price_min": base_price - 20,
-        "price_max": base_price + 30,
-        "price_planned": base_price + 5,
-        "price_per_serving_min": (base_price - 20) // 4,
-        "price_per_serving_max": (base_price + 30) // 4,
-        "price_per_serving_planned": (base_price + 5) // 4,
-        "nutrition_sources": [
-            "USDA FoodData Central",
-            "NutritionValue.org"
-        ],
-        "nutrition_calculated_at": "2026-01-13T01:58:45.066495Z",
-        "nutrition_assumptions": {
-            "servings_used": 4,
-            "per_piece_defaults_applied": 3
-        }
-    }
-    new_recipes.append(recipe)
 
-# Read the existing database
-with open('database.json', 'r', encoding='utf-8') as f:
-    database = json.load(f)
+# Build raw records; ids, nutrition and prices are assigned by the ingestion
+# pipeline (scripts/ingest.py) from the real lookups
+def records():
+    for n, (meal_name, *_) in enumerate(vegetable_recipes, start=1):
+        yield 'add_recipes.py', n, {
+            "strMeal": meal_name,
+            "strCategory": "Vegetable",
+            "strArea": "Filipino",
+            "strInstructions": "1. Prepare the vegetables by washing and cutting into bite-sized pieces.\\n2. Heat oil in a pan or wok.\\n3. Sauté onions and garlic until fragrant.\\n4. Add the main vegetables and stir well.\\n5. Season with soy sauce, vinegar, and salt to taste.\\n6. Cook until vegetables are tender but still firm.\\n7. Serve hot with steamed rice.",
+            "ingredients": [
+                ("Mixed Vegetables", "500g"),
+                ("Onion", "2 pieces"),
+                ("Garlic", "4 cloves"),
+                ("Soy Sauce", "3 tbsp"),
+                ("Coconut Oil", "2 tbsp"),
+                ("Salt and Pepper", "to taste"),
+                ("Water", "1 cup"),
+            ],
+            "servings": 4,
+        }
 
-# Add new recipes to the recipes array
-database['recipes'].extend(new_recipes)
 
-# Write back to the database
-with open('database.json', 'w', encoding='utf-8') as f:
-    json.dump(database, f, indent=2, ensure_ascii=False)
+stats = ingest.ingest(records(), db_path=Path(__file__).resolve().parent / 'database.json')
 
 # Verify
-print(f"Total recipes now: {len(database['recipes'])}")
-print(f"Last recipe ID: {database['recipes'][-1]['idMeal']}")
-print(f"\nNew recipe range:")
-print(f"  From: {database['recipes'][-50]['strMeal']} (ID {database['recipes'][-50]['idMeal']})")
-print(f"  To: {database['recipes'][-1]['strMeal']} (ID {database['recipes'][-1]['idMeal']})")
+print(f"Read {stats['read']}, accepted {stats['accepted']}, rejected {stats['rejected']}")
+if stats['accepted']:
+    print(f"New recipe range: ID {stats['first_id']} to {stats['first_id'] + stats['accepted'] - 1}")
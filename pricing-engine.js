@@ -73,6 +73,9 @@ class PricingEngine {
 
     // Labor cost per hour in PHP
     this.laborCostPerHour = 150;
+
+    // Share of passive time (simmering, marinating) billed as supervision
+    this.passiveLaborShare = 0.1;
     
     // Overhead factors
     this.overheadFactors = {
@@ -254,6 +257,16 @@ class PricingEngine {
    * Calculate labor cost based on recipe complexity
    */
   calculateLaborCost(recipe, difficulty = 'medium') {
+    // Step timings precomputed by scripts/instructions.py: a lookup, no text scan
+    if (Number.isFinite(recipe.time_active_min)) {
+      const baseTime = recipe.time_active_min + (recipe.time_passive_min || 0) * this.passiveLaborShare;
+      const totalTime = baseTime * (this.difficultyMultipliers[difficulty] || 1.0);
+      return {
+        timeMinutes: totalTime,
+        cost: (totalTime / 60) * this.laborCostPerHour
+      };
+    }
+
     // Estimate preparation time based on ingredients and instructions
     let baseTime = 30; // Base 30 minutes
     
@@ -320,7 +333,7 @@ class PricingEngine {
    */
   calculateTotalCost(recipe, options = {}) {
     const {
-      difficulty = 'medium',
+      difficulty = recipe.difficulty || 'medium',
       region = 'manila',
       profitMargin = 'standard',
       servings = 4
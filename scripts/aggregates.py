@@ -0,0 +1,215 @@
+"""Materialized catalog statistics per category, area and meal type.
+
+Usage: python aggregates.py [--db ../database.json] [--full]   (writes ../catalog_stats.json)
+
+Every group (category, area, meal type, plus '*' for the whole catalog) keeps
+a mergeable summary: counts of each price_per_serving and calories_per_serving
+value, and fixed-bin histograms of calories, protein, carbs and fat per
+serving. Summaries add and subtract entry by entry, so an upserted recipe is
+its old contribution subtracted and its new one added, a delete is a
+subtraction, and two shards' summaries merge by addition -- no min/max or
+mean ever needs the other recipes again. aggregates_index.json keeps the
+summaries and each recipe's contribution, so a run after an edit touches only
+the recipes whose values or groups changed.
+
+../catalog_stats.json is the read side: count, min/mean/median/max per group
+and the histograms, precomputed, so /api/stats/aggregates and
+/api/pricing/analytics answer with a lookup instead of a scan over the recipes.
+"""
+import argparse
+from pathlib import Path
+import catalog_context
+import ingredient_parser as ip
+import similar_index
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+STATE = ROOT / 'aggregates_index.json'
+TABLE = ROOT.parent / 'catalog_stats.json'
+
+STATE_VERSION = 1
+ALL = '*'
+DIMENSIONS = {'category': 'strCategory', 'area': 'strArea', 'meal_type': 'strMealType'}
+DEFAULTS = {'meal_type': 'main'}  # server.js counts a missing strMealType as main
+VALUES = ('price_per_serving', 'calories_per_serving')
+# per-serving histogram bin edges; the last bin is open-ended
+BINS = {
+    'calories_per_serving': (0, 100, 200, 300, 400, 500, 600, 800, 1000),
+    'protein_per_serving': (0, 5, 10, 15, 20, 30, 40, 60),
+    'carbs_per_serving': (0, 10, 20, 30, 45, 60, 90),
+    'fat_per_serving': (0, 5, 10, 15, 20, 30, 45),
+}
+
+
+def value_key(x):
+    return f'{round(x, 2):g}'
+
+
+def bin_index(edges, x):
+    i = 0
+    while i + 1 < len(edges) and x >= edges[i + 1]:
+        i += 1
+    return i
+
+
+def contribution(r):
+    """What one recipe adds to its groups: {'groups', 'values', 'bins'}."""
+    cal, protein, carbs, fat, pps = similar_index.recipe_numbers(r)
+    per_serving = {'price_per_serving': pps, 'calories_per_serving': cal, 'protein_per_serving': protein,
+                   'carbs_per_serving': carbs, 'fat_per_serving': fat}
+    groups = [[ALL, ALL]]
+    for dim, field in DIMENSIONS.items():
+        value = r.get(field) or DEFAULTS.get(dim)
+        if value:
+            groups.append([dim, str(value)])
+    return {'groups': groups,
+            'values': [value_key(per_serving[f]) for f in VALUES],
+            'bins': [bin_index(edges, per_serving[f]) for f, edges in BINS.items()]}
+
+
+def new_summary():
+    return {'count': 0, 'values': {f: {} for f in VALUES}, 'hist': {f: [0] * len(edges) for f, edges in BINS.items()}}
+
+
+def add(summary, contrib, sign=1):
+    """Add (sign=1) or remove (sign=-1) one recipe's contribution in place."""
+    summary['count'] += sign
+    for field, v in zip(VALUES, contrib['values']):
+        counts = summary['values'][field]
+        counts[v] = counts.get(v, 0) + sign
+        if not counts[v]:
+            del counts[v]
+    for field, i in zip(BINS, contrib['bins']):
+        summary['hist'][field][i] += sign
+
+
+def merge(a, b):
+    """A new summary equal to a + b (e.g. two shards of one catalog)."""
+    out = new_summary()
+    for s in (a, b):
+        out['count'] += s['count']
+        for field in VALUES:
+            counts = out['values'][field]
+            for v, n in s['values'][field].items():
+                counts[v] = counts.get(v, 0) + n
+        for field in BINS:
+            out['hist'][field] = [x + y for x, y in zip(out['hist'][field], s['hist'][field])]
+    return out
+
+
+def new_state():
+    return {'version': STATE_VERSION, 'bins': {f: list(e) for f, e in BINS.items()}, 'groups': {}, 'recipes': {}}
+
+
+def _apply(state, contrib, sign):
+    for dim, value in contrib['groups']:
+        groups = state['groups'].setdefault(dim, {})
+        summary = groups.get(value) or groups.setdefault(value, new_summary())
+        add(summary, contrib, sign)
+        if not summary['count']:
+            del groups[value]
+
+
+def upsert(state, recipe):
+    """Insert or replace one recipe; True when its contribution changed."""
+    mid = str(recipe.get('idMeal'))
+    contrib = contribution(recipe)
+    old = state['recipes'].get(mid)
+    if old == contrib:
+        return False
+    if old is not None:
+        _apply(state, old, -1)
+    _apply(state, contrib, 1)
+    state['recipes'][mid] = contrib
+    return True
+
+
+def delete(state, mid):
+    """Remove one recipe by id; False when it was not counted."""
+    old = state['recipes'].pop(str(mid), None)
+    if old is None:
+        return False
+    _apply(state, old, -1)
+    return True
+
+
+def update(state, recipes, full=False):
+    """Bring the state in line with `recipes` through upserts and deletes of what changed."""
+    if full or state.get('version') != STATE_VERSION or state.get('bins') != {f: list(e) for f, e in BINS.items()}:
+        state.clear()
+        state.update(new_state())
+    known = set(state['recipes'])
+    seen = set()
+    stats = {'added': 0, 'changed': 0, 'removed': 0}
+    for r in recipes:
+        if r.get('idMeal') is None:
+            continue
+        mid = str(r.get('idMeal'))
+        seen.add(mid)
+        if upsert(state, r):
+            stats['changed' if mid in known else 'added'] += 1
+    for mid in known - seen:
+        delete(state, mid)
+        stats['removed'] += 1
+    return stats
+
+
+def describe(counts):
+    """{min, mean, median, max} of a value -> count map."""
+    if not counts:
+        return None
+    items = sorted((float(v), n) for v, n in counts.items())
+    total = sum(n for _, n in items)
+
+    def nth(k):
+        seen = 0
+        for v, n in items:
+            seen += n
+            if seen > k:
+                return v
+    median = (nth((total - 1) // 2) + nth(total // 2)) / 2
+    return {'min': items[0][0], 'mean': round(sum(v * n for v, n in items) / total, 2),
+            'median': round(median, 2), 'max': items[-1][0]}
+
+
+def stats_table(state):
+    """The served table: per dimension and group, count, value stats and histograms."""
+    groups = {}
+    for dim in [ALL, *DIMENSIONS]:
+        groups[dim] = {value: {'count': s['count'],
+                               **{f: describe(s['values'][f]) for f in VALUES},
+                               'histograms': s['hist']}
+                       for value, s in sorted(state['groups'].get(dim, {}).items())}
+    return {'total': len(state['recipes']), 'bins': {f: list(e) for f, e in BINS.items()}, 'groups': groups}
+
+
+def load_state(path=STATE):
+    try:
+        return ip.load_json(path)
+    except (OSError, ValueError):
+        return new_state()
+
+
+def export(db_path=DB, ctx=None, full=False, state_path=STATE, table_path=TABLE):
+    ctx = ctx or catalog_context.Context()
+    state = load_state(state_path)
+    stats = update(state, ctx.json(db_path).get('recipes', []), full=full)
+    catalog_context.write_json(state_path, state, None, separators=(',', ':'))
+    catalog_context.write_json(table_path, stats_table(state), None, separators=(',', ':'))
+    return state, stats
+
+
+def main(ctx=None, db_path=DB, full=False):
+    state, stats = export(db_path, ctx=ctx, full=full)
+    sizes = ', '.join(f'{len(state["groups"].get(dim, {}))} {dim}' for dim in DIMENSIONS)
+    print(f"{len(state['recipes'])} recipes (added {stats['added']}, changed {stats['changed']}, "
+          f"removed {stats['removed']}); groups: {sizes}")
+    print(f'Wrote {TABLE}')
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Maintain per-category/area/meal-type catalog statistics')
+    ap.add_argument('--db', type=Path, default=DB)
+    ap.add_argument('--full', action='store_true', help='ignore the saved state and rebuild')
+    args = ap.parse_args()
+    main(db_path=args.db, full=args.full)
@@ -1,56 +1,32 @@
-import json
 from pathlib import Path
-from ingredient_parser import canonicalize_ingredient, parse_measure
+import catalog_context
 
 ROOT = Path(__file__).resolve().parent
 NEW = ROOT.parent / 'database.updated.json'
-NUTR = ROOT / 'nutrition_lookup.json'
-PRICE = ROOT / 'price_lookup.json'
 REPORT = ROOT / 'report_changes.json'
 
 
-def load(p):
-    with open(p, 'r', encoding='utf-8') as f:
-        return json.load(f)
+def analyze_recipe(conn, source, mid):
+    """Per-ingredient calorie/price contributions from the derived store, largest first."""
+    rows = conn.execute("""
+        SELECT ingredient, key, measure, grams, kcal, price FROM ingredient_lines
+        WHERE source = ? AND id_meal = ? ORDER BY kcal DESC, slot""", (source, mid))
+    return [{'ingredient': row['ingredient'], 'key': row['key'], 'measure': row['measure'], 'grams': row['grams'], 'calories': row['kcal'], 'price': row['price']} for row in rows]
 
 
-def analyze_recipe(r, nutr, price):
-    contributions = []
-    for i in range(1, 21):
-        ing = r.get(f'strIngredient{i}', '')
-        meas = r.get(f'strMeasure{i}', '')
-        if not ing or not meas:
-            continue
-        key = canonicalize_ingredient(ing)
-        grams = parse_measure(meas, key)
-        nut = nutr.get(key, {}).get('per_100g', {})
-        cal = grams * nut.get('calories', 0) / 100.0
-        # price
-        p = price.get(key, {})
-        price_amt = 0
-        if 'price_php_per_kg' in p:
-            price_amt = grams * p['price_php_per_kg'] / 1000.0
-        elif 'price_php_per_liter' in p:
-            price_amt = grams * p['price_php_per_liter'] / 1000.0
-        contributions.append({'ingredient': ing, 'key': key, 'measure': meas, 'grams': grams, 'calories': cal, 'price': price_amt})
-    contributions.sort(key=lambda x: x['calories'], reverse=True)
-    return contributions
-
-
-def main():
-    new = load(NEW)
-    nutr = load(NUTR)
-    price = load(PRICE)
-    report = load(REPORT)
+def main(ctx=None):
+    ctx = ctx or catalog_context.Context()
+    conn = ctx.store([NEW])
+    report = ctx.json(REPORT)
     top = report.get('top', [])[:10]
     for t in top:
         mid = t['idMeal']
-        r = next((x for x in new.get('recipes', []) if x.get('idMeal') == mid), None)
+        r = conn.execute('SELECT name FROM recipes WHERE source = ? AND id_meal = ?', (NEW.name, mid)).fetchone()
         if not r:
             continue
-        print(f"\n==== {mid} - {r.get('strMeal')} ====")
+        print(f"\n==== {mid} - {r['name']} ====")
         print(f"Old cal: {t['old_cal']}, New cal: {t['new_cal']}, Delta: {t['cal_delta']}")
-        contribs = analyze_recipe(r, nutr, price)
+        contribs = analyze_recipe(conn, NEW.name, mid)
         print("Top calorie contributors:")
         for c in contribs[:6]:
             print(f" - {c['ingredient']} ({c['measure']}) -> {round(c['grams'])} g, {round(c['calories'])} kcal, price {round(c['price'])} PHP")
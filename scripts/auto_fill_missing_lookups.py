@@ -1,57 +1,133 @@
 import json
-from pathlib import Path
-report = json.load(open('missing_lookup_report.json'))
-missing = set(report.get('missing_nut', {}).keys()) | set(report.get('missing_price', {}).keys())
-nut = json.load(open('nutrition_lookup.json'))
-price = json.load(open('price_lookup.json'))
-
-# heuristics
-veg = ['leaf','leaves','bok_choy','pechay','malunggay','kangkong','ampalaya','bitter','sayote','chayote','squash','pumpkin','okra','carrot','corn']
-legumes = ['mung','bean','beans','garbanzo','kadyos','lentil']
-seafood = ['fish','tilapia','tuna','prawns','shrimp','squid','crab','crabs','stingray','pagi','mud_crab','alimasag']
-processed = ['hotdog','sausage','kikiam','vienna','lechon','mang_tomas','sarsa','pangisa','lumpia','siomai','wrappers','spread']
-
-added_n=0
-added_p=0
-for key in sorted(missing):
-    # Skip if already present
-    if key in nut and key in price:
-        continue
-    entry = None
-    pentry = None
-    # vegetables
-    if any(w in key for w in veg) or key.endswith('_leaves') or key.startswith('green'):
-        entry = {'name': key.replace('_',' '), 'per_100g': {'calories': 20, 'protein': 1.5, 'carbs': 3.0, 'fat': 0.2}, 'source': 'Estimated placeholder (vegetable)'}
-        pentry = {'price_php_per_kg': 60, 'source': 'Estimated placeholder (vegetable)'}
-    elif any(w in key for w in legumes):
-        entry = {'name': key.replace('_',' '), 'per_100g': {'calories': 330, 'protein': 22.0, 'carbs': 60.0, 'fat': 1.5}, 'source': 'Estimated placeholder (legume)'}
-        pentry = {'price_php_per_kg': 120, 'source': 'Estimated placeholder (legume)'}
-    elif any(w in key for w in seafood):
-        entry = {'name': key.replace('_',' '), 'per_100g': {'calories': 150, 'protein': 20.0, 'carbs': 0.0, 'fat': 5.0}, 'source': 'Estimated placeholder (seafood)'}
-        pentry = {'price_php_per_kg': 300, 'source': 'Estimated placeholder (seafood)'}
-    elif any(w in key for w in processed):
-        entry = {'name': key.replace('_',' '), 'per_100g': {'calories': 300, 'protein': 10.0, 'carbs': 10.0, 'fat': 20.0}, 'source': 'Estimated placeholder (processed food)'}
-        pentry = {'price_php_per_kg': 150, 'source': 'Estimated placeholder (processed food)'}
-    elif 'sauce' in key or 'paste' in key or 'ketchup' in key or 'mayonnaise' in key or 'mang' in key or 'sarsa' in key:
-        entry = {'name': key.replace('_',' '), 'per_100g': {'calories': 120, 'protein': 1.0, 'carbs': 20.0, 'fat': 3.0}, 'source': 'Estimated placeholder (condiment)'}
-        pentry = {'price_php_per_kg': 180, 'source': 'Estimated placeholder (condiment)'}
-    elif key.endswith('_wrapper') or 'wrapper' in key or 'wrappers' in key:
-        entry = {'name': key.replace('_',' '), 'per_100g': {'calories': 300, 'protein': 6.0, 'carbs': 60.0, 'fat': 2.0}, 'source': 'Estimated placeholder (wrapper/dough)'}
-        pentry = {'price_php_per_kg': 120, 'source': 'Estimated placeholder (wrapper/dough)'}
-    elif 'rice' in key or 'noodle' in key or 'pasta' in key or 'spaghetti' in key:
-        entry = {'name': key.replace('_',' '), 'per_100g': {'calories': 350, 'protein': 7.0, 'carbs': 75.0, 'fat': 1.0}, 'source': 'Estimated placeholder (starch)'}
-        pentry = {'price_php_per_kg': 120, 'source': 'Estimated placeholder (starch)'}
-    else:
-        # default generic placeholder
-        entry = {'name': key.replace('_',' '), 'per_100g': {'calories': 100, 'protein': 3.0, 'carbs': 10.0, 'fat': 5.0}, 'source': 'Estimated placeholder (generic)'}
-        pentry = {'price_php_per_kg': 100, 'source': 'Estimated placeholder (generic)'}
-    if key not in nut:
-        nut[key] = entry
-        added_n += 1
-    if key not in price:
-        price[key] = pentry
-        added_p += 1
-
-open('nutrition_lookup.json','w',encoding='utf-8').write(json.dumps(nut, indent=2))
-open('price_lookup.json','w',encoding='utf-8').write(json.dumps(price, indent=2))
-print('Added', added_n, 'nutrition placeholders and', added_p, 'price placeholders')
+import re
+import coverage_index as ci
+
+# placeholder rules in priority order: the first rule whose terms/prefixes/suffixes
+# hit the key wins, 'generic' catches everything else
+PLACEHOLDER_RULES = [
+    {'name': 'vegetable',
+     'terms': ['leaf','leaves','bok_choy','pechay','malunggay','kangkong','ampalaya','bitter','sayote','chayote','squash','pumpkin','okra','carrot','corn'],
+     'suffixes': ['_leaves'], 'prefixes': ['green'],
+     'per_100g': {'calories': 20, 'protein': 1.5, 'carbs': 3.0, 'fat': 0.2}, 'price_php_per_kg': 60},
+    {'name': 'legume',
+     'terms': ['mung','bean','beans','garbanzo','kadyos','lentil'],
+     'per_100g': {'calories': 330, 'protein': 22.0, 'carbs': 60.0, 'fat': 1.5}, 'price_php_per_kg': 120},
+    {'name': 'seafood',
+     'terms': ['fish','tilapia','tuna','prawns','shrimp','squid','crab','crabs','stingray','pagi','mud_crab','alimasag'],
+     'per_100g': {'calories': 150, 'protein': 20.0, 'carbs': 0.0, 'fat': 5.0}, 'price_php_per_kg': 300},
+    {'name': 'processed food',
+     'terms': ['hotdog','sausage','kikiam','vienna','lechon','mang_tomas','sarsa','pangisa','lumpia','siomai','wrappers','spread'],
+     'per_100g': {'calories': 300, 'protein': 10.0, 'carbs': 10.0, 'fat': 20.0}, 'price_php_per_kg': 150},
+    {'name': 'condiment',
+     'terms': ['sauce','paste','ketchup','mayonnaise','mang','sarsa'],
+     'per_100g': {'calories': 120, 'protein': 1.0, 'carbs': 20.0, 'fat': 3.0}, 'price_php_per_kg': 180},
+    {'name': 'wrapper/dough',
+     'terms': ['wrapper','wrappers'], 'suffixes': ['_wrapper'],
+     'per_100g': {'calories': 300, 'protein': 6.0, 'carbs': 60.0, 'fat': 2.0}, 'price_php_per_kg': 120},
+    {'name': 'starch',
+     'terms': ['rice','noodle','pasta','spaghetti'],
+     'per_100g': {'calories': 350, 'protein': 7.0, 'carbs': 75.0, 'fat': 1.0}, 'price_php_per_kg': 120},
+    {'name': 'generic',
+     'per_100g': {'calories': 100, 'protein': 3.0, 'carbs': 10.0, 'fat': 5.0}, 'price_php_per_kg': 100},
+]
+
+
+def rule_pattern(rule):
+    alts = []
+    # longest terms first so the explanation names the most specific word
+    terms = sorted(rule.get('terms', []), key=len, reverse=True)
+    if terms:
+        alts.append('.*?(?:' + '|'.join(map(re.escape, terms)) + ')')
+    suffixes = rule.get('suffixes', [])
+    if suffixes:
+        alts.append('.*(?:' + '|'.join(map(re.escape, suffixes)) + ')$')
+    prefixes = rule.get('prefixes', [])
+    if prefixes:
+        alts.append('(?:' + '|'.join(map(re.escape, prefixes)) + ')')
+    return '|'.join(alts)
+
+
+def compile_rules(rules=PLACEHOLDER_RULES):
+    """Compile the rule table into one anchored alternation. Branches are tried in
+    table order, so the first rule that can match a key is the one that fires and
+    `m.lastgroup` names it. Keys are matched one per line (MULTILINE)."""
+    branches = []
+    for i, rule in enumerate(rules):
+        body = rule_pattern(rule)
+        branches.append(f'(?P<r{i}>{body})')
+    return re.compile('^(?:' + '|'.join(branches) + ')', re.MULTILINE)
+
+
+MATCHER = compile_rules()
+
+
+def classify(key, matcher=MATCHER, rules=PLACEHOLDER_RULES):
+    m = matcher.match(key)
+    return rules[int(m.lastgroup[1:])]
+
+
+def classify_many(keys, matcher=MATCHER, rules=PLACEHOLDER_RULES):
+    """Classify a whole batch with a single scan over the newline-joined keys."""
+    keys = list(keys)
+    blob = '\n'.join(k.replace('\n', ' ') for k in keys)
+    fired = [rules[int(m.lastgroup[1:])] for m in matcher.finditer(blob)]
+    return list(zip(keys, fired))
+
+
+def explain(key, rules=PLACEHOLDER_RULES):
+    """Return (rule name, reason) describing why `key` got its placeholder."""
+    rule = classify(key, rules=rules)
+    for t in sorted(rule.get('terms', []), key=len, reverse=True):
+        if t in key:
+            return rule['name'], f"contains '{t}'"
+    for s in rule.get('suffixes', []):
+        if key.endswith(s):
+            return rule['name'], f"ends with '{s}'"
+    for p in rule.get('prefixes', []):
+        if key.startswith(p):
+            return rule['name'], f"starts with '{p}'"
+    return rule['name'], 'no rule matched'
+
+
+def placeholder_entries(key, rule):
+    source = f"Estimated placeholder ({rule['name']})"
+    entry = {'name': key.replace('_',' '), 'per_100g': dict(rule['per_100g']), 'source': source}
+    pentry = {'price_php_per_kg': rule['price_php_per_kg'], 'source': source}
+    return entry, pentry
+
+
+def fill(missing, nut, price):
+    added_n = 0
+    added_p = 0
+    # Skip keys already present in both lookups
+    todo = [k for k in sorted(missing) if not (k in nut and k in price)]
+    for key, rule in classify_many(todo):
+        entry, pentry = placeholder_entries(key, rule)
+        if key not in nut:
+            nut[key] = entry
+            added_n += 1
+        if key not in price:
+            price[key] = pentry
+            added_p += 1
+    return added_n, added_p
+
+
+def main():
+    report = json.load(open('missing_lookup_report.json'))
+    missing = set(report.get('missing_nut', {}).keys()) | set(report.get('missing_price', {}).keys())
+    nut = json.load(open('nutrition_lookup.json'))
+    price = json.load(open('price_lookup.json'))
+    added_n, added_p = fill(missing, nut, price)
+
+    open('nutrition_lookup.json','w',encoding='utf-8').write(json.dumps(nut, indent=2))
+    open('price_lookup.json','w',encoding='utf-8').write(json.dumps(price, indent=2))
+    # keep the coverage index in step with the new lookup entries
+    index = ci.load_index()
+    for key in missing:
+        ci.update_lookup(index, key, nut, price)
+    ci.save_index(index)
+    print('Added', added_n, 'nutrition placeholders and', added_p, 'price placeholders')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Shared, lazily loaded catalog/lookup state for pipeline stages run in one process.
+
+Each script's main(ctx=None) reads its inputs through a Context instead of
+opening files itself; run standalone it gets a fresh one, under recipectl.py
+the stages share one, so database.json, database.updated.json, the lookups
+and the derived store are parsed/refreshed once per run instead of per stage.
+
+    ctx = Context()
+    ctx.json(path)         parsed JSON, cached by resolved path (treat as read-only)
+    ctx.take(path)         a copy the caller may edit (drops the cached one)
+    ctx.put(path, doc)     after writing `doc` to `path`: later stages read it from memory
+    ctx.first(a, b)        the first of several candidate files that loads
+    ctx.nutr / ctx.price   nutrition_lookup.json / price_lookup.json
+    ctx.store(sources)     derived-store connection, refreshed once per source version
+
+write_json(path, doc, detect_indent(path)) rewrites a catalog atomically in its own layout;
+is_served(path) tells whether it is the database.json server.js serves, the
+only catalog whose derived tables (static payloads, tags, skyline, stats) are rebuilt.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+UPDATED = ROOT.parent / 'database.updated.json'
+BACKUP = ROOT.parent / 'database.json.bak'
+NUTR = ROOT / 'nutrition_lookup.json'
+PRICE = ROOT / 'price_lookup.json'
+
+
+def key(path):
+    return Path(path).resolve()
+
+
+def is_served(db_path):
+    return key(db_path) == key(DB)
+
+
+def detect_indent(path):
+    """Indent width of an existing JSON file so rewrites keep its layout."""
+    with open(path, 'r', encoding='utf-8') as f:
+        f.readline()
+        second = f.readline()
+    return (len(second) - len(second.lstrip(' '))) or 2
+
+
+def detect_newline(path):
+    """The line ending of an existing file, so rewrites keep it."""
+    with open(path, 'rb') as f:
+        return '\r\n' if f.readline().endswith(b'\r\n') else '\n'
+
+
+def write_json(path, obj, indent, newline='\n', separators=None):
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline=newline) as f:
+            json.dump(obj, f, ensure_ascii=False, indent=indent, separators=separators)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Context:
+    def __init__(self, store_path=None):
+        self.store_path = store_path  # None: derived_store.STORE
+        self.docs = {}
+        self.failed = {}
+        self.reads = 0
+        self.hits = 0
+        self._conn = None
+        self._fresh = set()
+
+    def _load(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            doc = json.load(f)
+        self.reads += 1
+        return doc
+
+    def json(self, path):
+        k = key(path)
+        if k in self.failed:
+            raise self.failed[k]
+        if k in self.docs:
+            self.hits += 1
+            return self.docs[k]
+        try:
+            doc = self.docs[k] = self._load(k)
+        except (OSError, ValueError) as e:
+            self.failed[k] = e
+            raise
+        return doc
+
+    def take(self, path):
+        """The document at `path` for in-place edits; it is no longer shared."""
+        k = key(path)
+        if k in self.docs:
+            self.hits += 1
+            return self.docs.pop(k)
+        return self._load(k)
+
+    def put(self, path, doc):
+        """Record that `doc` is now the content of `path` (the caller wrote it)."""
+        k = key(path)
+        self.docs[k] = doc
+        self.failed.pop(k, None)
+        self._fresh.discard(k)
+
+    def first(self, *paths):
+        """The first of `paths` that loads, e.g. a .bak with database.json as fallback."""
+        for path in paths[:-1]:
+            try:
+                return self.json(path)
+            except (OSError, ValueError):
+                pass
+        return self.json(paths[-1])
+
+    @property
+    def nutr(self):
+        return self.json(NUTR)
+
+    @property
+    def price(self):
+        return self.json(PRICE)
+
+    def store(self, sources=()):
+        """Derived-store connection brought up to date with `sources` (paths) from
+        the documents held here; a source is refreshed again only after put()."""
+        import derived_store as ds
+        if self._conn is None:
+            self._conn = ds.open_store(self.store_path or ds.STORE)
+        stale = [key(p) for p in sources if key(p) not in self._fresh]
+        if stale:
+            ds.refresh(self._conn, stale, self.nutr, self.price, loader=self.json)
+            self._fresh.update(stale)
+        return self._conn
@@ -1,32 +1,38 @@
 import json
-from ingredient_parser import canonicalize_ingredient
 from pathlib import Path
-js = json.load(open('..\\database.updated.json'))
-nut = json.load(open('nutrition_lookup.json'))
-price = json.load(open('price_lookup.json'))
-missing_nut = {}
-missing_price = {}
-outliers = []
-for r in js.get('recipes',[]):
-    for i in range(1,21):
-        ing = r.get(f'strIngredient{i}','')
-        meas = r.get(f'strMeasure{i}','')
-        if not ing or not ing.strip():
-            continue
-        key = canonicalize_ingredient(ing)
-        if key not in nut:
-            missing_nut.setdefault(key, set()).add(ing)
-        if key not in price:
-            missing_price.setdefault(key, set()).add(ing)
-    # outlier checks
-    cps = r.get('calories_per_serving')
-    pps = r.get('price_per_serving')
-    if cps is not None and (cps < 50 or cps > 2500):
-        outliers.append({'id': r.get('idMeal'), 'name': r.get('strMeal'), 'cal_per_serv': cps, 'price_per_serv': pps})
+import catalog_context
+import coverage_index as ci
 
-print('Missing nutrition keys:', len(missing_nut))
-print('Missing price keys:', len(missing_price))
-print('Outliers (calories_per_serving <50 or >2500):', len(outliers))
+ROOT = Path(__file__).resolve().parent
+NEW = ROOT.parent / 'database.updated.json'
+OUT = ROOT / 'missing_lookup_report.json'
 
-open('missing_lookup_report.json','w',encoding='utf-8').write(json.dumps({'missing_nut':{k:list(v) for k,v in missing_nut.items()}, 'missing_price':{k:list(v) for k,v in missing_price.items()}, 'outliers': outliers}, indent=2))
-print('Wrote missing_lookup_report.json')
+
+def main(ctx=None):
+    ctx = ctx or catalog_context.Context()
+    js = ctx.json(NEW)
+    nut = ctx.nutr
+    price = ctx.price
+    # coverage comes from the persistent index; only new/edited recipes get re-canonicalized
+    index = ci.load_index()
+    ci.refresh(index, js.get('recipes', []), nut, price)
+    ci.save_index(index)
+    missing_nut, missing_price = ci.missing(index)
+    outliers = []
+    for r in js.get('recipes',[]):
+        # outlier checks
+        cps = r.get('calories_per_serving')
+        pps = r.get('price_per_serving')
+        if cps is not None and (cps < 50 or cps > 2500):
+            outliers.append({'id': r.get('idMeal'), 'name': r.get('strMeal'), 'cal_per_serv': cps, 'price_per_serv': pps})
+
+    print('Missing nutrition keys:', len(missing_nut))
+    print('Missing price keys:', len(missing_price))
+    print('Outliers (calories_per_serving <50 or >2500):', len(outliers))
+
+    OUT.write_text(json.dumps({'missing_nut': missing_nut, 'missing_price': missing_price, 'outliers': outliers}, indent=2), encoding='utf-8')
+    print(f'Wrote {OUT.name}')
+
+
+if __name__ == '__main__':
+    main()
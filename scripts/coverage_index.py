@@ -0,0 +1,191 @@
+import hashlib
+import json
+from pathlib import Path
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.updated.json'
+NUTR = ROOT / 'nutrition_lookup.json'
+PRICE = ROOT / 'price_lookup.json'
+INDEX = ROOT / 'coverage_index.json'
+
+INDEX_VERSION = 1
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def map_fingerprint():
+    """Version of the canonicalization sections of the parser config; when it
+    changes the cached spelling -> key mapping has to be re-derived."""
+    return ip.CONFIG.versions['names']
+
+
+def recipe_spellings(r):
+    out = []
+    for i in range(1, 21):
+        ing = r.get(f'strIngredient{i}', '')
+        if ing and ing.strip():
+            out.append(ing)
+    return out
+
+
+def recipe_fingerprint(spellings):
+    return hashlib.sha1('\n'.join(spellings).encode('utf-8')).hexdigest()
+
+
+def new_index():
+    return {'version': INDEX_VERSION, 'map_fingerprint': map_fingerprint(), 'keys': {}, 'spellings': {}, 'recipes': {}}
+
+
+def canonical_key(index, spelling):
+    # every distinct spelling is canonicalized once and cached in the index
+    key = index['spellings'].get(spelling)
+    if key is None:
+        key = ip.canonicalize_ingredient(spelling)
+        index['spellings'][spelling] = key
+    return key
+
+
+def remove_recipe(index, mid):
+    rec = index['recipes'].pop(mid, None)
+    if not rec:
+        return
+    for spelling in rec['spellings']:
+        key = index['spellings'].get(spelling)
+        entry = index['keys'].get(key)
+        if not entry:
+            continue
+        entry['recipes'].discard(mid)
+        left = entry['spellings'].get(spelling, 0) - 1
+        if left > 0:
+            entry['spellings'][spelling] = left
+        else:
+            entry['spellings'].pop(spelling, None)
+        if not entry['recipes']:
+            del index['keys'][key]
+
+
+def add_recipe(index, r, nutr, price):
+    """Insert (or re-insert) one recipe; only its own ingredient lines are touched."""
+    mid = r.get('idMeal')
+    spellings = recipe_spellings(r)
+    remove_recipe(index, mid)
+    index['recipes'][mid] = {'fingerprint': recipe_fingerprint(spellings), 'spellings': spellings}
+    for spelling in spellings:
+        key = canonical_key(index, spelling)
+        entry = index['keys'].get(key)
+        if entry is None:
+            entry = {'recipes': set(), 'spellings': {}, 'has_nutrition': key in nutr, 'has_price': key in price}
+            index['keys'][key] = entry
+        entry['recipes'].add(mid)
+        entry['spellings'][spelling] = entry['spellings'].get(spelling, 0) + 1
+
+
+def update_lookup(index, key, nutr, price):
+    """Refresh the coverage flags of one key after a lookup entry was added or removed."""
+    entry = index['keys'].get(key)
+    if entry is not None:
+        entry['has_nutrition'] = key in nutr
+        entry['has_price'] = key in price
+
+
+def remap_spellings(index, nutr, price):
+    """Re-canonicalize the distinct spellings (not the catalog) after ing_map/ing_aliases changed."""
+    changed = [s for s, old_key in index['spellings'].items() if ip.canonicalize_ingredient(s) != old_key]
+    moved = set()
+    for spelling in changed:
+        entry = index['keys'].get(index['spellings'][spelling], {})
+        moved.update(mid for mid in entry.get('recipes', ()) if spelling in index['recipes'][mid]['spellings'])
+    recipes = []
+    for mid in moved:
+        r = {'idMeal': mid}
+        for i, spelling in enumerate(index['recipes'][mid]['spellings'], start=1):
+            r[f'strIngredient{i}'] = spelling
+        recipes.append(r)
+        remove_recipe(index, mid)
+    for spelling in changed:
+        del index['spellings'][spelling]
+    for r in recipes:
+        add_recipe(index, r, nutr, price)
+    index['map_fingerprint'] = map_fingerprint()
+    return len(moved)
+
+
+def refresh(index, recipes, nutr, price):
+    """Bring the index in line with the catalog and lookups. Unchanged recipes
+    are skipped by fingerprint so only new or edited ones are canonicalized."""
+    stats = {'remapped': 0, 'added': 0, 'removed': 0}
+    if index.get('map_fingerprint') != map_fingerprint():
+        stats['remapped'] = remap_spellings(index, nutr, price)
+    seen = set()
+    for r in recipes:
+        mid = r.get('idMeal')
+        seen.add(mid)
+        rec = index['recipes'].get(mid)
+        if rec and rec['fingerprint'] == recipe_fingerprint(recipe_spellings(r)):
+            continue
+        add_recipe(index, r, nutr, price)
+        stats['added'] += 1
+    for mid in [m for m in index['recipes'] if m not in seen]:
+        remove_recipe(index, mid)
+        stats['removed'] += 1
+    for key in index['keys']:
+        update_lookup(index, key, nutr, price)
+    return stats
+
+
+def missing(index):
+    """Return ({key: spellings} missing nutrition, {key: spellings} missing price)."""
+    missing_nut = {}
+    missing_price = {}
+    for key, entry in index['keys'].items():
+        if not entry['has_nutrition']:
+            missing_nut[key] = sorted(entry['spellings'])
+        if not entry['has_price']:
+            missing_price[key] = sorted(entry['spellings'])
+    return missing_nut, missing_price
+
+
+def recipes_using(index, key):
+    entry = index['keys'].get(key)
+    return sorted(entry['recipes']) if entry else []
+
+
+def load_index(path=INDEX):
+    try:
+        raw = load(path)
+    except (OSError, ValueError):
+        return new_index()
+    if raw.get('version') != INDEX_VERSION:
+        return new_index()
+    for entry in raw['keys'].values():
+        entry['recipes'] = set(entry['recipes'])
+    return raw
+
+
+def save_index(index, path=INDEX):
+    out = dict(index)
+    out['keys'] = {k: dict(v, recipes=sorted(v['recipes'])) for k, v in sorted(index['keys'].items())}
+    tmp = Path(str(path) + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(out, f, ensure_ascii=False, indent=2)
+    tmp.replace(path)
+
+
+def main():
+    index = load_index()
+    db = load(DB)
+    stats = refresh(index, db.get('recipes', []), load(NUTR), load(PRICE))
+    save_index(index)
+    missing_nut, missing_price = missing(index)
+    print(f"Coverage index: {len(index['keys'])} keys, {len(index['recipes'])} recipes "
+          f"(added {stats['added']}, removed {stats['removed']}, remapped {stats['remapped']})")
+    print('Missing nutrition keys:', len(missing_nut))
+    print('Missing price keys:', len(missing_price))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Near-duplicate recipe detection with MinHash signatures and LSH banding.
+
+Usage: python dedup.py [--db ../database.json] [--out dedup_report.json]
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+from collections import defaultdict
+from pathlib import Path
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+OUT = ROOT / 'dedup_report.json'
+
+NUM_PERM = 128
+ROWS = 6
+BANDS = NUM_PERM // ROWS  # 21 bands x 6 rows: P(collide) ~0.93 at Jaccard 0.7, ~1 at 0.9, <0.002 at 0.2
+SHINGLE = 3
+MAX_BUCKET = 200     # bigger buckets are chained instead of expanded pairwise
+PRIME = (1 << 61) - 1
+SEED = 1
+
+# (ingredient Jaccard, name-shingle Jaccard) minimums for a merge suggestion;
+# the same dish re-entered with an edited ingredient list still matches on name
+DUPLICATE_RULES = [(0.7, 0.6), (0.5, 0.9)]
+SHARED_ING = 0.9      # same ingredient block under different names (template/placeholder)
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def normalize_name(name):
+    name = re.sub(r'[^a-z0-9 ]', ' ', (name or '').lower())
+    return ' '.join(name.split())
+
+
+def name_shingles(name):
+    text = f' {normalize_name(name)} '
+    if len(text) <= SHINGLE:
+        return {text}
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+def ingredient_keys(r, cache):
+    keys = set()
+    for i in range(1, 21):
+        ing = r.get(f'strIngredient{i}', '')
+        if ing and ing.strip():
+            key = cache.get(ing)
+            if key is None:
+                key = cache[ing] = ip.canonicalize_ingredient(ing)
+            keys.add(key)
+    return keys
+
+
+class MinHasher:
+    """MinHash over string features. Each distinct feature's permuted hash vector
+    is computed once and cached, so a recipe signature is an element-wise min."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=SEED):
+        rnd = random.Random(seed)
+        self.params = [(rnd.randrange(1, PRIME), rnd.randrange(0, PRIME)) for _ in range(num_perm)]
+        self.empty = (PRIME,) * num_perm
+        self.cache = {}
+
+    def feature(self, f):
+        vec = self.cache.get(f)
+        if vec is None:
+            h = int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little')
+            vec = tuple((a * h + b) % PRIME for a, b in self.params)
+            self.cache[f] = vec
+        return vec
+
+    def signature(self, features):
+        if not features:
+            return self.empty
+        vecs = [self.feature(f) for f in features]
+        return tuple(map(min, *vecs)) if len(vecs) > 1 else vecs[0]
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+def lsh_candidates(signatures, bands=BANDS, rows=ROWS):
+    """Band each signature into buckets and return the set of candidate id pairs."""
+    buckets = defaultdict(list)
+    for mid, sig in signatures.items():
+        for b in range(bands):
+            buckets[(b, sig[b * rows:(b + 1) * rows])].append(mid)
+    pairs = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        if len(members) > MAX_BUCKET:
+            # a huge bucket is one near-identical block; linking neighbours keeps
+            # the cluster connected without materializing every pair
+            pairs.update(zip(members, members[1:]))
+            continue
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                pairs.add((a, b))
+    return pairs
+
+
+def group_identical(feature_sets):
+    """Group ids whose feature sets are identical: {frozenset: [ids]} in input order."""
+    groups = defaultdict(list)
+    for mid, features in feature_sets.items():
+        if features:
+            groups[frozenset(features)].append(mid)
+    return groups
+
+
+def set_candidates(hasher, groups, prefix):
+    """Candidate id pairs for one feature space. LSH only sees each distinct set
+    once (keyed by its first id); the ids sharing a set are chained, so a block
+    of k identical recipes costs k - 1 pairs instead of k * (k - 1) / 2."""
+    signatures = {}
+    pairs = set()
+    for features, members in groups.items():
+        signatures[members[0]] = hasher.signature([prefix + f for f in features])
+        pairs.update(zip(members, members[1:]))
+    pairs.update(lsh_candidates(signatures))
+    return pairs
+
+
+def find_duplicates(recipes):
+    hasher = MinHasher()
+    info = {}
+    spellings = {}
+    for r in recipes:
+        mid = r.get('idMeal')
+        info[mid] = {'name': r.get('strMeal'), 'keys': ingredient_keys(r, spellings),
+                     'shingles': name_shingles(r.get('strMeal'))}
+    candidates = set_candidates(hasher, group_identical({m: i['keys'] for m, i in info.items()}), 'i:')
+    candidates |= set_candidates(hasher, group_identical({m: i['shingles'] for m, i in info.items()}), 'n:')
+
+    pairs = []
+    for a, b in candidates:
+        ia, ib = info[a], info[b]
+        ing_sim = jaccard(ia['keys'], ib['keys'])
+        name_sim = jaccard(ia['shingles'], ib['shingles'])
+        if any(ing_sim >= mi and name_sim >= mn for mi, mn in DUPLICATE_RULES):
+            kind = 'duplicate'
+        elif ing_sim >= SHARED_ING:
+            kind = 'shared_ingredients'
+        else:
+            continue
+        a, b = sorted((a, b), key=id_order)
+        pairs.append({'kind': kind, 'a': a, 'b': b, 'name_a': ia['name'], 'name_b': ib['name'],
+                      'ingredient_similarity': round(ing_sim, 3), 'name_similarity': round(name_sim, 3)})
+    pairs.sort(key=lambda p: (p['kind'], -p['ingredient_similarity'] - p['name_similarity'], id_order(p['a']), id_order(p['b'])))
+    return pairs, info, len(candidates)
+
+
+def id_order(mid):
+    s = str(mid)
+    return (0, int(s), s) if s.isdigit() else (1, 0, s)
+
+
+def clusters(pairs, kind):
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for p in pairs:
+        if p['kind'] == kind:
+            ra, rb = find(p['a']), find(p['b'])
+            if ra != rb:
+                parent[max(ra, rb, key=id_order)] = min(ra, rb, key=id_order)
+    groups = defaultdict(list)
+    for x in parent:
+        groups[find(x)].append(x)
+    return [sorted(g, key=id_order) for g in groups.values()]
+
+
+def merge_suggestions(pairs, info):
+    out = []
+    for group in clusters(pairs, 'duplicate'):
+        keep, rest = group[0], group[1:]
+        out.append({'keep': keep, 'name': info[keep]['name'], 'merge': [{'idMeal': m, 'name': info[m]['name']} for m in rest]})
+    out.sort(key=lambda s: id_order(s['keep']))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Find near-duplicate recipes with MinHash/LSH')
+    ap.add_argument('--db', default=str(DB))
+    ap.add_argument('--out', default=str(OUT))
+    args = ap.parse_args()
+    recipes = load(args.db).get('recipes', [])
+    pairs, info, n_candidates = find_duplicates(recipes)
+    suggestions = merge_suggestions(pairs, info)
+    shared = [{'ids': g, 'names': [info[m]['name'] for m in g]} for g in clusters(pairs, 'shared_ingredients') if len(g) > 1]
+    report = {'recipes': len(recipes), 'candidate_pairs': n_candidates,
+              'merge_suggestions': suggestions, 'shared_ingredient_blocks': shared, 'pairs': pairs}
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'{len(recipes)} recipes, {n_candidates} LSH candidate pairs, '
+          f'{len(suggestions)} merge suggestions, {len(shared)} shared ingredient blocks')
+    print(f'Wrote {args.out}')
+
+
+if __name__ == '__main__':
+    main()
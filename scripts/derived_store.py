@@ -0,0 +1,203 @@
+"""Local SQLite store of derived data: recipes, parsed ingredient lines and lookups.
+
+Usage: python derived_store.py [db.json ...] [--sql "SELECT ..."]
+
+Each catalog file is a `source` (its file name), so database.updated.json and
+database.json.bak can live side by side. A recipe's lines are re-parsed only
+when its content hash changes; a changed lookup entry only re-costs the lines
+using that key; a new parser config version (ingredient_parser.CONFIG)
+re-derives everything.
+
+    SELECT * FROM ingredient_lines WHERE rule IN ('bare_number', 'first_number');
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+STORE = ROOT / 'derived.sqlite'
+NUTR = ROOT / 'nutrition_lookup.json'
+PRICE = ROOT / 'price_lookup.json'
+DEFAULT_SOURCES = (ROOT.parent / 'database.json', ROOT.parent / 'database.updated.json')
+
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS recipes (
+    source TEXT NOT NULL, id_meal TEXT NOT NULL, position INTEGER NOT NULL,
+    name TEXT, category TEXT, content_hash TEXT NOT NULL,
+    calories REAL, protein REAL, carbs REAL, fat REAL, price REAL,
+    calories_per_serving REAL, price_per_serving REAL, good_for INTEGER,
+    PRIMARY KEY (source, id_meal));
+CREATE INDEX IF NOT EXISTS recipes_position ON recipes (source, position);
+CREATE TABLE IF NOT EXISTS ingredient_lines (
+    source TEXT NOT NULL, id_meal TEXT NOT NULL, slot INTEGER NOT NULL,
+    ingredient TEXT NOT NULL, measure TEXT NOT NULL, key TEXT,
+    -- grams is untyped so parse_measure's int/float comes back as returned
+    grams NOT NULL, rule TEXT NOT NULL, kcal REAL NOT NULL, price REAL NOT NULL,
+    PRIMARY KEY (source, id_meal, slot),
+    FOREIGN KEY (source, id_meal) REFERENCES recipes (source, id_meal));
+CREATE INDEX IF NOT EXISTS lines_key ON ingredient_lines (key);
+CREATE INDEX IF NOT EXISTS lines_rule ON ingredient_lines (rule);
+CREATE INDEX IF NOT EXISTS lines_grams ON ingredient_lines (source, grams);
+CREATE TABLE IF NOT EXISTS lookups (
+    key TEXT PRIMARY KEY, content_hash TEXT NOT NULL,
+    calories_per_100g REAL, price_per_g REAL,
+    nutrition_json TEXT, price_json TEXT);
+"""
+RECIPE_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'price', 'calories_per_serving', 'price_per_serving', 'good_for')
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def content_hash(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def recipe_hash(r):
+    """Hash of the fields the store derives from; price range or image edits don't force a re-parse."""
+    fields = ['strMeal', 'strCategory', *RECIPE_FIELDS]
+    fields += [f'str{kind}{i}' for i in range(1, 21) for kind in ('Ingredient', 'Measure')]
+    return content_hash({f: r.get(f) for f in fields})
+
+
+def parser_fingerprint(cfg=None):
+    """Changes whenever canonicalization or unit resolution would give different lines."""
+    return (cfg or ip.CONFIG).version
+
+
+def open_store(path=STORE):
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get_meta(conn, name):
+    row = conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+    return row['value'] if row else None
+
+
+def set_meta(conn, name, value):
+    conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+
+def lookup_row(key, nut, pinfo):
+    per100 = (nut or {}).get('per_100g', {})
+    price_per_g = None
+    if 'price_php_per_kg' in (pinfo or {}):
+        price_per_g = pinfo['price_php_per_kg'] / 1000.0
+    elif 'price_php_per_liter' in (pinfo or {}):
+        price_per_g = pinfo['price_php_per_liter'] / 1000.0
+    nutrition_json = json.dumps(nut, ensure_ascii=False) if nut is not None else None
+    price_json = json.dumps(pinfo, ensure_ascii=False) if pinfo is not None else None
+    return (key, content_hash([nut, pinfo]), per100.get('calories'), price_per_g, nutrition_json, price_json)
+
+
+def refresh_lookups(conn, nutr, price):
+    """Sync the lookups table; lines of keys whose entry changed are re-costed in SQL."""
+    stored = {row['key']: row['content_hash'] for row in conn.execute('SELECT key, content_hash FROM lookups')}
+    changed = []
+    for key in set(nutr) | set(price):
+        row = lookup_row(key, nutr.get(key), price.get(key))
+        if stored.pop(key, None) != row[1]:
+            conn.execute('INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, ?, ?)', row)
+            changed.append(key)
+    for key in stored:
+        conn.execute('DELETE FROM lookups WHERE key = ?', (key,))
+        changed.append(key)
+    conn.executemany("""
+        UPDATE ingredient_lines SET
+            kcal = grams * COALESCE((SELECT calories_per_100g FROM lookups WHERE key = ingredient_lines.key), 0) / 100.0,
+            price = grams * COALESCE((SELECT price_per_g FROM lookups WHERE key = ingredient_lines.key), 0)
+        WHERE key = ?""", [(k,) for k in changed])
+    return len(changed)
+
+
+def recipe_lines(r, costs, cfg=None):
+    """Parse one recipe's ingredient slots into line tuples (without source/id)."""
+    lines = []
+    for i in range(1, 21):
+        ing = r.get(f'strIngredient{i}', '')
+        meas = r.get(f'strMeasure{i}', '')
+        if not ing or not meas or ing.strip() == '':
+            continue
+        key = ip.canonicalize_ingredient(ing, cfg)
+        grams, rule = ip.parse_measure_rule(meas, key, cfg)
+        cal100, price_per_g = costs.get(key, (None, None))
+        lines.append((i, ing, meas, key, grams, rule, grams * (cal100 or 0) / 100.0, grams * (price_per_g or 0)))
+    return lines
+
+
+def refresh_source(conn, source, recipes, cfg=None):
+    """Re-parse only recipes of `source` that are new or whose content hash changed."""
+    costs = {row['key']: (row['calories_per_100g'], row['price_per_g'])
+             for row in conn.execute('SELECT key, calories_per_100g, price_per_g FROM lookups')}
+    stored = {row['id_meal']: row['content_hash']
+              for row in conn.execute('SELECT id_meal, content_hash FROM recipes WHERE source = ?', (source,))}
+    stats = {'parsed': 0, 'removed': 0}
+    for pos, r in enumerate(recipes):
+        mid = r.get('idMeal')
+        h = recipe_hash(r)
+        if stored.pop(mid, None) == h:
+            conn.execute('UPDATE recipes SET position = ? WHERE source = ? AND id_meal = ?', (pos, source, mid))
+            continue
+        nums = [r.get(f) if isinstance(r.get(f), (int, float)) else None for f in RECIPE_FIELDS]
+        conn.execute('INSERT OR REPLACE INTO recipes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     (source, mid, pos, r.get('strMeal'), r.get('strCategory'), h, *nums))
+        conn.execute('DELETE FROM ingredient_lines WHERE source = ? AND id_meal = ?', (source, mid))
+        conn.executemany('INSERT INTO ingredient_lines VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         [(source, mid, *line) for line in recipe_lines(r, costs, cfg)])
+        stats['parsed'] += 1
+    for mid in stored:
+        conn.execute('DELETE FROM ingredient_lines WHERE source = ? AND id_meal = ?', (source, mid))
+        conn.execute('DELETE FROM recipes WHERE source = ? AND id_meal = ?', (source, mid))
+        stats['removed'] += 1
+    return stats
+
+
+def refresh(conn, sources, nutr=None, price=None, loader=load):
+    """Bring the store in line with the given catalog files and the lookups.
+    Returns {source name: stats}. Sources are keyed by file name; `loader`
+    reads them (catalog_context.Context.json serves already parsed files)."""
+    nutr = load(NUTR) if nutr is None else nutr
+    price = load(PRICE) if price is None else price
+    out = {}
+    cfg = ip.CONFIG  # one config for the whole refresh even if it is swapped meanwhile
+    with conn:
+        fingerprint = parser_fingerprint(cfg)
+        if get_meta(conn, 'schema_version') != str(SCHEMA_VERSION) or get_meta(conn, 'parser') != fingerprint:
+            conn.execute('DELETE FROM ingredient_lines')
+            conn.execute('DELETE FROM recipes')
+            set_meta(conn, 'schema_version', str(SCHEMA_VERSION))
+            set_meta(conn, 'parser', fingerprint)
+        out['lookups'] = refresh_lookups(conn, nutr, price)
+        for path in sources:
+            path = Path(path)
+            out[path.name] = refresh_source(conn, path.name, loader(path).get('recipes', []), cfg)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Refresh and query the derived SQLite store')
+    ap.add_argument('sources', nargs='*', default=[str(p) for p in DEFAULT_SOURCES])
+    ap.add_argument('--sql', help='run a query after refreshing and print the rows as JSON lines')
+    args = ap.parse_args()
+    conn = open_store()
+    stats = refresh(conn, args.sources)
+    print(f"Lookups changed: {stats.pop('lookups')}")
+    for source, s in stats.items():
+        print(f"{source}: re-parsed {s['parsed']}, removed {s['removed']}")
+    if args.sql:
+        for row in conn.execute(args.sql):
+            print(json.dumps(dict(row), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""Diet/allergen tags as one bitmask per recipe plus per-tag and per-category bitmaps.
+
+Usage: python diet_tags.py [--db ../database.json]   (writes ../recipe_tags.json)
+
+diet_tags.json lists the tags in bit order. Each tag has the key tokens that
+set it ("pork", "soy_sauce"; matched against the canonical key and the
+normalized ingredient name, split on _ / -), exact overrides for keys or names
+the tokens get wrong (coconut_milk is not dairy) and named diets as tags to
+exclude (vegetarian: meat, fish, shellfish). A recipe's mask is the OR over
+its ingredient lines. recipe_tags.json holds the
+masks in database.json order, one bitmap per tag and per category (bit i =
+recipe i, as little-endian uint32 words) and the category x tag counts, so
+server.js answers /api/browse filters and facets with AND / AND NOT and a
+popcount instead of scanning ingredient slots.
+"""
+import argparse
+import hashlib
+import json
+import re
+from array import array
+from pathlib import Path
+import catalog_context
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+REGISTRY = ROOT / 'diet_tags.json'
+OUT = ROOT.parent / 'recipe_tags.json'
+
+TOKEN_SPLIT = re.compile(r'[_/\-\s]+')
+
+
+def tokens(text):
+    return tuple(t for t in TOKEN_SPLIT.split(text.lower()) if t)
+
+
+class TagRegistry:
+    """Tag ids in bit order, compiled token patterns, key overrides and diets."""
+
+    def __init__(self, data):
+        self.tags = tuple(data['tags'])
+        self.ids = tuple(t['id'] for t in self.tags)
+        if len(self.ids) > 31:
+            raise ValueError('at most 31 tags fit the int masks server.js works with')
+        self.bit = {tid: 1 << i for i, tid in enumerate(self.ids)}
+        self.patterns = [(tokens(p), self.bit[t['id']]) for t in self.tags for p in t.get('match', ())]
+        self.implied = {t['id']: self.mask(t.get('implied_by', ())) for t in self.tags}
+        self.overrides = {key: self._close(self.mask(tags)) for key, tags in data.get('keys', {}).items()}
+        self.diets = {name: self.mask(tags) for name, tags in data.get('diets', {}).items()}
+        self.diet_tags = {name: list(tags) for name, tags in data.get('diets', {}).items()}
+        self.version = hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        self._key_masks = {}
+
+    @classmethod
+    def load(cls, path=REGISTRY):
+        return cls(ip.load_json(path))
+
+    def mask(self, tag_ids):
+        m = 0
+        for tid in tag_ids:
+            if tid not in self.bit:
+                raise ValueError(f'unknown tag {tid!r}; expected one of {list(self.ids)}')
+            m |= self.bit[tid]
+        return m
+
+    def names(self, mask):
+        return [tid for tid in self.ids if mask & self.bit[tid]]
+
+    def _close(self, m):
+        for tid, by in self.implied.items():
+            if m & by:
+                m |= self.bit[tid]
+        return m
+
+    def key_mask(self, key):
+        """Tags of one canonical ingredient key (memoized)."""
+        if not key:
+            return 0
+        m = self._key_masks.get(key)
+        if m is None:
+            if key in self.overrides:
+                m = self.overrides[key]
+            else:
+                toks, m = tokens(key), 0
+                for pattern, bit in self.patterns:
+                    n = len(pattern)
+                    if any(toks[i:i + n] == pattern for i in range(len(toks) - n + 1)):
+                        m |= bit
+                m = self._close(m)
+            self._key_masks[key] = m
+        return m
+
+    def line_mask(self, name, key):
+        """Tags of one ingredient line: its canonical key and its own normalized
+        name, so 'Ground Pork/Shrimp' (key ground_pork) still counts as shellfish
+        and 'Canned Tuna (in water)' as fish. An override for the name replaces
+        both (peanut butter is not dairy)."""
+        norm = ip.normalize_name(name).replace(' ', '_')
+        if norm in self.overrides:
+            return self.overrides[norm]
+        return self.key_mask(key) | self.key_mask(norm)
+
+    def recipe_mask(self, r, cfg=None):
+        m = 0
+        for i in range(1, 21):
+            ing = r.get(f'strIngredient{i}', '')
+            if ing and ing.strip():
+                m |= self.line_mask(ing, ip.canonicalize_ingredient(ing, cfg))
+        return m
+
+
+def words(bitmap, n):
+    """Python int bitset over n recipes -> little-endian uint32 words."""
+    count = (n + 31) // 32
+    return list(array('I', bitmap.to_bytes(4 * count, 'little'))) if count else []
+
+
+def popcount(bitmap):
+    # int.bit_count() is 3.10+; the scripts support 3.8
+    return bin(bitmap).count('1')
+
+
+def build(recipes, registry, cfg=None):
+    masks = [registry.recipe_mask(r, cfg) for r in recipes]
+    by_tag = {tid: 0 for tid in registry.ids}
+    by_cat = {}
+    for i, m in enumerate(masks):
+        bit = 1 << i
+        for tid in registry.names(m):
+            by_tag[tid] |= bit
+        cat = recipes[i].get('strCategory') or ''
+        by_cat[cat] = by_cat.get(cat, 0) | bit
+    everyone = (1 << len(masks)) - 1
+    facets = {'*': {tid: popcount(bm) for tid, bm in by_tag.items()}}
+    for cat, cat_bm in by_cat.items():
+        facets[cat] = {tid: popcount(cat_bm & bm) for tid, bm in by_tag.items()}
+    for name, excl in registry.diets.items():
+        allowed = everyone
+        for tid in registry.names(excl):
+            allowed &= ~by_tag[tid]
+        facets['*'][name] = popcount(allowed)
+        for cat, cat_bm in by_cat.items():
+            facets[cat][name] = popcount(cat_bm & allowed)
+    n = len(masks)
+    return {
+        'version': registry.version,
+        'tags': [{'id': t['id'], 'label': t.get('label', t['id']), 'bit': i} for i, t in enumerate(registry.tags)],
+        'diets': registry.diet_tags,
+        'ids': [r.get('idMeal') for r in recipes],
+        'masks': masks,
+        'bitmaps': {'tag': {tid: words(bm, n) for tid, bm in by_tag.items()},
+                    'category': {cat: words(bm, n) for cat, bm in by_cat.items()}},
+        'facets': facets,
+    }
+
+
+def export(db_path=DB, out=OUT, ctx=None, registry=None):
+    ctx = ctx or catalog_context.Context()
+    registry = registry or TagRegistry.load()
+    result = build(ctx.json(db_path).get('recipes', []), registry)
+    result['source'] = Path(db_path).name
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, separators=(',', ':'))
+    return result
+
+
+def main(ctx=None, db_path=DB):
+    result = export(db_path, ctx=ctx)
+    counts = ', '.join(f"{tid} {n}" for tid, n in result['facets']['*'].items())
+    print(f"Tagged {len(result['ids'])} recipes ({counts}); wrote {OUT}")
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Tag recipes with diet/allergen bitmasks for faceted browsing')
+    ap.add_argument('--db', type=Path, default=DB)
+    main(db_path=ap.parse_args().db)
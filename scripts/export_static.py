@@ -0,0 +1,179 @@
+"""Static API export: pre-render every cacheable server.js response to disk,
+pre-compressed, with a manifest of routes and strong ETags.
+
+Usage: python export_static.py [--db ../database.json] [--out ../static_api]
+
+Covered routes (bytes match what server.js would JSON.stringify):
+    /api/recipes?page=N&limit=20   /api/lookup?i=ID (also /api/recipes/ID)
+    /api/filter?c=CATEGORY         /api/categories   /api/stats
+
+Payloads are content-addressed (static_api/ab/abcdef....json plus .gz and
+.br), so a re-export after a recompute only compresses the payloads that
+actually changed and identical responses share one file. manifest.json maps
+route -> payload hash and records the sha256 of the catalog it was rendered
+from; server.js ignores a manifest that doesn't match the database it loaded.
+Brotli variants need the `brotli` package and are skipped without it.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+OUT = ROOT.parent / 'static_api'
+
+MANIFEST_VERSION = 1
+PAGE_LIMIT = 20      # server.js default `limit` for /api/recipes
+FILTER_LIMIT = 100   # server.js caps /api/filter at 100 meals
+MINIMAL_FIELDS = ('idMeal', 'strMeal', 'strMealThumb', 'strCategory', 'strMealType', 'good_for', 'price_planned')
+SUFFIXES = {'identity': '.json', 'gzip': '.json.gz', 'br': '.json.br'}
+
+
+def js_value(obj):
+    """Coerce values so json.dumps prints numbers the way JSON.stringify does:
+    integral floats without '.0', NaN/Infinity as null. Other floats keep
+    Python's repr, which agrees with JS from 1e-4 up."""
+    if isinstance(obj, float):
+        if not math.isfinite(obj):
+            return None
+        return int(obj) if obj.is_integer() and abs(obj) < 1e21 else obj
+    if isinstance(obj, dict):
+        return {k: js_value(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [js_value(v) for v in obj]
+    return obj
+
+
+def render(obj):
+    return json.dumps(js_value(obj), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def minimal(r):
+    """server.js's list-item shape; fields missing on the recipe are left out like undefined."""
+    out = {f: r[f] for f in MINIMAL_FIELDS if f in r}
+    out['strMealType'] = r.get('strMealType') or 'main'
+    return {f: out[f] for f in MINIMAL_FIELDS if f in out}
+
+
+def payloads(db):
+    """Yield (route, response object) for every pre-rendered route."""
+    recipes = db.get('recipes') or []
+    by_id = {}
+    by_category = {}
+    for r in recipes:
+        by_id[str(r.get('idMeal'))] = r
+        if r.get('strCategory'):
+            by_category.setdefault(r['strCategory'], []).append(r)
+
+    pages = max(1, math.ceil(len(recipes) / PAGE_LIMIT))
+    for page in range(1, pages + 1):
+        meals = [minimal(r) for r in recipes[(page - 1) * PAGE_LIMIT:page * PAGE_LIMIT]]
+        yield (f'/api/recipes?page={page}&limit={PAGE_LIMIT}',
+               {'count': len(meals), 'page': page, 'total': len(recipes), 'meals': meals})
+    for mid, r in by_id.items():
+        yield f'/api/lookup?i={mid}', {'meals': [r]}
+    for cat, rs in by_category.items():
+        meals = [minimal(r) for r in rs[:FILTER_LIMIT]]
+        yield f'/api/filter?c={cat}', {'meals': meals or None}
+    yield '/api/categories', {'categories': db.get('categories') or []}
+    types = [r.get('strMealType') or 'main' for r in recipes]
+    yield '/api/stats', {'total': len(recipes),
+                         'byMealType': {'main': types.count('main'), 'side': types.count('side')},
+                         'byCategory': {cat: len(rs) for cat, rs in by_category.items()}}
+
+
+def encode(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=11)
+    return body
+
+
+def payload_path(out, digest, encoding):
+    return Path(out) / digest[:2] / (digest + SUFFIXES[encoding])
+
+
+def write_bytes(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    tmp.replace(path)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def export(db_path=DB, out=OUT):
+    """Render every route, write missing payload files, drop unreferenced ones
+    and replace the manifest. Returns the manifest."""
+    out = Path(out)
+    with open(db_path, 'r', encoding='utf-8') as f:
+        db = json.load(f)
+    encodings = ['identity', 'gzip'] + (['br'] if brotli else [])
+    routes = {}
+    entries = {}
+    written = 0
+    for route, obj in payloads(db):
+        body = render(obj)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        routes[route] = digest
+        if digest in entries:
+            continue
+        entry = entries[digest] = {}
+        for encoding in encodings:
+            path = payload_path(out, digest, encoding)
+            if not path.exists():
+                write_bytes(path, encode(body, encoding))
+                written += 1
+            tag = digest if encoding == 'identity' else f'{digest}-{encoding}'
+            entry[encoding] = {'etag': f'"{tag}"', 'bytes': path.stat().st_size}
+
+    manifest = {'version': MANIFEST_VERSION, 'source': Path(db_path).name,
+                'source_sha256': file_sha256(db_path), 'encodings': encodings,
+                'routes': routes, 'payloads': entries}
+    write_bytes(out / 'manifest.json', json.dumps(manifest, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    keep = {payload_path(out, d, e) for d in entries for e in encodings}
+    removed = 0
+    for path in out.glob('??/*.json*'):
+        if path not in keep:
+            path.unlink()
+            removed += 1
+    for sub in out.glob('??'):
+        if sub.is_dir() and not any(sub.iterdir()):
+            sub.rmdir()
+    manifest['stats'] = {'routes': len(routes), 'payloads': len(entries), 'written': written, 'removed': removed}
+    return manifest
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Pre-render and pre-compress the cacheable API responses')
+    ap.add_argument('--db', default=str(DB))
+    ap.add_argument('--out', default=str(OUT))
+    args = ap.parse_args()
+    manifest = export(args.db, args.out)
+    s = manifest['stats']
+    print(f"{s['routes']} routes -> {s['payloads']} payloads ({', '.join(manifest['encodings'])}); "
+          f"wrote {s['written']} files, removed {s['removed']}")
+    if not brotli:
+        print('brotli not installed: no .br variants (pip install brotli)')
+    print(f'Wrote {Path(args.out) / "manifest.json"}')
+
+
+if __name__ == '__main__':
+    main()
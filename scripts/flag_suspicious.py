@@ -1,36 +1,27 @@
 import json
 from pathlib import Path
-from ingredient_parser import parse_measure, canonicalize_ingredient
+import catalog_context
 
 ROOT = Path(__file__).resolve().parent
 NEW = ROOT.parent / 'database.updated.json'
 
+# expected large water/broth entries are skipped
+IGNORE = ['water', 'broth', 'stock', 'sauce']
+SMALL_UNITS = ['cup', 'tbsp', 'tsp', 'cups']
 
-def load(p):
-    with open(p, 'r', encoding='utf-8') as f:
-        return json.load(f)
 
-
-def main():
-    db = load(NEW)
-    flagged = []
-    IGNORE = ['water', 'broth', 'stock', 'sauce']
-    for r in db.get('recipes', []):
-        for i in range(1, 21):
-            ing = r.get(f'strIngredient{i}', '')
-            meas = r.get(f'strMeasure{i}', '')
-            if not ing or not meas:
-                continue
-            key = canonicalize_ingredient(ing)
-            grams = parse_measure(meas, key)
-            # skip expected large water/broth entries
-            if any(x in ing.lower() for x in IGNORE):
-                continue
-            # flag if grams are implausibly large for small-volume units
-            if grams > 500 and any(u in meas.lower() for u in ['cup', 'tbsp', 'tsp', 'cups']):
-                flagged.append({'idMeal': r.get('idMeal'), 'name': r.get('strMeal'), 'ingredient': ing, 'measure': meas, 'grams': grams})
-            # flag if a single ingredient contributes >1000 kcal
-            # (derive by looking up nutrition if available)
+def main(ctx=None):
+    ctx = ctx or catalog_context.Context()
+    conn = ctx.store([NEW])
+    # flag if grams are implausibly large for small-volume units
+    skip = ' AND '.join("instr(lower(l.ingredient), ?) = 0" for _ in IGNORE)
+    unit = ' OR '.join("instr(lower(l.measure), ?) > 0" for _ in SMALL_UNITS)
+    rows = conn.execute(f"""
+        SELECT r.id_meal, r.name, l.ingredient, l.measure, l.grams
+        FROM ingredient_lines l JOIN recipes r ON r.source = l.source AND r.id_meal = l.id_meal
+        WHERE l.source = ? AND l.grams > 500 AND {skip} AND ({unit})
+        ORDER BY r.position, l.slot""", [NEW.name, *IGNORE, *SMALL_UNITS])
+    flagged = [{'idMeal': row['id_meal'], 'name': row['name'], 'ingredient': row['ingredient'], 'measure': row['measure'], 'grams': row['grams']} for row in rows]
     out = ROOT / 'flagged_measures.json'
     with open(out, 'w', encoding='utf-8') as f:
         json.dump({'flagged': flagged}, f, ensure_ascii=False, indent=2)
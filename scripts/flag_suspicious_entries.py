@@ -1,5 +1,6 @@
 import json
 from pathlib import Path
+import catalog_context
 
 ROOT = Path(__file__).resolve().parent
 NUTR = ROOT / 'nutrition_lookup.json'
@@ -9,14 +10,10 @@ OUT = ROOT / 'suspicious_nutrition.json'
 THRESH_CAL = 200
 
 
-def load(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def main():
-    nutr = load(NUTR)
-    br = load(BREAK)
+def main(ctx=None):
+    ctx = ctx or catalog_context.Context()
+    nutr = ctx.json(NUTR)
+    br = ctx.json(BREAK)
     bad = []
     for k, v in nutr.items():
         per = v.get('per_100g', {})
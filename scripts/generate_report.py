@@ -1,23 +1,14 @@
 import json
 from pathlib import Path
+import catalog_context
 
 ROOT = Path(__file__).resolve().parent
 OLD = ROOT.parent / 'database.json.bak'
 NEW = ROOT.parent / 'database.updated.json'
 
 
-def load(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def main():
-    try:
-        old = load(OLD)
-    except Exception:
-        # fallback to original database.json if .bak is malformed
-        old = load(ROOT.parent / 'database.json')
-    new = load(NEW)
+def compute_changes(old, new):
+    """Calorie/price delta rows of `new`'s recipes against `old`, biggest calorie change first."""
     old_map = {r.get('idMeal'): r for r in old.get('recipes', [])}
     changes = []
     for r in new.get('recipes', []):
@@ -33,9 +24,20 @@ def main():
         changes.append({'idMeal': mid, 'name': r.get('strMeal'), 'old_cal': old_cal, 'new_cal': new_cal, 'cal_delta': cal_delta, 'old_price': val(o,'price') or 0, 'new_price': val(r,'price') or 0, 'price_delta': price_delta})
 
     changes.sort(key=lambda x: abs(x['cal_delta']), reverse=True)
+    return changes
+
+
+def main(ctx=None):
+    ctx = ctx or catalog_context.Context()
+    # fallback to original database.json if .bak is malformed
+    old = ctx.first(OLD, ROOT.parent / 'database.json')
+    new = ctx.json(NEW)
+    changes = compute_changes(old, new)
     out = ROOT / 'report_changes.json'
+    report = {'summary_count': len(changes), 'top': changes[:50]}
     with open(out, 'w', encoding='utf-8') as f:
-        json.dump({'summary_count': len(changes), 'top': changes[:50]}, f, ensure_ascii=False, indent=2)
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    ctx.put(out, report)
     print(f'Wrote report to {out}')
     # produce a validation sample (top 20 by calorie delta) with full recipe details
     top_ids = [c['idMeal'] for c in changes[:20]]
@@ -0,0 +1,319 @@
+"""Perceptual-hash index of recipe thumbnails: shared, placeholder and near-identical images.
+
+Usage:
+    python image_index.py [--fetch] [--db ../database.json] [--cache ../image_cache]
+                          [--radius 6] [--workers N] [--full]   (writes image_report.json)
+
+--fetch downloads every strMealThumb URL not yet in the cache (one file per
+URL, named by its sha1). Each cached image is decoded once to grayscale
+(Pillow, `pip install pillow`) and hashed twice, both 64-bit: dHash (sign of
+horizontal gradients on a 9x8 shrink) and pHash (sign against the median of
+the low 8x8 DCT coefficients of a 32x32 shrink, DC term excluded). Hashing
+runs in a process pool; image_index.json keeps every file's size, mtime and
+hashes, so a re-run only hashes new or changed files.
+
+The pHashes go into a BK-tree (a metric tree over Hamming distance, where a
+radius query only descends into children whose edge distance is within
+radius of the query's distance to the node), and images within --radius bits
+of each other are joined into clusters. The report lists clusters that span
+more than one recipe -- the same photo (or a crop/recompression of it) shown
+for different dishes -- next to URLs literally shared by several recipes,
+placeholder thumbnails and images that could not be fetched or decoded.
+"""
+import argparse
+import hashlib
+import os
+import re
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+import numpy as np
+import catalog_context
+import ingredient_parser as ip
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+CACHE = ROOT.parent / 'image_cache'
+STATE = ROOT / 'image_index.json'
+OUT = ROOT / 'image_report.json'
+
+STATE_VERSION = 1
+DEFAULT_RADIUS = 6
+FETCH_TIMEOUT = 20
+FETCH_THREADS = 8
+USER_AGENT = 'recipe-api-image-index/1.0'
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+# generated or generic thumbnails (add_recipes.py's tbn:vegetable_{idx}), and anything that is not a URL
+PLACEHOLDER_RE = re.compile(r'tbn:[a-z]+_\d+$|^(?!https?://)', re.I)
+
+
+def cache_name(url):
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:24] + (ext if ext in EXTENSIONS else '.img')
+
+
+def recipe_thumbs(recipes):
+    """{url: [(idMeal, strMeal)]} in catalog order."""
+    out = defaultdict(list)
+    for r in recipes:
+        url = (r.get('strMealThumb') or '').strip()
+        out[url].append((str(r.get('idMeal')), r.get('strMeal')))
+    return out
+
+
+def fetch_one(url, path, timeout=FETCH_TIMEOUT):
+    """Download `url` to `path` (atomically); None on success, else the error."""
+    req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            data = resp.read()
+    except Exception as e:  # HTTP errors, timeouts, bad URLs: reported per image
+        return f'{type(e).__name__}: {e}'
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return None
+
+
+def fetch(urls, cache=CACHE, threads=FETCH_THREADS):
+    """Download the URLs missing from the cache; {url: error} for the ones that failed."""
+    cache = Path(cache)
+    cache.mkdir(parents=True, exist_ok=True)
+    todo = [u for u in urls if not PLACEHOLDER_RE.search(u) and not (cache / cache_name(u)).exists()]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        errors = pool.map(lambda u: fetch_one(u, cache / cache_name(u)), todo)
+        return {u: e for u, e in zip(todo, errors) if e}
+
+
+def shrink(pixels, h, w):
+    """Area-average a 2-D array down to h x w (every source pixel counts once)."""
+    a = np.asarray(pixels, dtype=np.float64)
+    rows = np.linspace(0, a.shape[0], h + 1).astype(int)[:-1]
+    cols = np.linspace(0, a.shape[1], w + 1).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(a, rows, axis=0), cols, axis=1)
+    counts = np.outer(np.diff(np.append(rows, a.shape[0])), np.diff(np.append(cols, a.shape[1])))
+    return sums / counts
+
+
+def bits_to_int(bits):
+    out = 0
+    for b in np.asarray(bits).ravel():
+        out = (out << 1) | int(bool(b))
+    return out
+
+
+def dhash(pixels):
+    small = shrink(pixels, 8, 9)
+    return bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+_DCT = {}
+
+
+def dct_matrix(n):
+    if n not in _DCT:
+        k = np.arange(n)[:, None]
+        m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+        m[0] /= np.sqrt(2)
+        _DCT[n] = m
+    return _DCT[n]
+
+
+def phash(pixels):
+    d = dct_matrix(32)
+    low = (d @ shrink(pixels, 32, 32) @ d.T)[:8, :8].ravel()[1:]
+    return bits_to_int(np.append(low > np.median(low), False))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def load_gray(path):
+    if Image is None:
+        raise RuntimeError('decoding images needs Pillow (pip install pillow)')
+    with Image.open(path) as im:
+        return np.asarray(im.convert('L'))
+
+
+def hash_file(path):
+    """(phash, dhash, sha256) as hex strings; runs in a worker process."""
+    data = Path(path).read_bytes()
+    pixels = load_gray(path)
+    return f'{phash(pixels):016x}', f'{dhash(pixels):016x}', hashlib.sha256(data).hexdigest()
+
+
+def _hash_or_error(path):
+    try:
+        return hash_file(path)
+    except Exception as e:  # truncated downloads, HTML error pages saved as .jpg
+        return f'{type(e).__name__}: {e}'
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, h, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [h, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def query(self, h, radius):
+        """[(distance, item)] for every stored hash within `radius` of `h`."""
+        out, stack = [], [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                out.extend((d, item) for item in node[1])
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return out
+
+
+def new_state():
+    return {'version': STATE_VERSION, 'images': {}}
+
+
+def load_state(path=STATE):
+    try:
+        state = ip.load_json(path)
+    except (OSError, ValueError):
+        return new_state()
+    return state if state.get('version') == STATE_VERSION else new_state()
+
+
+def update(state, cache=CACHE, workers=None, hasher=_hash_or_error, full=False):
+    """Hash new or changed cache files in a process pool; drops entries of deleted
+    files. Returns {'hashed', 'kept', 'removed'}."""
+    cache = Path(cache)
+    files = {p.name: p.stat() for p in sorted(cache.iterdir())
+             if p.is_file() and not p.name.endswith('.tmp')} if cache.is_dir() else {}
+    images = state['images']
+    removed = [name for name in images if name not in files]
+    for name in removed:
+        del images[name]
+    todo = [name for name, st in files.items() if full or name not in images
+            or images[name]['size'] != st.st_size or images[name]['mtime_ns'] != st.st_mtime_ns]
+    if len(todo) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(hasher, [cache / n for n in todo], chunksize=max(1, len(todo) // 64)))
+    else:
+        results = [hasher(cache / n) for n in todo]
+    for name, res in zip(todo, results):
+        entry = {'size': files[name].st_size, 'mtime_ns': files[name].st_mtime_ns}
+        if isinstance(res, str):
+            entry['error'] = res
+        else:
+            entry['phash'], entry['dhash'], entry['sha256'] = res
+        images[name] = entry
+    return {'hashed': len(todo), 'kept': len(files) - len(todo), 'removed': len(removed)}
+
+
+def clusters(hashes, radius=DEFAULT_RADIUS):
+    """Groups of names whose pHashes chain within `radius` bits (union-find over BK-tree hits)."""
+    tree = BKTree()
+    for name, h in hashes.items():
+        tree.add(h, name)
+    parent = {name: name for name in hashes}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for name, h in hashes.items():
+        for _d, other in tree.query(h, radius):
+            ra, rb = find(name), find(other)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+    groups = defaultdict(list)
+    for name in hashes:
+        groups[find(name)].append(name)
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: (-len(g), g[0]))
+
+
+def build_report(thumbs, state, radius=DEFAULT_RADIUS, fetch_errors=None):
+    images = state['images']
+    by_name = {cache_name(url): url for url in thumbs if not PLACEHOLDER_RE.search(url)}
+    hashed = {n: int(images[n]['phash'], 16) for n in by_name if 'phash' in images.get(n, {})}
+
+    def recipes_of(urls):
+        return [{'idMeal': m, 'strMeal': name} for u in urls for m, name in thumbs[u]]
+
+    near = []
+    for group in clusters(hashed, radius):
+        urls = [by_name[n] for n in group]
+        recipes = recipes_of(urls)
+        if len(recipes) > 1:
+            distinct = len({images[n]['sha256'] for n in group})
+            spread = max(hamming(hashed[a], hashed[b]) for a in group for b in group)
+            near.append({'kind': 'identical' if distinct == 1 else 'near_identical', 'max_distance': spread,
+                         'urls': urls, 'recipes': recipes})
+    return {
+        'images': len(by_name), 'hashed': len(hashed), 'radius': radius,
+        'shared_urls': [{'url': u, 'recipes': recipes_of([u])} for u, rs in thumbs.items()
+                        if len(rs) > 1 and u and not PLACEHOLDER_RE.search(u)],
+        'placeholders': [{'url': u, 'recipes': recipes_of([u])} for u in thumbs if PLACEHOLDER_RE.search(u)],
+        'clusters': near,
+        'unavailable': [{'url': u, 'error': (fetch_errors or {}).get(u) or images.get(n, {}).get('error')
+                         or 'not cached', 'recipes': recipes_of([u])}
+                        for n, u in by_name.items() if n not in hashed],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Find shared, placeholder and near-identical recipe thumbnails')
+    ap.add_argument('--db', type=Path, default=DB)
+    ap.add_argument('--cache', type=Path, default=CACHE)
+    ap.add_argument('--out', type=Path, default=OUT)
+    ap.add_argument('--fetch', action='store_true', help='download thumbnails missing from the cache')
+    ap.add_argument('--radius', type=int, default=DEFAULT_RADIUS, help='max pHash Hamming distance in a cluster')
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--full', action='store_true', help='re-hash every cached image')
+    args = ap.parse_args(argv)
+
+    thumbs = recipe_thumbs(catalog_context.Context().json(args.db).get('recipes', []))
+    errors = fetch(list(thumbs), args.cache) if args.fetch else {}
+    if Image is None:
+        print('Pillow not installed: cached images are not hashed (pip install pillow)')
+    state = load_state()
+    stats = update(state, args.cache, args.workers, full=args.full) if Image is not None else \
+        {'hashed': 0, 'kept': len(state['images']), 'removed': 0}
+    catalog_context.write_json(STATE, state, None, separators=(',', ':'))
+    report = build_report(thumbs, state, args.radius, errors)
+    catalog_context.write_json(args.out, report, 2)
+    print(f"{report['images']} thumbnail URLs: hashed {stats['hashed']}, unchanged {stats['kept']}, "
+          f"dropped {stats['removed']}; {len(report['shared_urls'])} shared URLs, "
+          f"{len(report['placeholders'])} placeholders, {len(report['clusters'])} cross-recipe clusters, "
+          f"{len(report['unavailable'])} unavailable")
+    print(f'Wrote {args.out}')
+
+
+if __name__ == '__main__':
+    main()
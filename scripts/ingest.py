@@ -0,0 +1,297 @@
+"""Bulk recipe ingestion: CSV/JSONL batches -> validated, costed recipes appended to database.json.
+
+Usage: python ingest.py batch1.jsonl batch2.csv [--db ../database.json] [--workers N] [--dry-run]
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import chain, islice
+from pathlib import Path
+import aggregates
+import catalog_context
+import derived_store as ds
+import diet_tags
+import export_static
+import ingredient_parser as ip
+import instructions
+import skyline
+from shared_lookups import LookupTables
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+NUTR = ROOT / 'nutrition_lookup.json'
+PRICE = ROOT / 'price_lookup.json'
+
+MAX_SLOTS = 20
+MIN_SLOTS = 10  # database.json always carries at least 10 (possibly empty) slots
+WINDOW = 2000   # records handed to the pool per round-trip; bounds memory
+MEAL_TYPES = ('main', 'side')
+MAX_REJECTS = 100
+REQUIRED = ('strMeal', 'strCategory')
+TEXT_FIELDS = REQUIRED + ('strArea', 'strMealThumb', 'strInstructions')
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_records(path):
+    """Yield (line number, record) from a .csv or .jsonl batch one row at a time."""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.suffix.lower() == '.csv':
+            for n, row in enumerate(csv.DictReader(f), start=2):
+                yield n, row
+            return
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield n, json.loads(line)
+            except ValueError as e:
+                yield n, {'_error': f'invalid JSON: {e}'}
+
+
+def record_ingredients(rec):
+    """Ingredient (name, measure) pairs from either an `ingredients` list or strIngredientN/strMeasureN."""
+    if rec.get('ingredients') is not None:
+        pairs = []
+        for item in rec['ingredients']:
+            if isinstance(item, dict):
+                pairs.append((item.get('name', ''), item.get('measure', '')))
+            else:
+                name, measure = (list(item) + ['', ''])[:2]
+                pairs.append((name, measure))
+        return pairs
+    pairs = []
+    n = 1
+    while f'strIngredient{n}' in rec:
+        pairs.append((rec.get(f'strIngredient{n}'), rec.get(f'strMeasure{n}')))
+        n += 1
+    return pairs
+
+
+def normalize(rec):
+    """Validate one raw record. Returns (recipe dict without idMeal, list of errors)."""
+    if not isinstance(rec, dict):
+        return None, ['record is not an object']
+    if rec.get('_error'):
+        return None, [rec['_error']]
+    errors = []
+    for field in TEXT_FIELDS:
+        value = rec.get(field)
+        if value is not None and not isinstance(value, str):
+            errors.append(f'{field} is not a string')
+        elif field in REQUIRED and not (value or '').strip():
+            errors.append(f'missing {field}')
+    try:
+        pairs = [(str(a or '').strip(), str(b or '').strip()) for a, b in record_ingredients(rec)]
+    except (TypeError, ValueError):
+        pairs = []
+        errors.append('malformed ingredients')
+    pairs = [(a, b) for a, b in pairs if a]
+    if not pairs:
+        errors.append('no ingredients')
+    if len(pairs) > MAX_SLOTS:
+        errors.append(f'{len(pairs)} ingredients (max {MAX_SLOTS})')
+    servings = rec.get('servings') or rec.get('good_for') or 4
+    try:
+        servings = int(servings)
+        if servings <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        errors.append(f'bad servings {servings!r}')
+    meal_type = str(rec.get('strMealType') or 'main').strip().lower()
+    if meal_type not in MEAL_TYPES:
+        errors.append(f'bad strMealType {meal_type!r}')
+    if errors:
+        return None, errors
+
+    recipe = {
+        'strMeal': rec['strMeal'].strip(),
+        'strMealThumb': rec.get('strMealThumb') or '',
+        'strCategory': rec['strCategory'].strip(),
+        'strArea': rec.get('strArea') or 'Filipino',
+        'strInstructions': rec.get('strInstructions') or '',
+    }
+    for i in range(1, max(MIN_SLOTS, len(pairs)) + 1):
+        name, measure = pairs[i - 1] if i <= len(pairs) else ('', '')
+        recipe[f'strIngredient{i}'] = name
+        recipe[f'strMeasure{i}'] = measure
+    recipe['strYoutube'] = rec.get('strYoutube') or ''
+    recipe['good_for'] = servings
+    recipe['strMealType'] = meal_type
+    return recipe, []
+
+
+def state_path(db_path):
+    """Where the ingest state of a catalog lives: next to it, e.g. database.ingest_state.json."""
+    db_path = Path(db_path)
+    return db_path.with_name(db_path.stem + '.ingest_state.json')
+
+
+def load_state(recipes, path):
+    """Id high-water mark. Only the last recipe is checked so ids assigned by other
+    writers since the previous run are still skipped without a full scan."""
+    try:
+        state = load(path)
+    except (OSError, ValueError):
+        state = {}
+    if 'next_id' not in state:
+        state['next_id'] = max((int(r['idMeal']) for r in recipes if str(r.get('idMeal', '')).isdigit()), default=0) + 1
+    if recipes and str(recipes[-1].get('idMeal', '')).isdigit():
+        state['next_id'] = max(state['next_id'], int(recipes[-1]['idMeal']) + 1)
+    return state
+
+
+_LOOKUPS = None
+_TABLES = None
+
+
+def _init_worker(shm_name):
+    """Attach to the lookup tables the parent published; nothing is unpickled per worker."""
+    global _LOOKUPS, _TABLES
+    _TABLES = LookupTables.attach(shm_name)
+    _LOOKUPS = (_TABLES.nutrition, _TABLES.prices)
+
+
+def enrich(recipe):
+    """Canonicalize, parse measures, cost and time one recipe (runs in a pool worker)."""
+    nutr, price = _LOOKUPS
+    cfg = ip.CONFIG
+    total, total_price, used_keys = ip.compute_totals(recipe, nutr, price, cfg)
+    servings = ip.recipe_servings(recipe)
+    recipe['calories'] = round(total['calories'])
+    recipe['protein'] = round(total['protein'])
+    recipe['carbs'] = round(total['carbs'])
+    recipe['fat'] = round(total['fat'])
+    recipe['price'] = round(total_price)
+    recipe['calories_per_serving'] = round(recipe['calories'] / servings)
+    recipe['price_per_serving'] = round(recipe['price'] / servings)
+    sources = set()
+    for k in used_keys:
+        if k in nutr:
+            sources.add(nutr[k]['source'])
+        if k in price:
+            sources.add(price[k].get('source', ''))
+    recipe['sources'] = sorted(sources)
+    recipe['calculated_at'] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    recipe['parser_version'] = cfg.version
+    instructions.annotate(recipe)
+    return recipe
+
+
+def _indent(text, pad):
+    return text.replace('\n', '\n' + pad)
+
+
+def write_db(path, db, spool_path):
+    """Write db with the spooled recipes appended to `recipes`, atomically.
+    Output matches json.dump(db, indent=2, ensure_ascii=False)."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f, open(spool_path, 'r', encoding='utf-8') as spool:
+            f.write('{')
+            first_key = True
+            for key, value in chain(db.items(), [] if 'recipes' in db else [('recipes', [])]):
+                f.write(('\n' if first_key else ',\n') + '  ' + json.dumps(key) + ': ')
+                first_key = False
+                if key != 'recipes':
+                    f.write(_indent(json.dumps(value, ensure_ascii=False, indent=2), '  '))
+                    continue
+                first = True
+                for r in chain(value, (json.loads(line) for line in spool)):
+                    f.write(('[\n' if first else ',\n') + '    ' + _indent(json.dumps(r, ensure_ascii=False, indent=2), '    '))
+                    first = False
+                f.write('[]' if first else '\n  ]')
+            f.write('\n}')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def ingest(records, db_path=DB, workers=None, dry_run=False):
+    """Ingest (source, line, raw record) triples. Accepted recipes are enriched in a
+    process pool, spooled to disk and committed to db_path in a single atomic write."""
+    db = load(db_path)
+    state = load_state(db.get('recipes', []), state_path(db_path))
+    stats = {'read': 0, 'accepted': 0, 'rejected': 0, 'first_id': state['next_id']}
+    rejects = []
+
+    def accepted():
+        for source, n, rec in records:
+            stats['read'] += 1
+            recipe, errors = normalize(rec)
+            if errors:
+                stats['rejected'] += 1
+                if len(rejects) < MAX_REJECTS:
+                    rejects.append({'source': str(source), 'line': n, 'errors': errors})
+                continue
+            recipe = {'idMeal': str(state['next_id']), **recipe}
+            state['next_id'] += 1
+            yield recipe
+
+    fd, spool_path = tempfile.mkstemp(prefix='ingest.', suffix='.jsonl', dir=ROOT)
+    shm = LookupTables.load(NUTR, PRICE).publish()
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as spool, \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shm.name,)) as pool:
+            it = accepted()
+            while True:
+                window = list(islice(it, WINDOW))
+                if not window:
+                    break
+                for recipe in pool.map(enrich, window, chunksize=max(1, len(window) // 32)):
+                    spool.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+                    stats['accepted'] += 1
+        if stats['accepted'] and not dry_run:
+            write_db(db_path, db, spool_path)
+            with open(state_path(db_path), 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=2)
+            if catalog_context.is_served(db_path):
+                ds.refresh(ds.open_store(), [db_path])
+                export_static.export(db_path)
+                diet_tags.export(db_path)
+                skyline.export(db_path)
+                aggregates.export(db_path)
+    finally:
+        os.unlink(spool_path)
+        shm.close()
+        shm.unlink()
+    stats['rejects'] = rejects
+    return stats
+
+
+def ingest_files(paths, **kwargs):
+    records = ((path, n, rec) for path in paths for n, rec in read_records(path))
+    return ingest(records, **kwargs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Bulk-ingest CSV/JSONL recipe batches into database.json')
+    ap.add_argument('batches', nargs='+')
+    ap.add_argument('--db', default=str(DB))
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--dry-run', action='store_true')
+    args = ap.parse_args()
+    stats = ingest_files(args.batches, db_path=args.db, workers=args.workers, dry_run=args.dry_run)
+    print(f"Read {stats['read']}, accepted {stats['accepted']}, rejected {stats['rejected']}")
+    if stats['accepted']:
+        print(f"Assigned ids {stats['first_id']}..{stats['first_id'] + stats['accepted'] - 1}"
+              + (' (dry run, nothing written)' if args.dry_run else f' -> {args.db}'))
+    for rej in stats['rejects'][:20]:
+        print(f"  rejected {rej['source']}:{rej['line']}: {'; '.join(rej['errors'])}")
+
+
+if __name__ == '__main__':
+    main()
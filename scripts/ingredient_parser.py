@@ -1,215 +1,188 @@
+import hashlib
 import json
+import os
 import re
+import sys
 from datetime import datetime
-
-ROOT = ".."
-DB_PATH = "../database.json"
-NUTR_PATH = "./nutrition_lookup.json"
-PRICE_PATH = "./price_lookup.json"
-
-# Basic unit conversions to grams (approx)
-UNIT_TO_G = {
-    "kg": 1000,
-    "g": 1,
-    "ml": 1,
-    "l": 1000,
-    "mg": 0.001,
-    "lb": 453.592,
-    "oz": 28.3495,
-    "tbsp": 15,  # general water-equivalent
-    "tbsp(s)": 15,
-    "tbs": 15,
-    "tsp": 5,
-    "cup": 240,
-    "cups": 240,
-    "piece": None, # depends on ingredient
-    "pieces": None,
-    "head": None
-}
-
-# map common ingredient phrases to canonical keys in nutrition_lookup.json
-ING_MAP = {
-    "pork hocks/pata": "pork_hock",
-    "pork hock": "pork_hock",
-    "pork hocks": "pork_hock",
-    "pork ears": "pork_ears",
-    "pork snout": "pork_snout",
-    "pork belly": "pork_belly",
-    "garlic": "garlic",
-    "bay leaves": "bay_leaf",
-    "bay leaf": "bay_leaf",
-    "whole peppercorns": "peppercorns",
-    "peppercorns": "peppercorns",
-    "salt": "salt",
-    "vinegar": "vinegar",
-    "soy sauce": "soy_sauce",
-    "onion": "onion",
-    "egg": "egg",
-    "shrimp": "shrimp",
-    "ground pork": "ground_pork",
-    "palabok noodles": "noodles",
-    "noodles": "noodles",
-}
-
-# additional common mappings
-ING_MAP.update({
-    "rice": "rice",
-    "white rice": "rice",
-    "cooked rice": "cooked_rice",
-    "coconut milk": "coconut_milk",
-    "coconut milk (canned)": "coconut_milk",
-    "sugar": "sugar",
-    "brown sugar": "sugar",
-    "all purpose flour": "flour",
-    "flour": "flour",
-    "cornstarch": "cornstarch",
-    "corn starch": "cornstarch",
-    "vegetable oil": "cooking_oil",
-    "cooking oil": "cooking_oil",
-    "fish sauce": "fish_sauce",
-    "banana ketchup": "banana_ketchup",
-    "ketchup": "banana_ketchup",
-    "chicharon": "chicharon",
-    "butter": "butter",
-    "milk": "milk",
-    "bread": "bread",
-    "tomato paste": "tomato_paste",
-    "tomato sauce": "tomato_paste",
-    "chili peppers": "chili_peppers",
-    "chili pepper": "chili_peppers",
-    "calamansi": "calamansi",
-    "tamarind": "tamarind",
-    "tamarind mix": "tamarind",
-    "annatto": "annatto",
-    "shrimp broth": "shrimp_broth",
-    "chicken broth": "chicken_broth",
-    "beef broth": "beef_broth",
-    "pork broth": "pork_broth",
-    "water": "water",
-    "bangus": "bangus",
-    "whole bangus": "bangus",
-    "whole bangus milkfish": "bangus",
-    "whole bangus (milkfish)": "bangus",
-    "carrots": "carrot",
-    "carrot": "carrot",
-    "bell pepper": "bell_pepper",
-    "bell peppers": "bell_pepper",
-    "ginger": "ginger",
-    "potatoes": "potato",
-    "potato": "potato",
-    "corn on the cob": "corn_on_the_cob",
-    "corn on the cob (sliced)": "corn_on_the_cob",
-    "pechay": "bok_choy",
-    "pechay (bok choy)": "bok_choy",
-    "bok choy": "bok_choy",
-    "mung beans": "mung_beans",
-    "mung beans (monggo)": "mung_beans",
-    "pork innards": "pork_innards",
-    "pork innards/meat": "pork_innards",
-    "pork blood": "pork_blood",
-    "pork shoulder": "pork_shoulder",
-    "beef shank": "beef_shank",
-    "beef shank with bone marrow": "beef_shank",
-    "pineapple juice": "pineapple_juice",
-    "red food coloring": "red_food_coloring",
-    "bitter gourd leaves": "bitter_gourd_leaves",
-    "tomatoes": "tomato",
-    "long green chili (siling haba)": "chili_peppers",
-    "green bell pepper": "bell_pepper",
-    "eggplant": "eggplant",
-    "kangkong": "kangkong",
-    "okra": "okra",
-    "squash": "squash_kalabasa",
-    "squash (kalabasa)": "squash_kalabasa",
-    "radish": "radish_labanos",
-    "radish (labanos)": "radish_labanos",
-    "long beans": "long_beans_sitaw",
-    "long beans (sitaw)": "long_beans_sitaw",
-    "sitaw": "long_beans_sitaw",
-    "hard-boiled eggs": "egg",
-    "hard boiled eggs": "egg",
-    "hard-boiled_eggs": "egg",
-    "quail eggs": "egg",
-    "quail eggs (optional)": "egg",
-    "quail_eggs_optional": "egg",
-    "beef shanks with marrow": "beef_shank",
-    "beef_shanks_with_marrow": "beef_shank",
-    "large shrimps (sugpo)": "shrimp",
-    "large_shrimps_sugpo": "shrimp",
-    "large shrimps sugpo": "shrimp",
-    "large shrimp sugpo": "shrimp",
-})
-
-# heuristics for 'piece' or vague measures: per-item mass (grams)
-PER_ITEM_MASS = {
-    "garlic": 5,  # per clove 5g
-    "garlic_head": 30,
-    "egg": 50,
-    "onion": 150,
-    "tomato": 100,
-    "potato": 150,
-    "pork_hock": 1500,
-    "chicken": 1200,
-    "bangus": 400,
-    "eggplant": 150,
-    "kangkong": 100
-}
-PER_ITEM_MASS.setdefault('chicken', 1200)
-
-# per-ingredient unit overrides (unit -> grams) for more accurate conversions
-ING_UNIT_OVERRIDES = {
-    "bay_leaf": {"piece": 1},
-    "peppercorns": {"tbsp": 6, "piece": 0.2},
-    "garlic": {"clove": 5},
-    "noodles": {"cup": 120}
-}
-
-
-def resolve_overrides(ingredient_key):
+from pathlib import Path
+from types import MappingProxyType
+
+import catalog_context
+
+ROOT = Path(__file__).resolve().parent
+DB_PATH = ROOT.parent / 'database.json'
+OUT_PATH = ROOT.parent / 'database.updated.json'
+NUTR_PATH = ROOT / 'nutrition_lookup.json'
+PRICE_PATH = ROOT / 'price_lookup.json'
+
+CONFIG_PATH = ROOT / 'parser_config.json'
+UNIT_TABLE_PATH = ROOT / 'unit_table.json'
+WARN_LOG = 'suspicious_parse_warnings.log'  # relative to the cwd; None turns the log off
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+def _thaw(obj):
+    if isinstance(obj, MappingProxyType):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return [_thaw(v) for v in obj]
+    return obj
+
+
+def _version(obj):
+    return hashlib.sha1(json.dumps(obj, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
+
+class ParserConfig:
+    """Immutable parser configuration (parser_config.json) with its derived
+    indexes: alias classes, fuzzy-match patterns and the unit table.
+
+    Sections:
+      unit_to_g           unit -> grams, water-equivalent for volumes (null: depends on the ingredient)
+      unit_aliases        spellings matched by parse_measure -> the unit the tables are keyed by
+      count_units         resolve through overrides, then per_item_mass, then default_piece_g
+      volume_units        resolve through overrides, then unit_to_g
+      default_piece_g     small default piece mass so unknown pieces don't cause huge errors
+      per_item_mass       key -> grams per piece / clove / head
+      ing_unit_overrides  key -> {unit: grams}; 'vegetable' is the fuzzy fallback for greens
+      ing_map             ingredient phrase -> canonical key in nutrition_lookup.json
+      ing_aliases         synonym groups (Tagalog/English names, glosses) joined to ing_map classes
+
+    `version` changes with any section, `versions['names']` only with the
+    sections canonicalization reads. To change the configuration build a new
+    one and swap_config() it; readers keep the instance they started with.
+    """
+    NAME_SECTIONS = ('ing_map', 'ing_aliases')
+    SECTIONS = ('unit_to_g', 'unit_aliases', 'count_units', 'volume_units', 'default_piece_g',
+                'per_item_mass', 'ing_unit_overrides') + NAME_SECTIONS
+
+    def __init__(self, data, unit_keys=None):
+        missing = [s for s in self.SECTIONS if s not in data]
+        if missing:
+            raise ValueError(f'parser config is missing sections {missing}')
+        init = super().__setattr__
+        for section in self.SECTIONS:
+            init(section, _freeze(data[section]))
+        init('version', _version([data[s] for s in self.SECTIONS]))
+        init('versions', MappingProxyType({'names': _version([data[s] for s in self.NAME_SECTIONS])}))
+        classes, index = build_alias_index(self)
+        init('alias_classes', _freeze(classes))
+        init('alias_index', MappingProxyType(index))
+        init('fuzzy_patterns', build_fuzzy_patterns(self))
+        # a cache, not configuration: unit_grams() memoizes keys outside the prebuilt table
+        init('unit_table', build_unit_table(self, unit_keys))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ParserConfig is immutable; build a new one and swap_config() it')
+
+    @classmethod
+    def load(cls, path=CONFIG_PATH, unit_keys=None):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), unit_keys)
+
+    def to_dict(self):
+        """Plain, editable copy of the sections (e.g. to derive a modified config)."""
+        return {s: _thaw(getattr(self, s)) for s in self.SECTIONS}
+
+
+def resolve_overrides(ingredient_key, cfg=None):
     """Return unit overrides for an ingredient key with some fuzzy fallbacks.
     Useful for entries like 'assorted_vegetables_broccoli' which should use the
     generic 'vegetable' overrides when present."""
+    if cfg is None:
+        cfg = CONFIG
     if not ingredient_key:
         return {}
-    overrides = ING_UNIT_OVERRIDES.get(ingredient_key, {})
+    overrides = cfg.ing_unit_overrides.get(ingredient_key, {})
     if overrides:
         return overrides
     # fuzzy fallbacks
     if 'vegetable' in ingredient_key or 'vegetables' in ingredient_key or 'kangkong' in ingredient_key or 'greens' in ingredient_key:
-        return ING_UNIT_OVERRIDES.get('vegetable', {})
+        return cfg.ing_unit_overrides.get('vegetable', {})
     return {}
 
-# more overrides for commonly ambiguous units
-ING_UNIT_OVERRIDES.setdefault('rice', {})
-ING_UNIT_OVERRIDES['rice'].update({'cup': 185})
-ING_UNIT_OVERRIDES.setdefault('cooked_rice', {})
-ING_UNIT_OVERRIDES['cooked_rice'].update({'cup': 200})
-ING_UNIT_OVERRIDES.setdefault('coconut_milk', {})
-ING_UNIT_OVERRIDES['coconut_milk'].update({'can': 400, 'tbsp': 15})
-ING_UNIT_OVERRIDES.setdefault('butter', {})
-ING_UNIT_OVERRIDES['butter'].update({'tbsp': 14})
-ING_UNIT_OVERRIDES.setdefault('garlic', {})
-ING_UNIT_OVERRIDES['garlic'].update({'head': 30})
-# sensible default for mixed/assorted vegetables (approx 120g per cup)
-ING_UNIT_OVERRIDES.setdefault('vegetable', {})
-ING_UNIT_OVERRIDES['vegetable'].update({'cup': 120})
-ING_UNIT_OVERRIDES.setdefault('sugar', {})
-ING_UNIT_OVERRIDES['sugar'].update({'cup': 200})
-ING_UNIT_OVERRIDES.setdefault('flour', {})
-ING_UNIT_OVERRIDES['flour'].update({'cup': 120})
-ING_UNIT_OVERRIDES.setdefault('cornstarch', {})
-ING_UNIT_OVERRIDES['cornstarch'].update({'cup': 128, 'tbsp': 8})
-ING_UNIT_OVERRIDES.setdefault('condensed_milk', {})
-ING_UNIT_OVERRIDES['condensed_milk'].update({'cup': 306, 'tbsp': 19})
-ING_UNIT_OVERRIDES.setdefault('pie_crust', {})
-ING_UNIT_OVERRIDES['pie_crust'].update({'sheet': 120})
-ING_UNIT_OVERRIDES.setdefault('chicken_wings', {})
-ING_UNIT_OVERRIDES['chicken_wings'].update({'piece': 50})
-
-
-def parse_measure(measure_text, ingredient_key):
+
+def resolve_unit(ingredient_key, unit, cfg=None):
+    """Return (grams per unit, provenance) for a canonical key and table unit."""
+    if cfg is None:
+        cfg = CONFIG
+    overrides = resolve_overrides(ingredient_key, cfg)
+    if unit in overrides:
+        own = cfg.ing_unit_overrides.get(ingredient_key)
+        return overrides[unit], f'override:{ingredient_key}' if own else 'override:vegetable (fuzzy)'
+    if unit in cfg.count_units:
+        if cfg.per_item_mass.get(ingredient_key):
+            return cfg.per_item_mass[ingredient_key], f'per_item_mass:{ingredient_key}'
+        return cfg.default_piece_g, 'default_piece'
+    if cfg.unit_to_g.get(unit) is None:
+        return 0, 'unresolved'
+    return cfg.unit_to_g[unit], 'unit_to_g'
+
+
+def build_unit_table(cfg, keys=None):
+    """Resolve every (key, unit) pair once. Keys default to nutrition_lookup.json
+    plus the override/per-item tables; aliases share their unit's entry."""
+    if keys is None:
+        try:
+            keys = set(load_json(Path(__file__).resolve().parent / 'nutrition_lookup.json'))
+        except (OSError, ValueError):
+            keys = set()
+        keys |= set(cfg.ing_unit_overrides) | set(cfg.per_item_mass)
+    units = set(cfg.count_units) | set(cfg.volume_units)
+    for overrides in cfg.ing_unit_overrides.values():
+        units.update(overrides)
+    table = {}
+    for key in keys:
+        for unit in units:
+            table[(key, unit)] = resolve_unit(key, unit, cfg)
+        for alias, unit in cfg.unit_aliases.items():
+            table[(key, alias)] = table[(key, unit)]
+    return table
+
+
+def unit_grams(ingredient_key, unit, cfg=None):
+    """Grams per `unit` of `ingredient_key`; keys outside the table are resolved once and cached."""
+    if cfg is None:
+        cfg = CONFIG
+    hit = cfg.unit_table.get((ingredient_key, unit))
+    if hit is None:
+        hit = resolve_unit(ingredient_key, cfg.unit_aliases.get(unit, unit), cfg)
+        cfg.unit_table[(ingredient_key, unit)] = hit
+    return hit[0]
+
+
+def dump_unit_table(path=UNIT_TABLE_PATH, cfg=None):
+    """Write {key: {unit: {grams, source}}} for auditing conversions (aliases omitted)."""
+    if cfg is None:
+        cfg = CONFIG
+    out = {}
+    for (key, unit), (grams, source) in sorted(cfg.unit_table.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+        if key is None or unit in cfg.unit_aliases:
+            continue
+        out.setdefault(key, {})[unit] = {'grams': grams, 'source': source}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(out, f, ensure_ascii=False, indent=2)
+    return len(out)
+
+
+def parse_measure(measure_text, ingredient_key, cfg=None):
+    return parse_measure_rule(measure_text, ingredient_key, cfg)[0]
+
+
+def parse_measure_rule(measure_text, ingredient_key, cfg=None):
+    """Like parse_measure but returns (grams, rule id) naming the branch that
+    produced the value, e.g. 'count', 'volume' or 'bare_number'."""
+    if cfg is None:
+        cfg = CONFIG
     if not measure_text:
-        return 0.0
+        return 0.0, 'empty'
     measure_text = measure_text.strip().lower()
 
     # try to find explicit kg/g like "1.5kg" or "300g"
@@ -217,35 +190,23 @@ def parse_measure(measure_text, ingredient_key):
     if m:
         val = float(m.group(1))
         unit = m.group(2)
-        grams = val * UNIT_TO_G[unit]
-        return clamp_grams(measure_text, grams)
+        grams = val * cfg.unit_to_g[unit]
+        return clamp_grams(measure_text, grams), 'mass'
 
     # find numbers with parentheses e.g. '1 piece (approx 1.5kg)'
     m = re.search(r"\(([^)]+)\)", measure_text)
     if m:
         inner = m.group(1)
-        gm = parse_measure(inner, ingredient_key)
+        gm, rule = parse_measure_rule(inner, ingredient_key, cfg)
         if gm:
-            return clamp_grams(measure_text, gm)
+            return clamp_grams(measure_text, gm), 'paren:' + rule
 
     # pieces with an explicit number: "2 pieces" or "1 whole, cut up"
     m = re.search(r"([0-9]+)\s*(piece|pieces|head|clove|cloves|whole|pc|pcs|bunch|bunches|stalk|stalks)", measure_text)
     if m:
         count = int(m.group(1))
-        unit = m.group(2)
-        # try per-item mass lookup
-        name = ingredient_key
-        # check unit overrides first (with fuzzy fallbacks)
-        overrides = resolve_overrides(name)
-        # normalize unit names (clove -> clove)
-        unit_key = 'clove' if 'clove' in unit else ('piece' if 'piece' in unit or 'head' in unit or 'whole' in unit else unit)
-        if unit_key in overrides:
-            return clamp_grams(measure_text, count * overrides[unit_key])
-        approx_mass = PER_ITEM_MASS.get(name, None)
-        if approx_mass:
-            return clamp_grams(measure_text, count * approx_mass)
-        # default piece mass smaller (for spices/vegetables) to avoid huge parsing errors
-        return clamp_grams(measure_text, count * 10)
+        # overrides -> per-item mass -> default piece mass, resolved in the unit table
+        return clamp_grams(measure_text, count * unit_grams(ingredient_key, m.group(2), cfg)), 'count'
 
     # fractions like 1/2 cup or mixed fractions like '1 1/2 cup'
     m = re.search(r"(?:(\d+)\s+)?(\d+)\s*/\s*(\d+)\s*(cup|tbsp|tsp|cups)", measure_text)
@@ -255,72 +216,41 @@ def parse_measure(measure_text, ingredient_key):
         den = float(m.group(3))
         unit = m.group(4)
         frac = whole + (num / den)
-        overrides = resolve_overrides(ingredient_key)
-        key_unit = unit.rstrip('s')
-        if unit in overrides:
-            grams = frac * overrides[unit]
-        elif key_unit in overrides:
-            grams = frac * overrides[key_unit]
-        else:
-            grams = frac * UNIT_TO_G.get(unit, 0)
-        return clamp_grams(measure_text, grams)
+        return clamp_grams(measure_text, frac * unit_grams(ingredient_key, unit, cfg)), 'fraction'
 
     # tablespoons/tsp/cup
     for unit in ["tbsp", "tsp", "cup", "cups", "tbsp(s)"]:
         m = re.search(r"([0-9]*\.?[0-9]+)\s*" + re.escape(unit), measure_text)
         if m:
             val = float(m.group(1))
-            # check per-ingredient overrides for unit (with fuzzy fallbacks)
-            overrides = resolve_overrides(ingredient_key)
-            if unit in overrides:
-                grams = val * overrides[unit]
-            else:
-                grams = val * UNIT_TO_G.get(unit, 0)
-            return clamp_grams(measure_text, grams)
+            return clamp_grams(measure_text, val * unit_grams(ingredient_key, unit, cfg)), 'volume'
 
     # grams only number
     m = re.search(r"^([0-9]+)\s*$", measure_text)
     if m:
-        return clamp_grams(measure_text, float(m.group(1)))
-
-    # fractions like 1/2 cup
-    m = re.search(r"([0-9]+)\s*/\s*([0-9]+)\s*(cup|tbsp|tsp)", measure_text)
-    if m:
-        num = float(m.group(2))
-        den = float(m.group(3))
-        unit = m.group(4)
-        frac = num / den
-        overrides = resolve_overrides(ingredient_key)
-        key_unit = unit.rstrip('s')
-        if unit in overrides:
-            grams = frac * overrides[unit]
-        elif key_unit in overrides:
-            grams = frac * overrides[key_unit]
-        else:
-            grams = frac * UNIT_TO_G.get(unit, 0)
-        return clamp_grams(measure_text, grams)
+        return clamp_grams(measure_text, float(m.group(1))), 'bare_number'
 
     # for vague terms like 'for dipping sauce' or 'to taste' assume a small contribution
     # oil/frying heuristics: estimate absorbed oil when measure is vague
     if 'deep fry' in measure_text or 'deep-fry' in measure_text or 'deep frying' in measure_text:
         # if ingredient is an oil, assume moderate batch oil absorption
         if ingredient_key and ('oil' in ingredient_key or 'cooking_oil' in ingredient_key or 'vegetable' in ingredient_key):
-            return clamp_grams(measure_text, 200.0)
-        return clamp_grams(measure_text, 100.0)
+            return clamp_grams(measure_text, 200.0), 'deep_fry_oil'
+        return clamp_grams(measure_text, 100.0), 'deep_fry'
     if 'fry' in measure_text and ('for' in measure_text or 'as needed' in measure_text):
         if ingredient_key and ('oil' in ingredient_key or 'cooking_oil' in ingredient_key or 'vegetable' in ingredient_key):
-            return clamp_grams(measure_text, 50.0)
+            return clamp_grams(measure_text, 50.0), 'fry_oil'
     if 'for dipping' in measure_text or 'to taste' in measure_text or 'for dipping sauce' in measure_text:
-        return clamp_grams(measure_text, 15.0)
+        return clamp_grams(measure_text, 15.0), 'to_taste'
 
     # fallback: try to extract first number
     m = re.search(r"([0-9]*\.?[0-9]+)", measure_text)
     if m:
         val = float(m.group(1))
         # assume grams
-        return clamp_grams(measure_text, val)
+        return clamp_grams(measure_text, val), 'first_number'
 
-    return 0.0
+    return 0.0, 'unparsed'
 
 
 def clamp_grams(measure_text, grams):
@@ -335,34 +265,132 @@ def clamp_grams(measure_text, grams):
     if 'tsp' in mt and grams > 50:
         grams = 50.0
     # if still implausible (very large for small units) - append to a log for manual review
-    if any(u in mt for u in ['cup', 'tbsp', 'tsp']) and grams > 500:
+    if WARN_LOG and any(u in mt for u in ['cup', 'tbsp', 'tsp']) and grams > 500:
         try:
-            with open('suspicious_parse_warnings.log', 'a', encoding='utf-8') as wf:
+            with open(WARN_LOG, 'a', encoding='utf-8') as wf:
                 wf.write(f"Suspicious parse: {measure_text} -> {grams}\n")
         except Exception:
             pass
     return grams
 
 
-def canonicalize_ingredient(name):
+NAME_STOPWORDS = ('optional', 'fresh', 'whole')
+IRREGULAR_PLURALS = {'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf'}
+
+
+def singularize(token):
+    if token in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[token]
+    if len(token) <= 3:
+        return token
+    if token.endswith('ies'):
+        return token[:-3] + 'y'
+    if token.endswith(('oes', 'ches', 'shes', 'xes', 'sses')):
+        return token[:-2]
+    if token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def normalize_name(text):
+    """Lookup form of an ingredient name: lowercase, parenthetical glosses
+    dropped, punctuation/underscores as spaces, stopwords dropped, singular."""
+    text = re.sub(r'\([^)]*\)?', ' ', (text or '').lower())
+    tokens = re.sub(r"[^a-z0-9 ]+", ' ', text.replace("'", '')).split()
+    return ' '.join(singularize(t) for t in tokens if t not in NAME_STOPWORDS)
+
+
+def name_glosses(text):
+    """Normalized parenthetical glosses: 'Pechay (Bok Choy)' -> ['bok choy']."""
+    glosses = (normalize_name(g) for g in re.findall(r'\(([^)]*)\)', text or ''))
+    return [g for g in glosses if g]
+
+
+def build_alias_index(cfg):
+    """Compile ing_map and ing_aliases into canonical classes with union-find.
+    Returns ({key: sorted normalized names}, {normalized name: key}); raises
+    ValueError when a group reaches no key or joins two different keys."""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    for spelling, key in cfg.ing_map.items():
+        name = normalize_name(spelling)
+        if name:
+            union(name, ('key', key))
+    for group in cfg.ing_aliases:
+        names = [n for member in group for n in [normalize_name(member), *name_glosses(member)] if n]
+        for name in names[1:]:
+            union(names[0], name)
+
+    members = {}
+    for node in list(parent):
+        members.setdefault(find(node), []).append(node)
+    classes = {}
+    index = {}
+    for nodes in members.values():
+        keys = sorted(n[1] for n in nodes if isinstance(n, tuple))
+        names = sorted(n for n in nodes if not isinstance(n, tuple))
+        if len(keys) != 1:
+            raise ValueError(f"alias class {names} maps to {len(keys)} canonical keys {keys}; fix ing_map/ing_aliases")
+        classes[keys[0]] = names
+        for name in names:
+            index[name] = keys[0]
+    return classes, index
+
+
+def build_fuzzy_patterns(cfg):
+    """Whole-word ing_map patterns for the fallback scan, longest spelling first."""
+    return tuple((re.compile(r'\b' + re.escape(k) + r'\b'), cfg.ing_map[k])
+                 for k in sorted(cfg.ing_map, key=lambda x: -len(x)))
+
+
+def lookup_alias(name, cfg=None):
+    """Canonical key for any known variant of `name` (or of its gloss), else None."""
+    if cfg is None:
+        cfg = CONFIG
+    key = cfg.alias_index.get(normalize_name(name))
+    if key is None:
+        for gloss in name_glosses(name):
+            key = cfg.alias_index.get(gloss)
+            if key is not None:
+                break
+    return key
+
+
+def canonicalize_ingredient(name, cfg=None):
+    if cfg is None:
+        cfg = CONFIG
     if not name:
         return None
     raw = name.strip().lower()
     raw = re.sub(r"[^a-z0-9 /-]", "", raw)
     # direct map
-    if raw in ING_MAP:
-        return ING_MAP[raw]
+    if raw in cfg.ing_map:
+        return cfg.ing_map[raw]
+    # any normalized variant of a known name or synonym
+    key = lookup_alias(name, cfg)
+    if key is not None:
+        return key
     # try to match by splitting on slashes (e.g., 'Pork Ribs/Belly') and parts
     parts = [p.strip() for p in raw.split('/') if p.strip()]
     for p in parts:
-        if p in ING_MAP:
-            return ING_MAP[p]
+        if p in cfg.ing_map:
+            return cfg.ing_map[p]
     # handle broth/stock specially (avoid mapping 'shrimp broth' -> 'shrimp')
     if 'broth' in raw or 'stock' in raw:
         # try exact broth keys first
-        for k in ING_MAP.keys():
+        for k in cfg.ing_map.keys():
             if 'broth' in k and k in raw:
-                return ING_MAP[k]
+                return cfg.ing_map[k]
         # common combined terms
         if 'shrimp' in raw:
             return 'shrimp_broth'
@@ -375,13 +403,13 @@ def canonicalize_ingredient(name):
         return 'water'
     # handle fragmented phrases like 'pork ribs/belly' -> map to pork_belly
     if 'pork' in raw and 'belly' in raw:
-        return ING_MAP.get('pork belly', 'pork_belly')
+        return cfg.ing_map.get('pork belly', 'pork_belly')
     if 'pork' in raw and 'rib' in raw:
-        return ING_MAP.get('pork belly', 'pork_belly')
+        return cfg.ing_map.get('pork belly', 'pork_belly')
     # try contains on full raw but match whole words and prefer longer keys to avoid short-key collisions (e.g., 'egg' in 'eggplant')
-    for k in sorted(ING_MAP.keys(), key=lambda x: -len(x)):
-        if re.search(r'\b' + re.escape(k) + r'\b', raw):
-            return ING_MAP[k]
+    for pattern, key in cfg.fuzzy_patterns:
+        if pattern.search(raw):
+            return key
     # try singular/plural normalization
     raw = raw.replace('pieces', 'piece')
     raw = raw.replace('whole ', '')
@@ -396,106 +424,178 @@ def load_json(path):
         return json.load(f)
 
 
-def main():
+CONFIG = ParserConfig.load()
+_CONFIG_STAMPS = {}
+
+
+def swap_config(cfg):
+    """Atomically make `cfg` the active config; returns the previous one.
+    Calls already running finish on the config they started with."""
+    global CONFIG
+    previous, CONFIG = CONFIG, cfg
+    return previous
+
+
+def reload_config(path=CONFIG_PATH, force=False):
+    """Hot reload for long-running processes: rebuild from `path` when the file
+    changed on disk and swap it in if its version differs. Returns the active config."""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    if not force and _CONFIG_STAMPS.get(str(path)) == stamp:
+        return CONFIG
+    cfg = ParserConfig.load(path)
+    _CONFIG_STAMPS[str(path)] = stamp
+    if force or cfg.version != CONFIG.version:
+        swap_config(cfg)
+    return CONFIG
+
+
+def compute_totals(r, nutr, price, cfg=None):
+    """Sum nutrition and price over a recipe's ingredient slots.
+    Returns (totals dict, total price, set of lookup keys used)."""
+    if cfg is None:
+        cfg = CONFIG
+    total = {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0}
+    total_price = 0.0
+    used_keys = set()
+    # loop through ingredient entries (strIngredient1..20 assumed)
+    for i in range(1, 21):
+        ing = r.get(f'strIngredient{i}', '')
+        meas = r.get(f'strMeasure{i}', '')
+        if not ing or not meas or ing.strip() == '':
+            continue
+        key = canonicalize_ingredient(ing, cfg)
+        grams = parse_measure(meas, key, cfg)
+        if grams <= 0:
+            # try per piece recognition
+            grams = parse_measure(meas, key, cfg)
+        # get nutrition per 100g
+        nut_key = key
+        if nut_key in nutr:
+            per100 = nutr[nut_key]['per_100g']
+            total['calories'] += grams * per100.get('calories', 0) / 100.0
+            total['protein'] += grams * per100.get('protein', 0) / 100.0
+            total['carbs'] += grams * per100.get('carbs', 0) / 100.0
+            total['fat'] += grams * per100.get('fat', 0) / 100.0
+            used_keys.add(nut_key)
+        else:
+            # unknown ingredient: skip or estimate small
+            # here we skip but log
+            pass
+
+        # get price
+        # price map uses per_kg or per_liter
+        p = price.get(nut_key, None)
+        if p:
+            if 'price_php_per_kg' in p:
+                price_per_g = p['price_php_per_kg'] / 1000.0
+                total_price += grams * price_per_g
+                used_keys.add(nut_key)
+            elif 'price_php_per_liter' in p:
+                # assume 1 liter ~ 1000 g for liquid
+                price_per_g = p['price_php_per_liter'] / 1000.0
+                total_price += grams * price_per_g
+                used_keys.add(nut_key)
+    return total, total_price, used_keys
+
+
+def recipe_servings(r):
+    """What totals are divided by for per-serving values: good_for (the catalog's
+    field), else servings/yield, else 4."""
+    servings = r.get('good_for') or r.get('servings') or r.get('yield') or 4
+    try:
+        return max(1, int(servings))
+    except (TypeError, ValueError):
+        return 4
+
+
+def recalculate(r, nutr, price, cfg=None):
+    """The rounded fields main() recomputes for one recipe, and the lookup keys used."""
+    total, total_price, used_keys = compute_totals(r, nutr, price, cfg)
+
+    # compute servings and per-serving values
+    servings = recipe_servings(r)
+
+    calc = {
+        'calories': round(total['calories']),
+        'protein': round(total['protein']),
+        'carbs': round(total['carbs']),
+        'fat': round(total['fat']),
+        'price': round(total_price),
+    }
+    calc['calories_per_serving'] = round(calc['calories'] / servings) if servings else calc['calories']
+    calc['price_per_serving'] = round(calc['price'] / servings) if servings else calc['price']
+    return calc, used_keys
+
+
+def changed_fields(r, calc):
+    """{field: {'old', 'new'}} for recalculated values that are missing on `r` or
+    off by more than max(5, 20%) of the stored value."""
+    diffs = {}
+    for field, calc_val in calc.items():
+        old = r.get(field, None)
+        if old is None or abs((old - calc_val) if old is not None else calc_val) > max(5, 0.2 * (old or 1)):
+            diffs[field] = {'old': old, 'new': calc_val}
+    return diffs
+
+
+def apply_recalculation(r, nutr, price, cfg=None):
+    """Recalculate one recipe in place; returns its changed fields ({} when none)."""
+    cfg = cfg or CONFIG
+    calc, used_keys = recalculate(r, nutr, price, cfg)
+
+    # compute difference check with existing values
+    diffs = changed_fields(r, calc)
+    for field, diff in diffs.items():
+        r[field] = diff['new']
+
+    if diffs:
+        r.setdefault('sources', [])
+        # gather relevant sources used (only for ingredients actually present)
+        used_sources = set()
+        for k in used_keys:
+            if k in nutr:
+                used_sources.add(nutr[k]['source'])
+            if k in price:
+                used_sources.add(price[k].get('source',''))
+        r['sources'] = list(used_sources)
+        r['calculated_at'] = datetime.utcnow().isoformat() + 'Z'
+        r['parser_version'] = cfg.version
+    return diffs
+
+
+def main(ctx=None):
+    ctx = ctx or catalog_context.Context()
     print('Loading lookups...')
-    nutr = load_json(NUTR_PATH)
-    price = load_json(PRICE_PATH)
+    nutr = ctx.json(NUTR_PATH)
+    price = ctx.json(PRICE_PATH)
 
-    db = load_json(DB_PATH)
+    db = ctx.take(DB_PATH)  # recipes are updated in place
     recipes = db.get('recipes', [])
     updated = []
+    cfg = CONFIG
 
     for r in recipes:
-        total = {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0}
-        total_price = 0.0
-        used_keys = set()
-        # loop through ingredient entries (strIngredient1..20 assumed)
-        for i in range(1, 21):
-            ing = r.get(f'strIngredient{i}', '')
-            meas = r.get(f'strMeasure{i}', '')
-            if not ing or not meas or ing.strip() == '':
-                continue
-            key = canonicalize_ingredient(ing)
-            grams = parse_measure(meas, key)
-            if grams <= 0:
-                # try per piece recognition
-                grams = parse_measure(meas, key)
-            # get nutrition per 100g
-            nut_key = key
-            if nut_key in nutr:
-                per100 = nutr[nut_key]['per_100g']
-                total['calories'] += grams * per100.get('calories', 0) / 100.0
-                total['protein'] += grams * per100.get('protein', 0) / 100.0
-                total['carbs'] += grams * per100.get('carbs', 0) / 100.0
-                total['fat'] += grams * per100.get('fat', 0) / 100.0
-                used_keys.add(nut_key)
-            else:
-                # unknown ingredient: skip or estimate small
-                # here we skip but log
-                pass
-
-            # get price
-            # price map uses per_kg or per_liter
-            p = price.get(nut_key, None)
-            if p:
-                if 'price_php_per_kg' in p:
-                    price_per_g = p['price_php_per_kg'] / 1000.0
-                    total_price += grams * price_per_g
-                    used_keys.add(nut_key)
-                elif 'price_php_per_liter' in p:
-                    # assume 1 liter ~ 1000 g for liquid
-                    price_per_g = p['price_php_per_liter'] / 1000.0
-                    total_price += grams * price_per_g
-                    used_keys.add(nut_key)
-
-        # compute servings and per-serving values
-        servings = r.get('servings') or r.get('yield') or 4
-        try:
-            servings = int(servings)
-        except Exception:
-            servings = 4
-
-        calc_cal = round(total['calories'])
-        calc_pro = round(total['protein'])
-        calc_carb = round(total['carbs'])
-        calc_fat = round(total['fat'])
-        calc_price = round(total_price)
-        calc_cal_per_serv = round(calc_cal / servings) if servings else calc_cal
-        calc_price_per_serv = round(calc_price / servings) if servings else calc_price
-
-        # compute difference check with existing values
-        changed = False
-        diffs = {}
-        for field, calc_val in (('calories', calc_cal), ('protein', calc_pro), ('carbs', calc_carb), ('fat', calc_fat), ('price', calc_price), ('calories_per_serving', calc_cal_per_serv), ('price_per_serving', calc_price_per_serv)):
-            old = r.get(field, None)
-            if old is None or abs((old - calc_val) if old is not None else calc_val) > max(5, 0.2 * (old or 1)):
-                diffs[field] = {'old': old, 'new': calc_val}
-                r[field] = calc_val
-                changed = True
-
-        if changed:
-            r.setdefault('sources', [])
-            # gather relevant sources used (only for ingredients actually present)
-            used_sources = set()
-            for k in used_keys:
-                if k in nutr:
-                    used_sources.add(nutr[k]['source'])
-                if k in price:
-                    used_sources.add(price[k].get('source',''))
-            r['sources'] = list(used_sources)
-            r['calculated_at'] = datetime.utcnow().isoformat() + 'Z'
+        diffs = apply_recalculation(r, nutr, price, cfg)
+        if diffs:
             updated.append({'idMeal': r.get('idMeal'), 'diffs': diffs})
 
     # write an updated file
-    out_path = '../database.updated.json'
+    out_path = OUT_PATH
     with open(out_path, 'w', encoding='utf-8') as f:
         json.dump(db, f, ensure_ascii=False, indent=2)
+    ctx.put(out_path, db)
 
     print(f'Updated {len(updated)} recipes. Wrote {out_path}')
+    # refresh the derived SQLite store so reports query the new lines instead of re-parsing
+    ctx.store([out_path])
     if updated:
         print('Sample updates:')
         for u in updated[:10]:
             print(u)
 
 if __name__ == '__main__':
-    main()
+    if '--dump-units' in sys.argv[1:]:
+        print(f'Wrote {dump_unit_table()} keys to {UNIT_TABLE_PATH}')
+    else:
+        main()
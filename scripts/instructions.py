@@ -0,0 +1,218 @@
+"""Structured instructions: steps, techniques, active/passive minutes and a difficulty tier.
+
+Usage: python instructions.py [--db ../database.json] [--dry-run]
+
+strInstructions is split into numbered steps. Each step is scanned once with
+one combined technique pattern (grill, deep fry, saute, simmer, ...) and one
+duration pattern ("30 minutes", "15 to 20 minutes", "a few minutes", "1 hour",
+"overnight"). Explicit durations are charged to the step's first timed
+technique: passive for boil/simmer/steam/bake/marinate/soak/rest, active for
+the rest; steps without one fall back to per-technique defaults ("boil pork
+until tender" = 40 passive minutes). Prep techniques (cut, mix, wrap, ...)
+always add their own active minutes.
+
+The results are stored on the recipes as time_active_min, time_passive_min,
+time_total_min, difficulty (easy/medium/hard/expert, the tiers of
+pricing-engine.js) and techniques, so labor costing reads two numbers instead
+of re-scanning the text per request. analyze() is memoized by text, so a
+batch of 100k recipes only parses each distinct instruction text once.
+"""
+import argparse
+import re
+from functools import lru_cache
+from pathlib import Path
+import catalog_context
+import export_static
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+
+FIELDS = ('time_active_min', 'time_passive_min', 'time_total_min', 'difficulty', 'techniques')
+
+# technique -> (pattern, timed as 'active'/'passive' or None for prep, default minutes, difficulty points);
+# order matters: the first alternative wins, so deep fry / stir-fry come before fry / stir.
+# Timed techniques skip their -ed forms: "boiled eggs", "steamed rice" are ingredients, not steps.
+TECHNIQUES = {
+    'deep_fry': (r'deep[- ]?fr(?:y|ying)', 'active', 12, 2),
+    'saute': (r'saut[eé](?:ing)?|stir[- ]?fr(?:y|ying)|gisa', 'active', 5, 0),
+    'fry': (r'(?:pan[- ]?)?fr(?:y|ying)', 'active', 8, 1),
+    'grill': (r'grill(?:ing)?|broil(?:ing)?|char(?:red|ring)?|ihaw', 'active', 15, 1),
+    'bake': (r'bak(?:e|ing)|roast(?:ing)?|oven', 'passive', 40, 1),
+    'boil': (r'(?:par)?boil(?:s|ing)?', 'passive', 15, 0),
+    'simmer': (r'simmer(?:s|ing)?|brais(?:e|ing)', 'passive', 20, 0),
+    'steam': (r'steam(?:ing)?', 'passive', 20, 1),
+    'blanch': (r'blanch(?:ing)?', 'active', 3, 0),
+    'marinate': (r'marinat(?:e|ing)', 'passive', 30, 0),
+    'soak': (r'soak(?:ing)?', 'passive', 30, 0),
+    'rest': (r'let\s+(?:it\s+|them\s+)?(?:sit|stand)|rest(?:ing)?|cool(?:ing)?|chill(?:ing)?|refrigerat(?:e|ing)|freez(?:e|ing)|air[- ]dry', 'passive', 15, 0),
+    'cook': (r'cook(?:ing)?', 'active', 5, 0),
+    'wrap': (r'wrap\w*|roll(?:ed|ing)?\s+(?:up|into|tightly)|stuff(?:ed|ing)?|fold(?:ed|ing)?', None, 15, 2),
+    'knead': (r'knead\w*|dough', None, 15, 2),
+    'blend': (r'blend\w*|grind\w*|mash\w*|pur[eé]e\w*', None, 3, 0),
+    'cut': (r'chop\w*|slic\w*|dic(?:e|ed|ing)|minc\w*|cut|peel\w*|julienne\w*|shred\w*|debon\w*', None, 5, 0),
+    'mix': (r'mix\w*|combin\w*|stir(?:s|red|ring)?|toss\w*|whisk\w*|beat(?:en)?', None, 1, 0),
+}
+# one pass per step over lowercased text: one \b group and no re.I is ~2x faster than
+# an re.I alternation of separately anchored patterns
+TECHNIQUE_RE = re.compile(r'\b(?:%s)\b' % '|'.join(rf'(?P<{t}>{p})' for t, (p, *_) in TECHNIQUES.items()))
+
+WORD_NUMBERS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'ten': 10,
+                'fifteen': 15, 'twenty': 20, 'thirty': 30, 'forty': 40, 'few': 3, 'several': 4,
+                'couple': 2, 'couple of': 2}
+_NUM = r'\d+(?:\.\d+)?|\d+/\d+|an?|one|two|three|four|five|ten|fifteen|twenty|thirty|forty|few|several|couple(?: of)?'
+DURATION_RE = re.compile(
+    rf'\b(?P<lo>{_NUM})(?:\s*(?:-|–|to)\s*(?P<hi>{_NUM}))?\s*(?:more\s+)?'
+    r'(?P<unit>minutes?|mins?|hours?|hrs?|seconds?|secs?)\b'
+    r'(?P<each>\s+(?:per|on each|each)\s+side)?'
+    r'|\b(?P<overnight>overnight)\b')
+UNIT_MINUTES = {'m': 1, 'h': 60, 's': 1 / 60}
+OVERNIGHT_MIN = 480
+# "boil pork until tender" without a time: meat takes far longer than the default boil
+TENDER_RE = re.compile(r'\buntil\b[^.]*\btender\b')
+MEAT_RE = re.compile(r'\b(?:meat|pork|beef|chicken|carabeef|goat|oxtail|tripe|tendon|shank|ears?|snout|pata|hocks?)\b')
+TENDER_MEAT_MIN = 40
+# "cover and cook for 30 minutes" / "cook over low heat" is unattended time
+COVERED_RE = re.compile(r'\b(?:cover(?:ed)?|low heat)\b')
+STEP_SPLIT = re.compile(r'\\n|\n')
+STEP_NUMBER = re.compile(r'^\s*(?:step\s*)?\d+\s*[.)]\s*', re.I)
+
+# difficulty tier by points: distinct techniques' points plus step count / active time bumps
+TIERS = ((1, 'easy'), (3, 'medium'), (5, 'hard'))
+TOP_TIER = 'expert'
+TIER_ORDER = tuple(t for _, t in TIERS) + (TOP_TIER,)
+
+
+def parse_steps(text):
+    """strInstructions -> list of step strings without their "1." numbering."""
+    steps = []
+    for part in STEP_SPLIT.split(text or ''):
+        part = STEP_NUMBER.sub('', part).strip()
+        if part:
+            steps.append(part)
+    return steps
+
+
+def _number(s):
+    if s in WORD_NUMBERS:
+        return WORD_NUMBERS[s]
+    if '/' in s:
+        num, den = s.split('/')
+        return int(num) / int(den) if int(den) else 0.0
+    return float(s)
+
+
+def durations(step):
+    """Explicit minutes in one lowercased step; a range counts as its midpoint,
+    and alternatives ("4 hours or overnight") count once."""
+    total, prev_end = 0.0, None
+    for m in DURATION_RE.finditer(step):
+        if prev_end is not None and re.fullmatch(r'[\s,(]*or\s+', step[prev_end:m.start()]):
+            continue
+        prev_end = m.end()
+        if m.group('overnight'):
+            total += OVERNIGHT_MIN
+            continue
+        lo = _number(m.group('lo'))
+        hi = _number(m.group('hi')) if m.group('hi') else lo
+        minutes = (lo + hi) / 2 * UNIT_MINUTES[m.group('unit')[0]]
+        total += minutes * (2 if m.group('each') else 1)
+    return total
+
+
+def analyze_step(step):
+    """{'text', 'techniques', 'active_min', 'passive_min'} for one step."""
+    text, step = step, step.lower()
+    found = []
+    for m in TECHNIQUE_RE.finditer(step):
+        if m.lastgroup not in found:
+            found.append(m.lastgroup)
+    active = passive = 0.0
+    timed = [t for t in found if TECHNIQUES[t][1]]
+    explicit = durations(step)
+    if explicit:
+        if timed and (TECHNIQUES[timed[0]][1] == 'passive' or timed[0] == 'cook' and COVERED_RE.search(step)):
+            passive += explicit
+        else:
+            active += explicit
+    else:
+        for t in timed:
+            kind, minutes = TECHNIQUES[t][1], TECHNIQUES[t][2]
+            if kind == 'passive' and TENDER_RE.search(step) and MEAT_RE.search(step):
+                minutes = max(minutes, TENDER_MEAT_MIN)
+            if kind == 'passive':
+                passive += minutes
+            else:
+                active += minutes
+    for t in found:
+        if TECHNIQUES[t][1] is None:
+            active += TECHNIQUES[t][2]
+    return {'text': text, 'techniques': found, 'active_min': round(active, 1), 'passive_min': round(passive, 1)}
+
+
+def difficulty(techniques, step_count, active_min):
+    points = sum(TECHNIQUES[t][3] for t in techniques)
+    points += (step_count > 8) + (step_count > 12) + (active_min > 45) + (active_min > 90)
+    for limit, tier in TIERS:
+        if points <= limit:
+            return tier
+    return TOP_TIER
+
+
+@lru_cache(maxsize=65536)
+def analyze(text):
+    """Steps plus the recipe summary for one instruction text (memoized; do not mutate)."""
+    steps = [analyze_step(s) for s in parse_steps(text)]
+    techniques = []
+    for s in steps:
+        for t in s['techniques']:
+            if t not in techniques:
+                techniques.append(t)
+    active = round(sum(s['active_min'] for s in steps))
+    passive = round(sum(s['passive_min'] for s in steps))
+    return {
+        'steps': steps,
+        'techniques': techniques,
+        'time_active_min': active,
+        'time_passive_min': passive,
+        'time_total_min': active + passive,
+        'difficulty': difficulty(techniques, len(steps), active),
+    }
+
+
+def annotate(recipe):
+    """Store the summary fields on one recipe; True when any of them changed."""
+    summary = analyze(recipe.get('strInstructions') or '')
+    changed = False
+    for field in FIELDS:
+        value = list(summary[field]) if field == 'techniques' else summary[field]
+        if recipe.get(field) != value:
+            recipe[field] = value
+            changed = True
+    return changed
+
+
+def main(ctx=None, db_path=DB, dry_run=False):
+    ctx = ctx or catalog_context.Context()
+    db = ctx.take(db_path)
+    recipes = db.get('recipes', [])
+    updated = sum(annotate(r) for r in recipes)
+    tiers = {}
+    for r in recipes:
+        tiers[r['difficulty']] = tiers.get(r['difficulty'], 0) + 1
+    if not dry_run:
+        if updated:
+            catalog_context.write_json(db_path, db, catalog_context.detect_indent(db_path))
+            if catalog_context.is_served(db_path):
+                export_static.export(db_path)
+        ctx.put(db_path, db)
+    print(f"Parsed instructions of {len(recipes)} recipes, {updated} updated ("
+          + ', '.join(f'{t} {n}' for t, n in sorted(tiers.items(), key=lambda kv: TIER_ORDER.index(kv[0]))) + ')'
+          + (' (dry run, nothing written)' if dry_run else ''))
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Parse instructions into step timings, techniques and difficulty')
+    ap.add_argument('--db', type=Path, default=DB)
+    ap.add_argument('--dry-run', action='store_true')
+    args = ap.parse_args()
+    main(db_path=args.db, dry_run=args.dry_run)
@@ -0,0 +1,343 @@
+"""Load generator for the recipe API: replay a realistic request mix and report latency percentiles.
+
+Usage:
+    python loadtest.py --start server.js --duration 20 --concurrency 32
+    python loadtest.py --url http://127.0.0.1:3000 --mix lookup=60,search=40 --requests 20000
+    python loadtest.py --start server-simple.js --save-baseline     (then later: --compare)
+
+Requests are drawn from database.json: real ids for /api/lookup and
+/api/pricing/calculate, real categories for /api/filter, words of real
+recipe names for /api/search, pages that exist for /api/recipes. Each of
+`concurrency` workers keeps one keep-alive connection (market_prices'
+asyncio HTTP client) and sends its next request as soon as the previous one
+answered. A route the target does not serve (404 on a probe before the run:
+server.js has no /api/pricing, server-simple.js no /api/bytype) is dropped
+from the mix.
+
+Latencies go into HDR-style histograms (log-linear buckets, <1% error), one
+per route plus the total, and the report is throughput plus p50/p95/p99/max.
+--save-baseline stores the report as JSON; --compare checks a run against it
+and exits 1 when throughput fell or a percentile rose by more than
+--tolerance. Latency includes the client's own asyncio overhead, so compare
+runs made on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+import catalog_context
+from market_prices import ConnectionPool, HTTPError
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+BASELINE = ROOT / 'loadtest_baseline.json'
+URL = 'http://127.0.0.1:3000'
+PAGE_LIMIT = 20  # server.js default `limit` for /api/recipes
+
+# route kind -> default share of the mix
+MIX = {'lookup': 30, 'recipes': 20, 'search': 20, 'filter': 15, 'bytype': 10, 'pricing': 5}
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    """HDR-style latency histogram in microseconds: exact below 2**sub_bits,
+    then 2**(sub_bits - 1) buckets per power of two."""
+
+    def __init__(self, sub_bits=8):
+        self.sub_bits = sub_bits
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, v):
+        shift = max(0, v.bit_length() - self.sub_bits)
+        return (shift << (self.sub_bits - 1)) + (v >> shift) if shift else v
+
+    def _upper(self, idx):
+        """Highest value that lands in bucket `idx`."""
+        half = 1 << (self.sub_bits - 1)
+        if idx < 2 * half:
+            return idx
+        shift = (idx >> (self.sub_bits - 1)) - 1
+        return ((idx - (shift << (self.sub_bits - 1)) + 1) << shift) - 1
+
+    def record(self, us):
+        us = max(0, int(us))
+        idx = self._index(us)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.total += 1
+        self.sum += us
+        self.min = us if self.min is None else min(self.min, us)
+        self.max = max(self.max, us)
+
+    def add(self, other):
+        for idx, n in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(self.total * p / 100))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(self._upper(idx), self.max)
+        return self.max
+
+    def summary(self):
+        out = {f'p{p}_ms': round(self.percentile(p) / 1000, 3) for p in PERCENTILES}
+        out.update(count=self.total, max_ms=round(self.max / 1000, 3),
+                   mean_ms=round(self.sum / self.total / 1000, 3) if self.total else 0)
+        return out
+
+
+class RequestMix:
+    """Weighted route kinds with query parameters drawn from the catalog."""
+
+    def __init__(self, recipes, weights=None, seed=None):
+        self.rng = random.Random(seed)
+        self.weights = dict(weights or MIX)
+        self.ids = [str(r['idMeal']) for r in recipes if r.get('idMeal')]
+        self.categories = sorted({r['strCategory'] for r in recipes if r.get('strCategory')})
+        self.words = sorted({w.lower() for r in recipes for w in (r.get('strMeal') or '').split()
+                             if len(w) >= 3 and w.isalpha()})
+        self.pages = max(1, math.ceil(len(recipes) / PAGE_LIMIT))
+        self.types = ('main', 'side')
+
+    def path(self, kind):
+        rng = self.rng
+        if kind == 'lookup':
+            return f'/api/lookup?i={rng.choice(self.ids)}'
+        if kind == 'recipes':
+            return f'/api/recipes?page={rng.randint(1, self.pages)}&limit={PAGE_LIMIT}'
+        if kind == 'search':
+            return f'/api/search?s={urllib.parse.quote(rng.choice(self.words))}'
+        if kind == 'filter':
+            return f'/api/filter?c={urllib.parse.quote(rng.choice(self.categories))}'
+        if kind == 'bytype':
+            return f'/api/bytype/{rng.choice(self.types)}'
+        if kind == 'pricing':
+            return f'/api/pricing/calculate/{rng.choice(self.ids)}'
+        raise ValueError(f'unknown route kind {kind!r}; expected one of {list(MIX)}')
+
+    def drop(self, kind):
+        self.weights.pop(kind, None)
+
+    def next(self):
+        kinds = list(self.weights)
+        kind = self.rng.choices(kinds, weights=[self.weights[k] for k in kinds])[0]
+        return kind, self.path(kind)
+
+
+def parse_mix(text):
+    """'lookup=60,search=40' -> {'lookup': 60.0, 'search': 40.0}."""
+    weights = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        kind, _, w = part.partition('=')
+        if kind not in MIX:
+            raise ValueError(f'unknown route kind {kind!r}; expected one of {list(MIX)}')
+        weights[kind] = float(w or 1)
+    return weights
+
+
+async def probe(pool, base, mix, timeout):
+    """Drop the route kinds the target answers with 404 (or not at all)."""
+    dropped = []
+    for kind in list(mix.weights):
+        try:
+            status, _, _ = await pool.request(base + mix.path(kind), timeout=timeout, limit=1)
+        except (OSError, asyncio.TimeoutError, HTTPError):
+            status = None
+        if status is None or status == 404:
+            mix.drop(kind)
+            dropped.append(kind)
+    return dropped
+
+
+async def run_load(base, mix, concurrency=16, duration=10.0, requests=None, warmup=1.0, timeout=10.0):
+    """(per-kind histograms, per-kind error counts, seconds measured)."""
+    pool = ConnectionPool()
+    hists = {k: Histogram() for k in mix.weights}
+    errors = {k: 0 for k in mix.weights}
+    state = {'sent': 0, 'measuring': warmup <= 0}
+    stop_at = time.perf_counter() + warmup + duration
+
+    async def worker():
+        while True:
+            if requests is not None:
+                if state['sent'] >= requests:
+                    return
+                state['sent'] += 1
+            elif time.perf_counter() >= stop_at:
+                return
+            kind, path = mix.next()
+            t0 = time.perf_counter_ns()
+            try:
+                status, _, _ = await pool.request(base + path, timeout=timeout, limit=concurrency)
+                ok = status < 400
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HTTPError):
+                ok = False
+            if state['measuring']:
+                if ok:
+                    hists[kind].record((time.perf_counter_ns() - t0) / 1000)
+                else:
+                    errors[kind] += 1
+
+    async def measure_after_warmup():
+        await asyncio.sleep(warmup)
+        state['measuring'] = True
+        state['t0'] = time.perf_counter()
+
+    try:
+        timer = asyncio.create_task(measure_after_warmup()) if warmup > 0 and requests is None else None
+        if timer is None:
+            state['measuring'], state['t0'] = True, time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        if timer is not None:
+            timer.cancel()
+    finally:
+        pool.close()
+    return hists, errors, time.perf_counter() - state.get('t0', time.perf_counter())
+
+
+def report(hists, errors, seconds, concurrency):
+    total = Histogram()
+    for h in hists.values():
+        total.add(h)
+    return {
+        'concurrency': concurrency,
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(total.total / seconds, 1) if seconds > 0 else 0.0,
+        'errors': sum(errors.values()),
+        'total': total.summary(),
+        'routes': {k: dict(h.summary(), errors=errors[k]) for k, h in hists.items()},
+    }
+
+
+def compare(result, baseline, tolerance=0.2):
+    """[(metric, baseline, current)] that regressed by more than `tolerance`:
+    lower throughput, or higher p50/p95/p99 overall or for a route both runs measured."""
+    regressions = []
+    if result['throughput_rps'] < baseline['throughput_rps'] * (1 - tolerance):
+        regressions.append(('throughput_rps', baseline['throughput_rps'], result['throughput_rps']))
+    scopes = [('total', result['total'], baseline['total'])]
+    scopes += [(k, r, baseline['routes'][k]) for k, r in result['routes'].items()
+               if k in baseline.get('routes', {}) and r['count'] and baseline['routes'][k]['count']]
+    for name, cur, base in scopes:
+        for p in PERCENTILES:
+            key = f'p{p}_ms'
+            # sub-0.1ms differences are timer noise, not regressions
+            if cur[key] > base[key] * (1 + tolerance) and cur[key] - base[key] > 0.1:
+                regressions.append((f'{name}.{key}', base[key], cur[key]))
+    return regressions
+
+
+def start_server(script, port):
+    """Start `node script` on `port` and wait for /api/health; returns the process."""
+    env = dict(os.environ, PORT=str(port))
+    proc = subprocess.Popen(['node', script], cwd=ROOT.parent, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{script} exited: {proc.stderr.read().decode(errors="replace")[-500:]}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{script} did not answer /api/health on port {port} within 30s')
+
+
+def print_report(result, dropped):
+    print(f"{result['throughput_rps']:.1f} req/s over {result['seconds']}s at concurrency "
+          f"{result['concurrency']}, {result['errors']} errors")
+    if dropped:
+        print(f"(not served by the target, left out: {', '.join(dropped)})")
+    print(f"{'route':<10} {'count':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    rows = list(result['routes'].items()) + [('total', dict(result['total'], errors=result['errors']))]
+    for name, s in rows:
+        print(f"{name:<10} {s['count']:>8} {s['errors']:>7} {s['p50_ms']:>8.3f} {s['p95_ms']:>8.3f} "
+              f"{s['p99_ms']:>8.3f} {s['max_ms']:>8.3f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Replay a realistic request mix against the recipe API')
+    ap.add_argument('--url', default=URL, help=f'target base URL (default {URL})')
+    ap.add_argument('--start', metavar='SCRIPT', choices=('server.js', 'server-simple.js'),
+                    help='start this server with node on a free port and test it')
+    ap.add_argument('--port', type=int, default=3999, help='port for --start (default 3999)')
+    ap.add_argument('--db', type=Path, default=DB)
+    ap.add_argument('--mix', type=parse_mix, default=None, help=f"route=weight,... of {', '.join(MIX)}")
+    ap.add_argument('--concurrency', type=int, default=16)
+    ap.add_argument('--duration', type=float, default=10.0, help='seconds to measure (after --warmup)')
+    ap.add_argument('--requests', type=int, default=None, help='send this many requests instead of --duration')
+    ap.add_argument('--warmup', type=float, default=1.0)
+    ap.add_argument('--seed', type=int, default=None)
+    ap.add_argument('--baseline', type=Path, default=BASELINE)
+    ap.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    ap.add_argument('--compare', action='store_true', help='exit 1 if this run regressed against the baseline')
+    ap.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression (default 0.2)')
+    ap.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = ap.parse_args(argv)
+
+    recipes = catalog_context.Context().json(args.db).get('recipes', [])
+    mix = RequestMix(recipes, args.mix, seed=args.seed)
+    proc = start_server(args.start, args.port) if args.start else None
+    base = f'http://127.0.0.1:{args.port}' if proc else args.url.rstrip('/')
+    try:
+        async def session():
+            probes = ConnectionPool()
+            try:
+                dropped = await probe(probes, base, mix, timeout=10.0)
+            finally:
+                probes.close()
+            if not mix.weights:
+                raise SystemExit(f'{base} serves none of the routes {list(MIX)}')
+            return dropped, await run_load(base, mix, args.concurrency, args.duration, args.requests,
+                                           0 if args.requests else args.warmup)
+        dropped, (hists, errors, seconds) = asyncio.run(session())
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+    result = report(hists, errors, seconds, args.concurrency)
+    result['target'] = args.start or base
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result, dropped)
+
+    if args.save_baseline:
+        catalog_context.write_json(args.baseline, result, 2)
+        print(f'Saved baseline to {args.baseline}')
+    if args.compare:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        regressions = compare(result, baseline, args.tolerance)
+        for metric, was, now in regressions:
+            print(f'REGRESSION {metric}: {was} -> {now}')
+        print(f"{len(regressions)} regressions vs {args.baseline.name} ({baseline.get('target')}, "
+              f"tolerance {args.tolerance:.0%})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
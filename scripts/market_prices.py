@@ -0,0 +1,422 @@
+"""Nightly market-price refresh: poll price feeds concurrently and update price_lookup.json.
+
+Usage: python market_prices.py [--sources market_sources.json] [--prices price_lookup.json] [--dry-run] [--no-reload]
+
+market_sources.json lists the feeds ({"sources": [{"name", "url", "batch",
+"ttl", "connections", "timeout", "enabled", "keys"}], "breaker": {"failures",
+"cooldown"}, "max_ratio", "deadline"}). A source is asked for the lookup keys
+in sorted batches, GET url?keys=a,b,c, and answers {"prices": {key:
+{"price_php_per_kg": n}}} (or price_php_per_liter: the unit field the lookup
+entry already has).
+
+- All sources are polled at once on asyncio, over a few keep-alive HTTP/1.1
+  connections per origin (stdlib only: a small client on asyncio streams).
+- Responses are cached by URL in market_cache.json. Within the source's ttl
+  no request is made; after it the request carries If-None-Match and a 304
+  reuses the cached body.
+- A source with `failures` consecutive errors (connect error, timeout, non-2xx,
+  bad JSON) is skipped for `cooldown` seconds, then probed with one batch
+  (half-open) before it is used again. The breaker state survives across runs
+  in market_cache.json.
+- Quotes must be positive numbers in the entry's unit field and within
+  max_ratio of the current price; a key several sources quote gets the median.
+  price_lookup.json is replaced atomically (temp file + os.replace), so a
+  recompute reads the old or the new file, never half of one, and a running
+  recompute_daemon is asked to reload_lookups.
+- The whole poll is bounded by `deadline` seconds; sources still pending then
+  count as failed.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import ssl
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+import catalog_context
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+SOURCES = ROOT / 'market_sources.json'
+PRICES = ROOT / 'price_lookup.json'
+CACHE = ROOT / 'market_cache.json'
+
+PRICE_FIELDS = ('price_php_per_kg', 'price_php_per_liter')
+SOURCE_DEFAULTS = {'batch': 50, 'ttl': 6 * 3600, 'connections': 4, 'timeout': 5.0, 'enabled': True}
+BREAKER_DEFAULTS = {'failures': 3, 'cooldown': 1800}
+MAX_RATIO = 2.0   # quotes beyond 2x / below 0.5x the current price are rejected
+DEADLINE = 20.0   # seconds for the whole poll
+
+
+class HTTPError(Exception):
+    """A request that got no usable response; counts against the source's breaker."""
+
+
+async def read_response(reader):
+    """(status, headers, body, reusable) of one HTTP/1.x response."""
+    line = await reader.readline()
+    if not line:
+        raise HTTPError('connection closed before a response')
+    try:
+        version, status = line.split(None, 2)[:2]
+        status = int(status)
+    except ValueError:
+        raise HTTPError(f'bad status line {line[:60]!r}') from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    framed = True
+    if status in (204, 304) or 100 <= status < 200:
+        body = b''
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            try:
+                size = int((await reader.readline()).split(b';')[0], 16)
+            except ValueError:
+                raise HTTPError('bad chunk size') from None
+            if size == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body, framed = await reader.read(), False
+    reusable = framed and version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    return status, headers, body, reusable
+
+
+class ConnectionPool:
+    """Keep-alive connections per (host, port, tls), at most `limit` in use per origin."""
+
+    def __init__(self):
+        self.idle = {}
+        self.slots = {}
+        self._tls = None
+
+    async def request(self, url, headers=None, timeout=SOURCE_DEFAULTS['timeout'], limit=SOURCE_DEFAULTS['connections']):
+        """GET `url` -> (status, headers, body)."""
+        parts = urlsplit(url)
+        https = parts.scheme == 'https'
+        origin = (parts.hostname, parts.port or (443 if https else 80), https)
+        slot = self.slots.setdefault(origin, asyncio.Semaphore(limit))
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        head = [f'GET {target} HTTP/1.1', f'Host: {parts.netloc}', 'Accept: application/json']
+        head += [f'{k}: {v}' for k, v in (headers or {}).items()]
+        data = ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1')
+        async with slot:
+            return await asyncio.wait_for(self._send(origin, data), timeout)
+
+    async def _send(self, origin, data):
+        idle = self.idle.setdefault(origin, [])
+        while True:
+            reused = bool(idle)
+            if reused:
+                reader, writer = idle.pop()
+            else:
+                host, port, https = origin
+                if https and self._tls is None:
+                    self._tls = ssl.create_default_context()
+                reader, writer = await asyncio.open_connection(host, port, ssl=self._tls if https else None)
+            try:
+                writer.write(data)
+                await writer.drain()
+                status, headers, body, reusable = await read_response(reader)
+            except (OSError, asyncio.IncompleteReadError, HTTPError):
+                writer.close()
+                if reused:
+                    continue  # the server dropped an idle connection: retry on a new one
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if reusable:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, headers, body
+
+    def close(self):
+        for conns in self.idle.values():
+            for _, writer in conns:
+                writer.close()
+        self.idle.clear()
+
+
+class CircuitBreaker:
+    """Closed until `failures` consecutive errors, then open for `cooldown`
+    seconds, then half-open: one probe request decides between the two."""
+
+    def __init__(self, failures=BREAKER_DEFAULTS['failures'], cooldown=BREAKER_DEFAULTS['cooldown'], state=None):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.failures = (state or {}).get('failures', 0)
+        self.opened_at = (state or {}).get('opened_at')
+        self.probing = False
+
+    def state(self, now):
+        if self.opened_at is None:
+            return 'closed'
+        return 'open' if now - self.opened_at < self.cooldown else 'half-open'
+
+    def allow(self, now):
+        """Whether a request may go out; in half-open state only the first one does."""
+        state = self.state(now)
+        if state == 'closed':
+            return True
+        if state == 'half-open' and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def success(self):
+        self.failures, self.opened_at, self.probing = 0, None, False
+
+    def failure(self, now):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold:
+            self.opened_at = now
+
+    def to_json(self):
+        return {'failures': self.failures, 'opened_at': self.opened_at}
+
+
+def batch_url(url, keys):
+    return url + ('&' if '?' in url else '?') + urlencode({'keys': ','.join(keys)}, safe=',')
+
+
+def new_stats():
+    return {'requests': 0, 'cached': 0, 'not_modified': 0, 'failed': 0, 'skipped': 0, 'errors': []}
+
+
+async def fetch_source(pool, source, keys, responses, breaker, stats, now):
+    """[(url, cache entry)] of one source's batches; the entry is None for a
+    batch that failed or was skipped."""
+    # batches wait here, not in the pool, so the breaker is asked when a request
+    # can actually go out and a failing source stops after `failures` errors
+    gate = asyncio.Semaphore(source['connections'])
+
+    async def fetch(batch):
+        url = batch_url(source['url'], batch)
+        entry = responses.get(url)
+        if entry and now - entry['fetched_at'] < source['ttl']:
+            stats['cached'] += 1
+            return url, entry
+        async with gate:
+            return await request(url, entry)
+
+    async def request(url, entry):
+        if not breaker.allow(now):
+            stats['skipped'] += 1
+            return url, None
+        headers = {'If-None-Match': entry['etag']} if entry and entry.get('etag') else {}
+        try:
+            status, resp_headers, body = await pool.request(url, headers, source['timeout'], source['connections'])
+            if status == 304 and entry:
+                doc = entry['body']
+                stats['not_modified'] += 1
+            elif status == 200:
+                doc = json.loads(body)
+                if not isinstance(doc, dict) or not isinstance(doc.get('prices'), dict):
+                    raise ValueError('response has no "prices" object')
+            else:
+                raise HTTPError(f'HTTP {status}')
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HTTPError, ValueError) as e:
+            breaker.failure(now)
+            stats['failed'] += 1
+            stats['errors'].append(f'{type(e).__name__}: {e}'[:200])
+            return url, None
+        breaker.success()
+        stats['requests'] += 1
+        return url, {'etag': resp_headers.get('etag'), 'fetched_at': now, 'body': doc}
+
+    batches = [keys[i:i + source['batch']] for i in range(0, len(keys), source['batch'])]
+    results = []
+    if batches and breaker.state(now) == 'half-open':
+        results.append(await fetch(batches.pop(0)))  # the probe goes alone
+    results += await asyncio.gather(*(fetch(b) for b in batches))
+    return results
+
+
+async def poll(sources, keys, responses, breakers, now, deadline=DEADLINE):
+    """({source: [(url, cache entry or None)]}, {source: stats}) for all sources at once."""
+    pool = ConnectionPool()
+    stats = {s['name']: new_stats() for s in sources}
+    tasks = {}
+    for s in sources:
+        wanted = sorted(set(s['keys']) & set(keys)) if s.get('keys') else keys
+        tasks[s['name']] = asyncio.create_task(
+            fetch_source(pool, s, wanted, responses, breakers[s['name']], stats[s['name']], now))
+    results = {}
+    try:
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=deadline)
+        for name, task in tasks.items():
+            if task.done():
+                results[name] = task.result()
+            else:
+                task.cancel()
+                breakers[name].failure(now)
+                stats[name]['failed'] += 1
+                stats[name]['errors'].append(f'deadline of {deadline}s exceeded')
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    finally:
+        pool.close()
+    return results, stats
+
+
+def price_field(entry):
+    return next((f for f in PRICE_FIELDS if f in entry), None)
+
+
+def check_quote(entry, quote, max_ratio=MAX_RATIO):
+    """(field, value) of a valid quote for a lookup entry, else a rejection reason (str)."""
+    if entry is None:
+        return 'not in price_lookup.json'
+    field = price_field(entry)
+    value = quote.get(field) if isinstance(quote, dict) else None
+    if field is None or value is None:
+        return f'no {field or "price field"}'
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+        return f'{field} is not a positive number: {value!r}'
+    current = entry[field]
+    if isinstance(current, bool) or not isinstance(current, (int, float)) or not current > 0:
+        return 'no current price to compare'
+    ratio = value / current
+    if not 1 / max_ratio <= ratio <= max_ratio:
+        return f'{ratio:.2f}x the current {field}'
+    return field, value
+
+
+def merge_quotes(prices, docs, max_ratio=MAX_RATIO, today=None):
+    """(updated lookup entries by key, [(source, key, reason)] rejected) from
+    {source: [price documents]}; a key several sources quote gets their median."""
+    quotes, rejected = {}, []
+    for name, bodies in docs.items():
+        for body in bodies:
+            for key, quote in body['prices'].items():
+                checked = check_quote(prices.get(key), quote, max_ratio)
+                if isinstance(checked, str):
+                    rejected.append((name, key, checked))
+                else:
+                    quotes.setdefault(key, []).append((name, checked[1]))
+    today = today or datetime.now(timezone.utc).date().isoformat()
+    updates = {}
+    for key, got in quotes.items():
+        entry = prices[key]
+        field = price_field(entry)
+        value = round(statistics.median(v for _, v in got), 2)
+        value = int(value) if value == int(value) else value
+        if value != entry[field]:
+            names = ', '.join(sorted({n for n, _ in got}))
+            updates[key] = dict(entry, **{field: value, 'source': f'Market feed ({names}), {today}'})
+    return updates, rejected
+
+
+def load_config(path=SOURCES):
+    config = ip.load_json(path)
+    sources = [dict(SOURCE_DEFAULTS, **s) for s in config.get('sources', [])]
+    names = [s['name'] for s in sources]
+    if len(set(names)) != len(names):
+        raise ValueError(f'duplicate source names in {path}: {names}')
+    return {
+        'sources': [s for s in sources if s['enabled']],
+        'breaker': dict(BREAKER_DEFAULTS, **config.get('breaker', {})),
+        'max_ratio': config.get('max_ratio', MAX_RATIO),
+        'deadline': config.get('deadline', DEADLINE),
+    }
+
+
+def load_cache(path):
+    try:
+        cache = ip.load_json(path)
+    except (OSError, ValueError):
+        return {'responses': {}, 'breakers': {}}
+    return {'responses': cache.get('responses', {}), 'breakers': cache.get('breakers', {})}
+
+
+def notify_daemon():
+    """Ask a running recompute_daemon to pick up the new prices; fine if none runs."""
+    import recompute_daemon as rd
+    try:
+        return rd.call('reload_lookups', timeout=2)
+    except (OSError, RuntimeError, ValueError):
+        return None
+
+
+def refresh(sources_path=SOURCES, prices_path=PRICES, cache_path=CACHE, dry_run=False, reload=True, now=None):
+    """Poll the enabled sources and apply the valid quotes; returns a summary dict."""
+    now = time.time() if now is None else now
+    config = load_config(sources_path)
+    prices = ip.load_json(prices_path)
+    cache = load_cache(cache_path)
+    breakers = {s['name']: CircuitBreaker(**config['breaker'], state=cache['breakers'].get(s['name']))
+                for s in config['sources']}
+    t0 = time.perf_counter()
+    results, stats = asyncio.run(poll(config['sources'], sorted(prices), cache['responses'], breakers,
+                                      now, config['deadline']))
+    responses, docs = {}, {}
+    for name, fetched in results.items():
+        docs[name] = [entry['body'] for url, entry in fetched if entry]
+        # keep what this run asked for; entries of failed batches stay for their ETag
+        responses.update((url, entry or cache['responses'][url]) for url, entry in fetched
+                         if entry or url in cache['responses'])
+    updates, rejected = merge_quotes(prices, docs, config['max_ratio'])
+    if updates and not dry_run:
+        prices.update(updates)
+        catalog_context.write_json(prices_path, prices, catalog_context.detect_indent(prices_path),
+                                   catalog_context.detect_newline(prices_path))
+    catalog_context.write_json(cache_path, {
+        'responses': responses,
+        'breakers': {name: b.to_json() for name, b in breakers.items()},
+    }, None)
+    reloaded = None
+    if updates and not dry_run and reload and os.path.realpath(prices_path) == os.path.realpath(PRICES):
+        reloaded = notify_daemon()
+    return {
+        'seconds': round(time.perf_counter() - t0, 3),
+        'sources': {name: dict(stats[name], breaker=breakers[name].state(now)) for name in stats},
+        'updated': updates,
+        'rejected': rejected,
+        'daemon_reloaded': reloaded is not None,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Refresh price_lookup.json from market price feeds')
+    ap.add_argument('--sources', type=Path, default=SOURCES)
+    ap.add_argument('--prices', type=Path, default=PRICES)
+    ap.add_argument('--cache', type=Path, default=CACHE)
+    ap.add_argument('--dry-run', action='store_true', help='report the updates without writing price_lookup.json')
+    ap.add_argument('--no-reload', action='store_true', help='do not ask a running recompute_daemon to reload')
+    args = ap.parse_args(argv)
+    out = refresh(args.sources, args.prices, args.cache, dry_run=args.dry_run, reload=not args.no_reload)
+    if not out['sources']:
+        print(f'No enabled sources in {args.sources}')
+    for name, s in out['sources'].items():
+        print(f"{name:<14} {s['requests']} fetched, {s['not_modified']} not modified, {s['cached']} cached, "
+              f"{s['failed']} failed, {s['skipped']} skipped; breaker {s['breaker']}")
+        for err in s['errors'][:3]:
+            print(f'    {err}')
+    for name, key, reason in out['rejected'][:20]:
+        print(f'  rejected {name}:{key}: {reason}')
+    print(f"{len(out['updated'])} prices updated, {len(out['rejected'])} quotes rejected in {out['seconds']}s"
+          + (' (dry run, nothing written)' if args.dry_run else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
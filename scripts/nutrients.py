@@ -0,0 +1,161 @@
+"""Nutrient registry and dense key x nutrient matrix for arbitrary nutrient sets.
+
+Usage: python nutrients.py [--db ../database.json]   (writes ../recipe_nutrients.json)
+
+nutrition_lookup.json keeps the four macros the recompute needs. Further
+nutrients live in micronutrients.json, which is only read when a matrix is
+built: a registry {"nutrients": [{"id", "unit", "name"}, ...]} plus
+{"per_100g": {key: {nutrient id: value}}}. Both are compiled into one float32
+matrix (keys x nutrients, NaN = unknown), so the totals of a whole catalog are
+one (recipes x keys) @ (keys x nutrients) product; a new nutrient is one more
+column, not another pass over the recipes. Per-recipe totals go to
+../recipe_nutrients.json (served by /api/recipes/:id/nutrients) as arrays in
+registry order, with the percentage of the recipe's grams whose value is
+known; database.json keeps only the macros. Requires numpy.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+import numpy as np
+import catalog_context
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+NUTR = ROOT / 'nutrition_lookup.json'
+EXTRA = ROOT / 'micronutrients.json'
+OUT = ROOT.parent / 'recipe_nutrients.json'
+
+# the macros nutrition_lookup.json carries for every key, always the first columns
+CORE = (
+    {'id': 'calories', 'unit': 'kcal', 'name': 'Energy'},
+    {'id': 'protein', 'unit': 'g', 'name': 'Protein'},
+    {'id': 'carbs', 'unit': 'g', 'name': 'Carbohydrate'},
+    {'id': 'fat', 'unit': 'g', 'name': 'Total fat'},
+)
+
+
+class NutrientRegistry:
+    """Ordered nutrient ids with their units; the column order of every matrix."""
+
+    def __init__(self, nutrients):
+        self.nutrients = tuple(nutrients)
+        self.ids = tuple(n['id'] for n in self.nutrients)
+        self.units = tuple(n['unit'] for n in self.nutrients)
+        self.index = {nid: j for j, nid in enumerate(self.ids)}
+        if len(self.index) != len(self.ids):
+            raise ValueError(f'duplicate nutrient ids in {self.ids}')
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class NutrientMatrix:
+    """float32 per-100g values, one row per lookup key and one column per nutrient."""
+
+    def __init__(self, registry, keys, values):
+        self.registry = registry
+        self.keys = list(keys)
+        self.row = {k: i for i, k in enumerate(self.keys)}
+        self.values = values
+
+    @classmethod
+    def from_lookups(cls, nutr, extra=None):
+        extra = extra or {}
+        registry = NutrientRegistry(CORE + tuple(extra.get('nutrients', ())))
+        extra_values = extra.get('per_100g', {})
+        keys = sorted(set(nutr) | set(extra_values))
+        values = np.full((len(keys), len(registry)), np.nan, dtype=np.float32)
+        for i, key in enumerate(keys):
+            for source in (nutr.get(key, {}).get('per_100g', {}), extra_values.get(key, {})):
+                for nid, x in source.items():
+                    j = registry.index.get(nid)
+                    if j is not None and x is not None:
+                        values[i, j] = x
+        return cls(registry, keys, values)
+
+    def rows_for(self, keys):
+        """(len(keys) x nutrients) slice in the order of `keys`; NaN rows for unknown keys."""
+        out = np.full((len(keys), len(self.registry)), np.nan, dtype=np.float32)
+        idx = [(c, self.row[k]) for c, k in enumerate(keys) if k in self.row]
+        if idx:
+            cols, rows = zip(*idx)
+            out[list(cols)] = self.values[list(rows)]
+        return out
+
+    def totals(self, grams, keys):
+        """Totals and known-gram share for a (recipes x keys) gram matrix whose
+        columns are `keys`: two (recipes x nutrients) arrays from one product each."""
+        per100 = self.rows_for(keys).astype(np.float64)
+        known = ~np.isnan(per100)
+        totals = grams @ np.where(known, per100, 0.0) / 100.0
+        weight = grams.sum(axis=1, keepdims=True)
+        share = np.divide(grams @ known, weight, out=np.ones_like(totals), where=weight > 0)
+        return totals, share
+
+
+_MATRICES = {}
+
+
+def load_matrix(nutr_path=NUTR, extra_path=EXTRA, nutr=None):
+    """The matrix for the current files, rebuilt only when one of them changed."""
+    stamps = tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) if os.path.exists(p) else None
+                   for p in (nutr_path, extra_path))
+    cached = _MATRICES.get((str(nutr_path), str(extra_path)))
+    if cached and cached[0] == stamps:
+        return cached[1]
+    if nutr is None:
+        nutr = ip.load_json(nutr_path)
+    extra = ip.load_json(extra_path) if stamps[1] else None
+    matrix = NutrientMatrix.from_lookups(nutr, extra)
+    _MATRICES[(str(nutr_path), str(extra_path))] = (stamps, matrix)
+    return matrix
+
+
+def gram_matrix(conn, source):
+    """(recipe ids, keys, recipes x keys grams) from the derived store."""
+    ids = [row['id_meal'] for row in conn.execute(
+        'SELECT id_meal FROM recipes WHERE source = ? ORDER BY position', (source,))]
+    row_of = {mid: i for i, mid in enumerate(ids)}
+    rows = conn.execute("""
+        SELECT id_meal, key, SUM(grams) AS grams FROM ingredient_lines
+        WHERE source = ? AND key IS NOT NULL AND grams > 0
+        GROUP BY id_meal, key""", (source,)).fetchall()
+    keys = sorted({row['key'] for row in rows})
+    col = {k: j for j, k in enumerate(keys)}
+    grams = np.zeros((len(ids), len(keys)), dtype=np.float64)
+    for row in rows:
+        if row['id_meal'] in row_of:
+            grams[row_of[row['id_meal']], col[row['key']]] = row['grams']
+    return ids, keys, grams
+
+
+def recipe_nutrients(ctx, db_path=DB):
+    """{'nutrients': registry, 'recipes': {id: {servings, total, known_pct}}} for a catalog."""
+    matrix = load_matrix(nutr=ctx.nutr)
+    ids, keys, grams = gram_matrix(ctx.store([db_path]), Path(db_path).name)
+    totals, share = matrix.totals(grams, keys)
+    by_id = {str(r.get('idMeal')): r for r in ctx.json(db_path).get('recipes', [])}
+    recipes = {}
+    for i, mid in enumerate(ids):
+        recipes[mid] = {
+            'servings': ip.recipe_servings(by_id.get(mid, {})),
+            'total': [round(float(x), 1) for x in totals[i]],
+            'known_pct': [round(float(x) * 100) for x in share[i]],
+        }
+    return {'nutrients': list(matrix.registry.nutrients), 'source': Path(db_path).name, 'recipes': recipes}
+
+
+def main(ctx=None, db_path=DB):
+    ctx = ctx or catalog_context.Context()
+    out = recipe_nutrients(ctx, db_path)
+    with open(OUT, 'w', encoding='utf-8') as f:
+        json.dump(out, f, ensure_ascii=False, separators=(',', ':'))
+    print(f"Wrote {len(out['nutrients'])} nutrients for {len(out['recipes'])} recipes to {OUT}")
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Compute per-recipe nutrient totals into recipe_nutrients.json')
+    ap.add_argument('--db', type=Path, default=DB)
+    main(db_path=ap.parse_args().db)
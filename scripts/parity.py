@@ -0,0 +1,275 @@
+"""Differential check of a candidate parser, canonicalizer or costing against the reference.
+
+Usage:
+    python parity.py [--candidate measure=module:function] [--candidate canonical=module:function]
+                     [--candidate cost=module:function] [--shared-lookups]
+                     [--fuzz 2000] [--seed 1] [--tolerance 0.001] [--repeat 3] [--json]
+
+The corpus is every strIngredientN/strMeasureN pair in database.json and its
+backups (../database*.json*), deduplicated, plus grammar-generated variants:
+mixed fractions, ranges, parentheticals ("1 piece (approx 1.5kg)"), "to
+taste", "for deep frying", plural and cased ingredient names. Each target runs
+the reference from ingredient_parser.py and the candidate over the same
+inputs:
+
+    measure    f(measure_text, ingredient_key) -> grams        (ip.parse_measure)
+    canonical  f(name) -> key                                  (ip.canonicalize_ingredient)
+    cost       f(recipe, nutr, price) -> (totals, price, keys) (ip.compute_totals)
+
+Numbers match within --tolerance (relative, floor 1 unit), keys exactly; a
+call that raises matches only a call raising the same exception type. A
+candidate defaults to the reference itself; --shared-lookups runs the cost
+candidate over shared_lookups.py's shared-memory views instead of the dicts.
+Each side is timed as the best of --repeat passes and the report gives the
+throughput ratio (reference time / candidate time). Exits 1 on any mismatch,
+so a faster implementation cannot change nutrition numbers unnoticed.
+"""
+import argparse
+import importlib
+import json
+import math
+import random
+import sys
+import time
+from pathlib import Path
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+CATALOGS = 'database*.json*'
+SLOTS = 20
+
+TARGETS = ('measure', 'canonical', 'cost')
+REFERENCE = {'measure': ip.parse_measure, 'canonical': ip.canonicalize_ingredient, 'cost': ip.compute_totals}
+DEFAULT_FUZZ = 2000
+DEFAULT_TOLERANCE = 1e-3
+MAX_SHOWN = 10
+
+# measure grammar: [number] [unit] [tail]; numbers cover the forms the heuristics branch on
+WHOLE = ('1', '2', '3', '4', '12', '250', '0.5', '1.5', '.25')
+FRACTIONS = ('1/2', '1/3', '1/4', '3/4', '2/3')
+UNITS = ('g', 'kg', 'grams', 'mg', 'lb', 'oz', 'cup', 'cups', 'tbsp', 'tsp', 'tbsp(s)', 'piece', 'pieces',
+         'pc', 'pcs', 'clove', 'cloves', 'head', 'whole', 'bunch', 'bunches', 'stalk', 'stalks', 'medium', 'small', '')
+TAILS = ('', ', chopped', ', thinly sliced', ' (optional)', ' (about 200g)', ' (approx 1.5kg)', ' (2 cups)',
+         ' (1/2 cup)', ', cut into pieces', ' or to taste')
+VAGUE = ('to taste', 'for deep frying', 'for frying', 'oil for frying, as needed', 'as needed for frying',
+         'for deep-fry', 'for dipping', 'for dipping sauce', 'pinch', 'a dash', 'as needed', '')
+NAME_TAILS = ('', 's', ', chopped', ' (optional)', '/belly', ' broth')
+NAME_PREFIXES = ('', 'fresh ', 'whole ', 'ground ', 'Fresh ')
+
+
+def catalog_paths(root=ROOT.parent, pattern=CATALOGS):
+    return sorted(p for p in Path(root).glob(pattern) if p.is_file())
+
+
+def load_recipes(paths):
+    """Recipes of every readable catalog; unreadable backups are skipped."""
+    recipes = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            continue
+        recipes.extend(r for r in doc.get('recipes', []) if isinstance(r, dict))
+    return recipes
+
+
+def fuzz_measure(rng):
+    kind = rng.random()
+    if kind < 0.15:
+        return rng.choice(VAGUE)
+    if kind < 0.35:
+        number = f'{rng.choice(WHOLE[:5])} {rng.choice(FRACTIONS)}'  # mixed fraction
+    elif kind < 0.5:
+        number = rng.choice(FRACTIONS)
+    elif kind < 0.6:
+        number = f'{rng.choice(WHOLE[:4])}-{rng.choice(WHOLE[1:5])}'  # range
+    else:
+        number = rng.choice(WHOLE)
+    space = rng.choice(('', ' ', ' '))
+    text = f'{number}{space}{rng.choice(UNITS)}{rng.choice(TAILS)}'
+    return text.upper() if rng.random() < 0.05 else text
+
+
+def fuzz_name(rng, name):
+    text = f'{rng.choice(NAME_PREFIXES)}{name}{rng.choice(NAME_TAILS)}'
+    return text.title() if rng.random() < 0.3 else text
+
+
+def build_corpus(recipes, fuzz=DEFAULT_FUZZ, seed=1):
+    """{'measure': [(text, key)], 'canonical': [(name,)], 'cost': [(recipe,)]}: the
+    distinct real inputs first, then `fuzz` generated ones per target."""
+    names, pairs, seen = {}, {}, set()
+    costed = []
+    for r in recipes:
+        lines = []
+        for i in range(1, SLOTS + 1):
+            ing, meas = r.get(f'strIngredient{i}'), r.get(f'strMeasure{i}')
+            if isinstance(ing, str) and ing.strip():
+                names.setdefault(ing, None)
+                if isinstance(meas, str):
+                    pairs.setdefault((meas, ing), None)
+                    lines.append((ing, meas))
+        if lines and tuple(lines) not in seen:
+            seen.add(tuple(lines))
+            costed.append(r)
+    rng = random.Random(seed)
+    base = sorted(names) or ['garlic']
+    fuzzed_names = [fuzz_name(rng, rng.choice(base)) for _ in range(fuzz)]
+    fuzzed_pairs = [(fuzz_measure(rng), rng.choice(base)) for _ in range(fuzz)]
+    fuzzed_recipes = []
+    for _ in range(fuzz // 10):
+        lines = [(rng.choice(base), fuzz_measure(rng)) for _ in range(rng.randint(1, 12))]
+        r = {}
+        for i, (ing, meas) in enumerate(lines, 1):
+            r[f'strIngredient{i}'], r[f'strMeasure{i}'] = ing, meas
+        fuzzed_recipes.append(r)
+    keys = {}
+
+    def key(name):
+        if name not in keys:
+            keys[name] = ip.canonicalize_ingredient(name)
+        return keys[name]
+    return {
+        'measure': [(m, key(n)) for m, n in list(pairs) + fuzzed_pairs],
+        'canonical': [(n,) for n in base + fuzzed_names],
+        'cost': [(r,) for r in costed + fuzzed_recipes],
+    }
+
+
+def resolve(spec):
+    """'module:function' -> the function."""
+    module, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(f'candidate {spec!r} is not module:function')
+    fn = importlib.import_module(module)
+    for part in attr.split('.'):
+        fn = getattr(fn, part)
+    return fn
+
+
+def close(a, b, tol):
+    """Equality with a relative tolerance on numbers, recursively through tuples/lists/dicts."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        if math.isnan(a) or math.isnan(b):
+            return math.isnan(a) and math.isnan(b)
+        return abs(a - b) <= tol * max(1.0, abs(a), abs(b))
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(close(x, y, tol) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(close(a[k], b[k], tol) for k in a)
+    return a == b
+
+
+def outcomes(fn, cases, extra=()):
+    """[result or ('raised', ExceptionType name)] per case."""
+    out = []
+    for case in cases:
+        try:
+            out.append(fn(*case, *extra))
+        except Exception as e:  # a crash is an outcome to compare, not a harness failure
+            out.append(('raised', type(e).__name__))
+    return out
+
+
+def timed(fn, cases, extra=(), repeat=3):
+    """(outcomes of the last pass, best wall time over `repeat` passes)."""
+    best, result = math.inf, None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        result = outcomes(fn, cases, extra)
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def compare(target, reference, candidate, cases, ref_extra=(), cand_extra=(), tolerance=DEFAULT_TOLERANCE, repeat=3):
+    """Run both sides over `cases`; {'target', 'cases', 'mismatches', 'examples',
+    'reference_s', 'candidate_s', 'speedup'}."""
+    expected, ref_s = timed(reference, cases, ref_extra, repeat)
+    actual, cand_s = timed(candidate, cases, cand_extra, repeat)
+    examples, mismatches = [], 0
+    for case, want, got in zip(cases, expected, actual):
+        if not close(want, got, tolerance):
+            mismatches += 1
+            if len(examples) < MAX_SHOWN:
+                shown = case if target != 'cost' else (
+                    {k: v for k, v in case[0].items() if k.startswith(('strIngredient', 'strMeasure', 'idMeal'))},)
+                examples.append({'input': shown, 'reference': want, 'candidate': got})
+    return {'target': target, 'cases': len(cases), 'mismatches': mismatches, 'examples': examples,
+            'reference_s': round(ref_s, 4), 'candidate_s': round(cand_s, 4),
+            'speedup': round(ref_s / cand_s, 3) if cand_s else None}
+
+
+def run(candidates=None, corpus=None, targets=TARGETS, nutr=None, price=None, shared_lookups=False,
+        tolerance=DEFAULT_TOLERANCE, repeat=3, fuzz=DEFAULT_FUZZ, seed=1):
+    """Compare each target's candidate (default: the reference) with the reference; list of reports."""
+    candidates = candidates or {}
+    if corpus is None:
+        corpus = build_corpus(load_recipes(catalog_paths()), fuzz, seed)
+    reports = []
+    # fuzzed measures would append to clamp_grams' warning log thousands of times,
+    # filling it and charging the file writes to whichever side is being timed
+    warn_log, ip.WARN_LOG = ip.WARN_LOG, None
+    try:
+        for target in targets:
+            ref_extra = cand_extra = ()
+            shm = None
+            if target == 'cost':
+                nutr = ip.load_json(ip.NUTR_PATH) if nutr is None else nutr
+                price = ip.load_json(ip.PRICE_PATH) if price is None else price
+                ref_extra = cand_extra = (nutr, price)
+                if shared_lookups:
+                    from shared_lookups import LookupTables
+                    shm = LookupTables.from_dicts(nutr, price).publish()
+                    view = LookupTables.attach(shm.name)
+                    cand_extra = (view.nutrition, view.prices)
+            try:
+                reports.append(compare(target, REFERENCE[target], candidates.get(target, REFERENCE[target]),
+                                       corpus[target], ref_extra, cand_extra, tolerance, repeat))
+            finally:
+                if shm is not None:
+                    view.close()
+                    shm.close()
+                    shm.unlink()
+    finally:
+        ip.WARN_LOG = warn_log
+    return reports
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Check a candidate parser/canonicalizer/costing against the reference')
+    ap.add_argument('--candidate', action='append', default=[], metavar='TARGET=module:function',
+                    help=f"target one of {', '.join(TARGETS)}")
+    ap.add_argument('--target', action='append', choices=TARGETS, help='only these targets (default: all)')
+    ap.add_argument('--shared-lookups', action='store_true', help='cost candidate reads shared-memory lookups')
+    ap.add_argument('--fuzz', type=int, default=DEFAULT_FUZZ, help='generated inputs per target')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--json', action='store_true')
+    args = ap.parse_args(argv)
+    candidates = {}
+    for spec in args.candidate:
+        target, _, fn = spec.partition('=')
+        if target not in TARGETS:
+            ap.error(f"--candidate {spec!r}: target must be one of {', '.join(TARGETS)}")
+        candidates[target] = resolve(fn)
+
+    reports = run(candidates, targets=args.target or TARGETS, shared_lookups=args.shared_lookups,
+                  tolerance=args.tolerance, repeat=args.repeat, fuzz=args.fuzz, seed=args.seed)
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2, default=sorted))
+    else:
+        for rep in reports:
+            print(f"{rep['target']:<10} {rep['cases']:>6} cases  {rep['mismatches']:>4} mismatches  "
+                  f"reference {rep['reference_s'] * 1000:8.1f} ms  candidate {rep['candidate_s'] * 1000:8.1f} ms  "
+                  f"x{rep['speedup']}")
+            for ex in rep['examples']:
+                print(f"    {ex['input']!r}: {ex['reference']!r} != {ex['candidate']!r}")
+    return 1 if any(rep['mismatches'] for rep in reports) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
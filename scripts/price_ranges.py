@@ -0,0 +1,154 @@
+"""Monte Carlo price ranges: price_min / price_planned / price_max (and per serving)
+from sampled ingredient prices and parsed gram amounts.
+
+Usage: python price_ranges.py [--db ../database.json] [--samples 10000] [--seed N] [--dry-run]
+
+Every costed ingredient line is a lognormal around its parsed cost. Price
+spread depends on how the lookup price was sourced; grams spread on the parse
+rule that produced the amount, so "to taste", piece counts and deep-fry oil
+are much wider than an explicit "500g". All recipes are sampled together as a
+recipes x samples x lines array (in blocks to bound memory) and the range
+fields are the P10 / P50 / P90 of each recipe's total. Requires numpy.
+"""
+import argparse
+import json
+from collections import defaultdict
+from pathlib import Path
+import numpy as np
+import aggregates
+import derived_store as ds
+import ingredient_parser as ip
+from catalog_context import detect_indent, is_served, write_json
+import export_static
+import skyline
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+
+SAMPLES = 10000
+PERCENTILES = (10, 50, 90)   # -> price_min, price_planned, price_max
+BLOCK_ELEMENTS = 8_000_000   # float32 cells per sampled block (~32 MB)
+
+# relative spread (lognormal sigma) of the parsed grams, by parse rule
+GRAMS_SIGMA = {
+    'mass': 0.05,
+    'volume': 0.12,
+    'fraction': 0.12,
+    'count': 0.25,
+    'bare_number': 0.30,
+    'first_number': 0.35,
+    'fry_oil': 0.50,
+    'deep_fry': 0.50,
+    'deep_fry_oil': 0.50,
+    'to_taste': 0.60,
+}
+DEFAULT_GRAMS_SIGMA = 0.30
+# relative spread of the price per gram, by lookup source
+PRICE_SIGMA = 0.15
+ESTIMATED_PRICE_SIGMA = 0.35  # 'Estimated placeholder (...)' / 'Estimated minimal cost'
+
+
+def grams_sigma(rule):
+    if rule.startswith('paren:'):
+        rule = rule[len('paren:'):]
+    return GRAMS_SIGMA.get(rule, DEFAULT_GRAMS_SIGMA)
+
+
+def price_sigma(price_json):
+    source = (json.loads(price_json).get('source') or '') if price_json else ''
+    return ESTIMATED_PRICE_SIGMA if source.lower().startswith('estimated') else PRICE_SIGMA
+
+
+def line_arrays(conn, source):
+    """Dense (recipes x lines) base cost and sigma arrays for the costed lines of `source`."""
+    ids = [row['id_meal'] for row in conn.execute(
+        'SELECT id_meal FROM recipes WHERE source = ? ORDER BY position', (source,))]
+    lines = defaultdict(list)
+    rows = conn.execute("""
+        SELECT l.id_meal, l.grams, l.rule, k.price_per_g, k.price_json
+        FROM ingredient_lines l JOIN lookups k ON k.key = l.key
+        WHERE l.source = ? AND l.price > 0 ORDER BY l.id_meal, l.slot""", (source,))
+    for row in rows:
+        # grams and price draws are independent lognormals, so their product is
+        # one lognormal with the combined sigma
+        sigma = (grams_sigma(row['rule']) ** 2 + price_sigma(row['price_json']) ** 2) ** 0.5
+        lines[row['id_meal']].append((row['grams'] * row['price_per_g'], sigma))
+    width = max((len(v) for v in lines.values()), default=0)
+    base = np.zeros((len(ids), width), dtype=np.float32)
+    sigma = np.zeros((len(ids), width), dtype=np.float32)
+    for i, mid in enumerate(ids):
+        for j, (b, s) in enumerate(lines.get(mid, ())):
+            base[i, j] = b
+            sigma[i, j] = s
+    return ids, base, sigma
+
+
+def sample_ranges(base, sigma, samples=SAMPLES, seed=None, percentiles=PERCENTILES):
+    """Percentiles of the sampled recipe totals, shape (recipes, len(percentiles))."""
+    rng = np.random.default_rng(seed)
+    n, width = base.shape
+    out = np.zeros((n, len(percentiles)), dtype=np.float64)
+    if n == 0 or width == 0:
+        return out
+    block = max(1, BLOCK_ELEMENTS // (samples * width))
+    mu = -0.5 * sigma ** 2  # mean-preserving: E[exp(mu + sigma * z)] == 1
+    for start in range(0, n, block):
+        b, s, m = base[start:start + block], sigma[start:start + block], mu[start:start + block]
+        z = rng.standard_normal((len(b), samples, width), dtype=np.float32)
+        z *= s[:, None, :]
+        z += m[:, None, :]
+        np.exp(z, out=z)
+        z *= b[:, None, :]
+        totals = z.sum(axis=2)
+        out[start:start + block] = np.percentile(totals, percentiles, axis=1).T
+    return out
+
+
+def compute_ranges(conn, source, samples=SAMPLES, seed=None):
+    """{idMeal: (p_low, p_mid, p_high)} for every recipe of `source` with at least
+    one costed line; recipes nothing could be priced for keep their old fields."""
+    ids, base, sigma = line_arrays(conn, source)
+    pct = sample_ranges(base, sigma, samples=samples, seed=seed)
+    costed = base.any(axis=1)
+    return {mid: tuple(float(x) for x in row) for mid, row, ok in zip(ids, pct, costed) if ok}
+
+
+def apply_ranges(recipes, ranges):
+    """Write the sampled range fields (and their per-serving variants) onto the recipes."""
+    updated = 0
+    for r in recipes:
+        rng = ranges.get(r.get('idMeal'))
+        if rng is None:
+            continue
+        servings = ip.recipe_servings(r)
+        for suffix, value in zip(('min', 'planned', 'max'), rng):
+            r[f'price_{suffix}'] = round(value)
+            r[f'price_per_serving_{suffix}'] = round(value / servings)
+        updated += 1
+    return updated
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Monte Carlo price_min/price_planned/price_max ranges')
+    ap.add_argument('--db', default=str(DB))
+    ap.add_argument('--samples', type=int, default=SAMPLES)
+    ap.add_argument('--seed', type=int, default=None)
+    ap.add_argument('--dry-run', action='store_true')
+    args = ap.parse_args()
+    conn = ds.open_store()
+    ds.refresh(conn, [args.db])
+    ranges = compute_ranges(conn, Path(args.db).name, samples=args.samples, seed=args.seed)
+    db = ds.load(args.db)
+    updated = apply_ranges(db.get('recipes', []), ranges)
+    if not args.dry_run:
+        write_json(args.db, db, detect_indent(args.db))
+        if is_served(args.db):
+            export_static.export(args.db)
+            skyline.export(args.db)
+            aggregates.export(args.db)
+    print(f"Sampled {updated} recipes x {args.samples} draws"
+          + (' (dry run, nothing written)' if args.dry_run else f' -> {args.db}'))
+
+
+if __name__ == '__main__':
+    main()
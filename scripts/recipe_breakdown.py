@@ -1,55 +1,38 @@
 import json
 from pathlib import Path
-import ingredient_parser as ip
+import catalog_context
 
 ROOT = Path(__file__).resolve().parent
 NEW = ROOT.parent / 'database.updated.json'
 OLD = ROOT.parent / 'database.json.bak'
-NUTR = ROOT / 'nutrition_lookup.json'
-PRICE = ROOT / 'price_lookup.json'
 
 THRESH_CAL = 200
 THRESH_PRICE = 20
 
 
-def load(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def breakdown_recipe(r, nutr, price):
+def breakdown_recipe(conn, source, mid):
+    """Per-line breakdown of one recipe from the derived store (no re-parsing)."""
     items = []
     total_cals = 0.0
     total_price = 0.0
-    for i in range(1, 21):
-        ing = r.get(f'strIngredient{i}', '')
-        meas = r.get(f'strMeasure{i}', '')
-        if not ing or not meas or ing.strip() == '':
-            continue
-        key = ip.canonicalize_ingredient(ing)
-        grams = ip.parse_measure(meas, key)
-        per100 = nutr.get(key, {}).get('per_100g', {})
-        kcal = grams * per100.get('calories', 0) / 100.0
-        pr = 0.0
-        pinfo = price.get(key, {})
-        if 'price_php_per_kg' in pinfo:
-            pr = grams * (pinfo['price_php_per_kg'] / 1000.0)
-        elif 'price_php_per_liter' in pinfo:
-            pr = grams * (pinfo['price_php_per_liter'] / 1000.0)
-        items.append({'ingredient': ing, 'key': key, 'measure': meas, 'grams': grams, 'kcal': round(kcal,1), 'price': round(pr,2), 'per100': per100, 'price_info': pinfo})
-        total_cals += kcal
-        total_price += pr
+    rows = conn.execute("""
+        SELECT l.ingredient, l.key, l.measure, l.grams, l.kcal, l.price, k.nutrition_json, k.price_json
+        FROM ingredient_lines l LEFT JOIN lookups k ON k.key = l.key
+        WHERE l.source = ? AND l.id_meal = ? ORDER BY l.slot""", (source, mid))
+    for row in rows:
+        per100 = json.loads(row['nutrition_json']).get('per_100g', {}) if row['nutrition_json'] else {}
+        pinfo = json.loads(row['price_json']) if row['price_json'] else {}
+        items.append({'ingredient': row['ingredient'], 'key': row['key'], 'measure': row['measure'], 'grams': row['grams'], 'kcal': round(row['kcal'],1), 'price': round(row['price'],2), 'per100': per100, 'price_info': pinfo})
+        total_cals += row['kcal']
+        total_price += row['price']
     return {'items': items, 'total_calories': round(total_cals), 'total_price': round(total_price)}
 
 
-def main():
-    new = load(NEW)
-    try:
-        old = load(OLD)
-    except Exception:
-        old = load(ROOT.parent / 'database.json')
-    nutr = load(NUTR)
-    price = load(PRICE)
+def main(ctx=None):
+    ctx = ctx or catalog_context.Context()
+    new = ctx.json(NEW)
+    old = ctx.first(OLD, ROOT.parent / 'database.json')
+    conn = ctx.store([NEW])
 
     old_map = {r.get('idMeal'): r for r in old.get('recipes', [])}
     report = {'cases': []}
@@ -66,12 +49,13 @@ def main():
         new_price = val(r, 'price')
         price_delta = abs(new_price - old_price)
         if cal_delta >= THRESH_CAL or price_delta >= THRESH_PRICE:
-            br = breakdown_recipe(r, nutr, price)
+            br = breakdown_recipe(conn, NEW.name, mid)
             report['cases'].append({'idMeal': mid, 'name': r.get('strMeal'), 'old_cal': old_cal, 'new_cal': new_cal, 'cal_delta': cal_delta, 'old_price': old_price, 'new_price': new_price, 'price_delta': price_delta, 'breakdown': br})
 
     out = ROOT / 'breakdown_report.json'
     with open(out, 'w', encoding='utf-8') as f:
         json.dump(report, f, ensure_ascii=False, indent=2)
+    ctx.put(out, report)
     print(f'Wrote breakdown to {out}')
 
 
@@ -0,0 +1,74 @@
+"""recipectl: run pipeline stages in one process over one lazily loaded catalog.
+
+Usage:
+    python recipectl.py recompute report breakdown flag missing
+    python recipectl.py --list
+
+Stages run in the order given and share a catalog_context.Context, so a
+file parsed by an earlier stage (or written by it: database.updated.json
+after `recompute`, breakdown_report.json after `breakdown`) is not parsed
+again, and the derived store is refreshed once per catalog version. Each
+stage writes the same outputs as its standalone script. Timing per stage and
+the number of files parsed are printed at the end.
+"""
+import argparse
+import importlib
+import sys
+import time
+
+import catalog_context
+
+# stage -> (module whose main(ctx) runs it, description)
+STAGES = {
+    'recompute': ('ingredient_parser', 'recalculate nutrition/price -> database.updated.json'),
+    'report': ('generate_report', 'calorie/price deltas -> report_changes.json, validation_sample.json'),
+    'breakdown': ('recipe_breakdown', 'per-line breakdown of large changes -> breakdown_report.json'),
+    'flag': ('flag_suspicious_entries', 'implausible nutrition entries -> suspicious_nutrition.json'),
+    'measures': ('flag_suspicious', 'implausible small-unit grams -> flagged_measures.json'),
+    'steps': ('instructions', 'step timings, techniques, difficulty -> database.json'),
+    'tags': ('diet_tags', 'diet/allergen bitmasks and facet counts -> ../recipe_tags.json'),
+    'skyline': ('skyline', 'layered price/nutrition frontiers per category -> ../recipe_skyline.json'),
+    'stats': ('aggregates', 'per category/area/meal type counts, price/calorie stats -> ../catalog_stats.json'),
+    'nutrients': ('nutrients', 'micronutrient totals per recipe -> ../recipe_nutrients.json'),
+    'missing': ('check_missing_lookups', 'keys without lookups, outliers -> missing_lookup_report.json'),
+    'top': ('analyze_top_changes', 'print top calorie contributors of the biggest changes'),
+}
+
+
+def run(stages, ctx=None):
+    """Run `stages` in order on one context; returns [(stage, seconds)]."""
+    ctx = ctx or catalog_context.Context()
+    timings = []
+    for stage in stages:
+        module = importlib.import_module(STAGES[stage][0])
+        t0 = time.perf_counter()
+        module.main(ctx)
+        timings.append((stage, time.perf_counter() - t0))
+    return timings
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Run pipeline stages in one process over a shared catalog.')
+    ap.add_argument('stages', nargs='*', metavar='stage', help=f"any of: {', '.join(STAGES)}")
+    ap.add_argument('--list', action='store_true', help='list the stages and exit')
+    args = ap.parse_args(argv)
+    if args.list or not args.stages:
+        for name, (module, desc) in STAGES.items():
+            print(f'{name:<10} {module}.py: {desc}')
+        return 0
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        ap.error(f"unknown stage(s) {', '.join(unknown)}; expected any of {', '.join(STAGES)}")
+
+    ctx = catalog_context.Context()
+    t0 = time.perf_counter()
+    timings = run(args.stages, ctx)
+    print()
+    for stage, seconds in timings:
+        print(f'{stage:<10} {seconds:7.3f}s')
+    print(f"{'total':<10} {time.perf_counter() - t0:7.3f}s  ({ctx.reads} files parsed, {ctx.hits} served from memory)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
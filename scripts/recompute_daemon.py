@@ -0,0 +1,266 @@
+"""Resident recompute daemon: keeps the catalog, lookups and parser indexes warm
+in memory and answers JSON calls on localhost, so tools stop paying for
+re-reading database.json, the lookups and the alias/unit tables on every run.
+
+Usage:
+    python recompute_daemon.py serve [--port 8765] [--db ../database.json]
+    python recompute_daemon.py call status
+    python recompute_daemon.py call breakdown '{"id": "12"}'
+    python recompute_daemon.py call recompute '{"ids": ["1", "2"]}'
+
+POST / with {"method": ..., "params": {...}} returns {"result": ...} or
+{"error": ...} (400 bad request, 404 unknown recipe, 500 otherwise).
+
+Methods:
+  status()             catalog size, parser version, uptime, calls served
+  recompute(ids=None)  fields ingredient_parser.main would recalculate, and the
+                       ones that would change; nothing is written
+  breakdown(id)        per-line grams/kcal/price, like recipe_breakdown.py
+  cost(recipe)         the same for a recipe payload that is not in the catalog
+  reload_lookups()     re-read the nutrition/price lookups and parser_config.json
+
+The catalog is re-read when database.json changes on disk. Each call works on
+the snapshot it started with; reloads build a new snapshot and swap it in.
+The server binds to 127.0.0.1 only.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import derived_store as ds
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+HOST = '127.0.0.1'
+PORT = 8765
+METHODS = ('status', 'recompute', 'breakdown', 'cost', 'reload_lookups')
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class Catalog:
+    """One parsed copy of the recipe file, indexed by idMeal."""
+
+    def __init__(self, path, stamp, recipes):
+        self.path = path
+        self.stamp = stamp
+        self.recipes = recipes
+        self.by_id = {str(r.get('idMeal')): r for r in recipes}
+
+    @classmethod
+    def load(cls, path):
+        stamp = file_stamp(path)
+        return cls(path, stamp, ds.load(path).get('recipes', []))
+
+
+class Lookups:
+    """Nutrition/price lookups plus the per-key (kcal per 100 g, price per g) costs."""
+
+    def __init__(self, nutr, price):
+        self.nutr = nutr
+        self.price = price
+        self.costs = {}
+        for key in set(nutr) | set(price):
+            row = ds.lookup_row(key, nutr.get(key), price.get(key))
+            self.costs[key] = (row[2], row[3])
+
+    @classmethod
+    def load(cls, nutr_path=ds.NUTR, price_path=ds.PRICE):
+        return cls(ds.load(nutr_path), ds.load(price_path))
+
+
+class Daemon:
+    """The warm state and the RPC methods. Thread-safe: state is replaced, never mutated."""
+
+    def __init__(self, db_path=DB, nutr_path=ds.NUTR, price_path=ds.PRICE):
+        self.db_path = Path(db_path)
+        self.nutr_path = nutr_path
+        self.price_path = price_path
+        self.lock = threading.Lock()
+        self.catalog = Catalog.load(self.db_path)
+        self.lookups = Lookups.load(nutr_path, price_path)
+        self.started = time.time()
+        self.calls = 0
+
+    def current_catalog(self):
+        """The catalog snapshot, re-read first if the file changed on disk."""
+        catalog = self.catalog
+        if file_stamp(self.db_path) != catalog.stamp:
+            with self.lock:
+                if file_stamp(self.db_path) != self.catalog.stamp:
+                    self.catalog = Catalog.load(self.db_path)
+                catalog = self.catalog
+        return catalog
+
+    def dispatch(self, method, params):
+        if method not in METHODS:
+            raise ValueError(f'unknown method {method!r}; expected one of {list(METHODS)}')
+        if not isinstance(params, dict):
+            raise ValueError('params must be an object')
+        self.calls += 1
+        return getattr(self, method)(**params)
+
+    def status(self):
+        catalog = self.current_catalog()
+        return {'recipes': len(catalog.recipes), 'source': str(catalog.path),
+                'lookups': len(self.lookups.costs), 'parser_version': ip.CONFIG.version,
+                'uptime_s': round(time.time() - self.started, 1), 'calls': self.calls}
+
+    def recompute(self, ids=None):
+        catalog, lookups, cfg = self.current_catalog(), self.lookups, ip.CONFIG
+        if ids is None:
+            ids = list(catalog.by_id)
+        out, missing = {}, []
+        for mid in map(str, ids):
+            r = catalog.by_id.get(mid)
+            if r is None:
+                missing.append(mid)
+                continue
+            calc, _ = ip.recalculate(r, lookups.nutr, lookups.price, cfg)
+            out[mid] = {'fields': calc, 'diffs': ip.changed_fields(r, calc)}
+        return {'parser_version': cfg.version, 'recipes': out, 'missing': missing}
+
+    def breakdown(self, id):
+        r = self.current_catalog().by_id.get(str(id))
+        if r is None:
+            raise KeyError(f'no recipe with idMeal {id!r}')
+        out = self._lines(r, self.lookups, ip.CONFIG)
+        out['idMeal'] = r.get('idMeal')
+        out['name'] = r.get('strMeal')
+        return out
+
+    def cost(self, recipe):
+        if not isinstance(recipe, dict):
+            raise ValueError('recipe must be an object with strIngredientN/strMeasureN fields')
+        lookups, cfg = self.lookups, ip.CONFIG
+        out = self._lines(recipe, lookups, cfg)
+        out['fields'], _ = ip.recalculate(recipe, lookups.nutr, lookups.price, cfg)
+        out['parser_version'] = cfg.version
+        return out
+
+    def reload_lookups(self):
+        with self.lock:
+            previous = ip.CONFIG.version
+            self.lookups = Lookups.load(self.nutr_path, self.price_path)
+            cfg = ip.reload_config()
+        return {'lookups': len(self.lookups.costs), 'parser_version': cfg.version,
+                'config_changed': cfg.version != previous}
+
+    @staticmethod
+    def _lines(r, lookups, cfg):
+        """recipe_breakdown.breakdown_recipe's shape, computed from the warm state."""
+        items = []
+        total_cals = 0.0
+        total_price = 0.0
+        for slot, ing, meas, key, grams, rule, kcal, price in ds.recipe_lines(r, lookups.costs, cfg):
+            per100 = lookups.nutr.get(key, {}).get('per_100g', {})
+            pinfo = lookups.price.get(key, {})
+            items.append({'ingredient': ing, 'key': key, 'measure': meas, 'grams': grams, 'rule': rule,
+                          'kcal': round(kcal, 1), 'price': round(price, 2), 'per100': per100, 'price_info': pinfo})
+            total_cals += kcal
+            total_price += price
+        return {'items': items, 'total_calories': round(total_cals), 'total_price': round(total_price)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/status'):
+            return self._send(404, {'error': 'POST {"method", "params"} to /'})
+        self._send(200, {'result': self.server.rpc.status()})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            req = json.loads(self.rfile.read(length) or b'{}')
+            result = self.server.rpc.dispatch(req.get('method'), req.get('params') or {})
+        except KeyError as e:
+            return self._send(404, {'error': e.args[0] if e.args else str(e)})
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._send(400, {'error': str(e)})
+        except Exception as e:
+            return self._send(500, {'error': f'{type(e).__name__}: {e}'})
+        self._send(200, {'result': result})
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+
+def make_server(daemon, port=PORT, verbose=False):
+    """Bind the RPC server (port 0 picks a free one); call serve_forever() on it."""
+    server = ThreadingHTTPServer((HOST, port), Handler)
+    server.daemon_threads = True
+    server.rpc = daemon
+    server.verbose = verbose
+    return server
+
+
+def call(method, port=PORT, timeout=30, **params):
+    """Client: run `method` on the daemon at `port` and return its result."""
+    body = json.dumps({'method': method, 'params': params}).encode('utf-8')
+    req = urllib.request.Request(f'http://{HOST}:{port}/', data=body,
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())['result']
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.loads(e.read()).get('error', str(e))) from None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    serve = sub.add_parser('serve', help='load the catalog and serve RPC calls')
+    serve.add_argument('--port', type=int, default=PORT)
+    serve.add_argument('--db', type=Path, default=DB)
+    serve.add_argument('--verbose', action='store_true', help='log every request')
+    client = sub.add_parser('call', help='call a method on a running daemon')
+    client.add_argument('method', choices=METHODS)
+    client.add_argument('params', nargs='?', default='{}', help='JSON object of keyword arguments')
+    client.add_argument('--port', type=int, default=PORT)
+    args = ap.parse_args(argv)
+
+    if args.cmd == 'call':
+        try:
+            result = call(args.method, args.port, **json.loads(args.params))
+        except RuntimeError as e:
+            print(f'error: {e}', file=sys.stderr)
+            return 1
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    t0 = time.perf_counter()
+    daemon = Daemon(args.db)
+    server = make_server(daemon, args.port, args.verbose)
+    print(f'Loaded {len(daemon.catalog.recipes)} recipes and {len(daemon.lookups.costs)} lookups '
+          f'in {time.perf_counter() - t0:.2f}s; listening on http://{HOST}:{server.server_address[1]}/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
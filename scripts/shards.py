@@ -0,0 +1,342 @@
+"""Sharded catalog: N shard files, a pruning manifest and a scatter-gather executor.
+
+Usage:
+    python shards.py split [--shards 8] [--by hash|category] [--db ../database.json]
+    python shards.py query [--c Pork] [--i pork --i garlic] [--q adobo] [--max-price 80] [--limit 20]
+    python shards.py run recompute report export [--workers N]
+
+`split` partitions the recipes by crc32(idMeal) % N (even shards; a lookup by
+id reads one shard) or by category (whole categories bin-packed onto the
+lightest shard, so a category filter reads one shard). Every shard-XXX.json
+has database.json's shape. manifest.json keeps per shard its recipe count,
+category counts, per-serving price/calorie ranges and a bloom filter over the
+canonical ingredient keys (sized for a 1% false-positive rate).
+
+`query` drops every shard that cannot match -- category absent, an ingredient
+key not in the bloom filter, price/calorie range outside the bound -- then
+scans the rest in a process pool and merges the hits by price. `run` applies
+pipeline stages to every shard in parallel: recompute writes
+shard-XXX.updated.json, report gathers each shard's top deltas into one
+report_changes.json, and export pre-renders each shard's API responses into
+static/shard-XXX/ (export_static.py's layout, one manifest per shard).
+"""
+import argparse
+import base64
+import hashlib
+import math
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import catalog_context
+import coverage_index as ci
+import export_static
+import generate_report
+import ingredient_parser as ip
+import similar_index
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+DIR = ROOT.parent / 'shards'
+
+MANIFEST_VERSION = 1
+DEFAULT_SHARDS = 8
+FALSE_POSITIVE = 0.01
+REPORT_TOP = 50
+STAGES = ('recompute', 'report', 'export')
+
+
+class BloomFilter:
+    """Bit array with k positions per key from two hashes (Kirsch-Mitzenmacher)."""
+
+    def __init__(self, bits, hashes, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n, fp=FALSE_POSITIVE):
+        n = max(n, 1)
+        bits = max(64, math.ceil(-n * math.log(fp) / math.log(2) ** 2))
+        return cls(bits, max(1, round(bits / n * math.log(2))))
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.data[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key):
+        return all(self.data[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def to_json(self):
+        return {'bits': self.bits, 'hashes': self.hashes, 'data': base64.b64encode(bytes(self.data)).decode('ascii')}
+
+    @classmethod
+    def from_json(cls, obj):
+        return cls(obj['bits'], obj['hashes'], base64.b64decode(obj['data']))
+
+
+def shard_name(i):
+    return f'shard-{i:03d}.json'
+
+
+def hash_shard(mid, n):
+    return zlib.crc32(str(mid).encode('utf-8')) % n
+
+
+def partition(recipes, n, by='hash'):
+    """[[recipe]] * n. By category, the largest categories are placed first,
+    each onto the shard with the fewest recipes so far."""
+    parts = [[] for _ in range(n)]
+    if by == 'hash':
+        for r in recipes:
+            parts[hash_shard(r.get('idMeal'), n)].append(r)
+        return parts
+    by_cat = {}
+    for r in recipes:
+        by_cat.setdefault(r.get('strCategory') or '', []).append(r)
+    for _cat, rs in sorted(by_cat.items(), key=lambda kv: (-len(kv[1]), kv[0])):
+        min(parts, key=len).extend(rs)
+    return parts
+
+
+def recipe_keys(r, spellings):
+    keys = set()
+    for ing in ci.recipe_spellings(r):
+        key = spellings.get(ing)
+        if key is None:
+            key = spellings[ing] = ip.canonicalize_ingredient(ing)
+        keys.add(key)
+    return keys
+
+
+def per_serving(r):
+    """(price, calories) per serving, as /api/recipes/:id/similar sees them."""
+    cal, _protein, _carbs, _fat, pps = similar_index.recipe_numbers(r)
+    return pps, cal
+
+
+def span(values):
+    return [round(min(values), 2), round(max(values), 2)] if values else None
+
+
+def shard_stats(name, recipes, spellings):
+    keys, categories, prices, calories = set(), {}, [], []
+    for r in recipes:
+        keys |= recipe_keys(r, spellings)
+        cat = r.get('strCategory') or ''
+        categories[cat] = categories.get(cat, 0) + 1
+        price, cal = per_serving(r)
+        prices.append(price)
+        calories.append(cal)
+    bloom = BloomFilter.for_capacity(len(keys))
+    for key in keys:
+        bloom.add(key)
+    return {'file': name, 'recipes': len(recipes), 'categories': dict(sorted(categories.items())),
+            'price_per_serving': span(prices), 'calories_per_serving': span(calories),
+            'ingredient_keys': len(keys), 'bloom': bloom.to_json()}
+
+
+def split(db_path=DB, out=DIR, n=DEFAULT_SHARDS, by='hash', ctx=None):
+    """Write n shard files and manifest.json under `out`; returns the manifest."""
+    if n < 1:
+        raise ValueError(f'--shards must be at least 1, got {n}')
+    ctx = ctx or catalog_context.Context()
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    db = ctx.json(db_path)
+    indent = catalog_context.detect_indent(db_path)
+    rest = {k: v for k, v in db.items() if k != 'recipes'}
+    spellings = {}
+    shards = []
+    for i, part in enumerate(partition(db.get('recipes', []), n, by)):
+        name = shard_name(i)
+        catalog_context.write_json(out / name, {**rest, 'recipes': part}, indent)
+        shards.append(shard_stats(name, part, spellings))
+    keep = {s['file'] for s in shards}
+    for path in out.glob('shard-*.json'):
+        if path.name not in keep and not path.name.endswith('.updated.json'):
+            path.unlink()
+    manifest = {'version': MANIFEST_VERSION, 'source': Path(db_path).name, 'by': by,
+                'shards': shards}
+    catalog_context.write_json(out / 'manifest.json', manifest, 2)
+    return manifest
+
+
+def load_manifest(out=DIR):
+    manifest = ip.load_json(Path(out) / 'manifest.json')
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f'{out}/manifest.json is version {manifest.get("version")}; run `shards.py split` again')
+    return manifest
+
+
+def make_spec(category=None, ingredients=(), q=None, max_price=None, max_calories=None):
+    """A query; ingredient names are canonicalized here, once, instead of per shard."""
+    return {'category': category, 'keys': sorted({ip.canonicalize_ingredient(i) for i in ingredients}),
+            'q': (q or '').lower() or None, 'max_price': max_price, 'max_calories': max_calories}
+
+
+def may_match(shard, spec):
+    """False when the manifest proves the shard holds no match (bloom hits can be false positives)."""
+    if not shard['recipes']:
+        return False
+    if spec['category'] is not None and spec['category'] not in shard['categories']:
+        return False
+    if spec['max_price'] is not None and shard['price_per_serving'][0] > spec['max_price']:
+        return False
+    if spec['max_calories'] is not None and shard['calories_per_serving'][0] > spec['max_calories']:
+        return False
+    if spec['keys']:
+        bloom = BloomFilter.from_json(shard['bloom'])
+        if not all(k in bloom for k in spec['keys']):
+            return False
+    return True
+
+
+def matches(r, spec, spellings):
+    if spec['category'] is not None and (r.get('strCategory') or '') != spec['category']:
+        return False
+    if spec['q'] and spec['q'] not in (r.get('strMeal') or '').lower():
+        return False
+    price, cal = per_serving(r)
+    if spec['max_price'] is not None and price > spec['max_price']:
+        return False
+    if spec['max_calories'] is not None and cal > spec['max_calories']:
+        return False
+    return not spec['keys'] or set(spec['keys']) <= recipe_keys(r, spellings)
+
+
+def scan_shard(path, spec):
+    """Hits of one shard as list items (runs in a worker process)."""
+    db = ip.load_json(path)
+    spellings = {}
+    hits = []
+    for r in db.get('recipes', []):
+        if matches(r, spec, spellings):
+            price, cal = per_serving(r)
+            hits.append({'idMeal': r.get('idMeal'), 'strMeal': r.get('strMeal'), 'strCategory': r.get('strCategory'),
+                         'price_per_serving': round(price, 2), 'calories_per_serving': round(cal, 2)})
+    return hits
+
+
+def scatter(fn, jobs, workers=None):
+    """[fn(*job)] over a process pool; one job (or workers=1) runs inline."""
+    if len(jobs) <= 1 or workers == 1:
+        return [fn(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+        return list(pool.map(fn, *zip(*jobs)))
+
+
+def query(spec, out=DIR, limit=None, workers=None):
+    """{'meals', 'total', 'scanned', 'pruned'}: matches from every shard that may
+    hold one, cheapest per serving first."""
+    manifest = load_manifest(out)
+    live = [s for s in manifest['shards'] if may_match(s, spec)]
+    hits = [h for part in scatter(scan_shard, [(Path(out) / s['file'], spec) for s in live], workers) for h in part]
+    hits.sort(key=lambda h: (h['price_per_serving'], str(h['idMeal'])))
+    return {'meals': hits[:limit] if limit else hits, 'total': len(hits),
+            'scanned': len(live), 'pruned': len(manifest['shards']) - len(live)}
+
+
+def updated_name(name):
+    return name[:-len('.json')] + '.updated.json'
+
+
+_LOOKUPS = {}
+
+
+def recompute_shard(path):
+    """Recalculate one shard into shard-XXX.updated.json; (recipes, updated).
+    Lookups are parsed once per worker process."""
+    if not _LOOKUPS:
+        _LOOKUPS['nutr'] = ip.load_json(ip.NUTR_PATH)
+        _LOOKUPS['price'] = ip.load_json(ip.PRICE_PATH)
+    db = ip.load_json(path)
+    recipes = db.get('recipes', [])
+    updated = sum(bool(ip.apply_recalculation(r, _LOOKUPS['nutr'], _LOOKUPS['price'])) for r in recipes)
+    catalog_context.write_json(Path(path).with_name(updated_name(Path(path).name)), db,
+                               catalog_context.detect_indent(path))
+    return len(recipes), updated
+
+
+def report_shard(path, top=REPORT_TOP):
+    """(row count, the shard's `top` largest calorie deltas); a global top-k is in the union of these."""
+    path = Path(path)
+    rows = generate_report.compute_changes(ip.load_json(path), ip.load_json(path.with_name(updated_name(path.name))))
+    return len(rows), rows[:top]
+
+
+def export_shard(path, out):
+    s = export_static.export(path, out)['stats']
+    return s['routes'], s['payloads']
+
+
+def run(stages, out=DIR, workers=None):
+    """Run `stages` over every shard, each stage in parallel across shards."""
+    out = Path(out)
+    files = [out / s['file'] for s in load_manifest(out)['shards']]
+    for stage in stages:
+        if stage == 'recompute':
+            results = scatter(recompute_shard, [(p,) for p in files], workers)
+            print(f'recompute: {sum(u for _, u in results)} of {sum(n for n, _ in results)} recipes updated '
+                  f'across {len(files)} shards')
+        elif stage == 'report':
+            results = scatter(report_shard, [(p,) for p in files], workers)
+            rows = sorted((row for _, part in results for row in part), key=lambda x: abs(x['cal_delta']), reverse=True)
+            report = {'summary_count': sum(n for n, _ in results), 'top': rows[:REPORT_TOP]}
+            catalog_context.write_json(out / 'report_changes.json', report, 2)
+            print(f"report: {report['summary_count']} rows; wrote {out / 'report_changes.json'}")
+        elif stage == 'export':
+            results = scatter(export_shard, [(p, out / 'static' / p.stem) for p in files], workers)
+            print(f'export: {sum(r for r, _ in results)} routes, {sum(p for _, p in results)} payloads '
+                  f"under {out / 'static'}")
+        else:
+            raise ValueError(f"unknown stage {stage!r}; expected any of {', '.join(STAGES)}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Split the catalog into shards and query/process them in parallel')
+    ap.add_argument('--dir', type=Path, default=DIR)
+    ap.add_argument('--workers', type=int, default=None)
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    sp = sub.add_parser('split')
+    sp.add_argument('--db', type=Path, default=DB)
+    sp.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    sp.add_argument('--by', choices=('hash', 'category'), default='hash')
+    qp = sub.add_parser('query')
+    qp.add_argument('--c', dest='category')
+    qp.add_argument('--i', dest='ingredients', action='append', default=[])
+    qp.add_argument('--q')
+    qp.add_argument('--max-price', type=float)
+    qp.add_argument('--max-calories', type=float)
+    qp.add_argument('--limit', type=int, default=20)
+    rp = sub.add_parser('run')
+    rp.add_argument('stages', nargs='+', choices=STAGES)
+    args = ap.parse_args(argv)
+
+    if args.cmd == 'split':
+        try:
+            manifest = split(args.db, args.dir, args.shards, args.by)
+        except ValueError as e:
+            ap.error(str(e))
+        sizes = [s['recipes'] for s in manifest['shards']]
+        print(f"{sum(sizes)} recipes -> {len(sizes)} shards by {args.by} (sizes {min(sizes)}-{max(sizes)}); "
+              f"wrote {args.dir / 'manifest.json'}")
+    elif args.cmd == 'query':
+        spec = make_spec(args.category, args.ingredients, args.q, args.max_price, args.max_calories)
+        result = query(spec, args.dir, args.limit, args.workers)
+        for m in result['meals']:
+            print(f"{m['idMeal']:>8}  P{m['price_per_serving']:>7.2f}  {m['calories_per_serving']:>6.0f} kcal  "
+                  f"{m['strMeal']} ({m['strCategory']})")
+        print(f"{result['total']} matches; scanned {result['scanned']} shards, pruned {result['pruned']}")
+    else:
+        run(args.stages, args.dir, args.workers)
+
+
+if __name__ == '__main__':
+    main()
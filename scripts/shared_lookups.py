@@ -0,0 +1,232 @@
+"""Nutrition/price lookups as one shared-memory block for process-pool workers.
+
+Usage: python shared_lookups.py   (prints the layout and size of the current lookups)
+
+Every canonical key gets an interned integer id; per-100g calories, protein,
+carbs, fat and price per kg / per liter are float64 columns indexed by id
+(NaN where the lookup has no value) and the nutrition/price source strings
+are int32 ids into a string table (-1: the key has no entry). The parent
+publishes the block once; workers attach by name and read the columns
+through memoryviews over the same pages instead of unpickling two dicts of
+dicts each.
+
+    tables = LookupTables.from_dicts(nutr, price)
+    shm = tables.publish()                  # parent; unlink when the pool is done
+    view = LookupTables.attach(shm.name)    # worker
+    ip.compute_totals(recipe, view.nutrition, view.prices)
+
+`nutrition` and `prices` are read-only mappings shaped like the JSON files
+(`{'per_100g': {...}, 'source': ...}` / `{'price_php_per_kg': ..., 'source': ...}`),
+so code written against the dicts runs unchanged.
+"""
+import json
+import math
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+NUTR = ROOT / 'nutrition_lookup.json'
+PRICE = ROOT / 'price_lookup.json'
+
+MAGIC = b'RLOOKUP1'
+PREFIX = struct.Struct('<8sI')  # magic, header length
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+PRICES = ('price_php_per_kg', 'price_php_per_liter')
+COLUMNS = NUTRIENTS + PRICES
+
+
+def _align(n, to=8):
+    return (n + to - 1) // to * to
+
+
+def _attach_block(name):
+    try:
+        # 3.13+: attaching must not register the segment with this process's tracker
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class LookupTables:
+    """Columnar lookups. Built from the JSON dicts, or attached to a published block."""
+
+    def __init__(self, keys, sources, values, nutr_source, price_source, shm=None):
+        self.keys = keys
+        self.ids = {k: i for i, k in enumerate(keys)}
+        self.sources = sources
+        self.values = values            # float64, column-major: values[c * n + id]
+        self.nutr_source = nutr_source  # int32 per id, -1 = no nutrition entry
+        self.price_source = price_source
+        self.shm = shm
+        self.nutrition = NutritionView(self)
+        self.prices = PriceView(self)
+
+    @classmethod
+    def from_dicts(cls, nutr, price):
+        keys = sorted(set(nutr) | set(price))
+        n = len(keys)
+        sources, source_ids = [], {}
+
+        def source_id(entry):
+            s = entry.get('source')
+            if s not in source_ids:
+                source_ids[s] = len(sources)
+                sources.append(s)
+            return source_ids[s]
+
+        values = [math.nan] * (len(COLUMNS) * n)
+        nutr_source, price_source = [-1] * n, [-1] * n
+        for i, key in enumerate(keys):
+            if key in nutr:
+                per100 = nutr[key].get('per_100g', {})
+                for c, field in enumerate(NUTRIENTS):
+                    if field in per100:
+                        values[c * n + i] = float(per100[field])
+                nutr_source[i] = source_id(nutr[key])
+            if key in price:
+                for c, field in enumerate(PRICES, start=len(NUTRIENTS)):
+                    if field in price[key]:
+                        values[c * n + i] = float(price[key][field])
+                price_source[i] = source_id(price[key])
+        return cls(keys, sources, values, nutr_source, price_source)
+
+    @classmethod
+    def load(cls, nutr_path=NUTR, price_path=PRICE):
+        with open(nutr_path, 'r', encoding='utf-8') as f:
+            nutr = json.load(f)
+        with open(price_path, 'r', encoding='utf-8') as f:
+            price = json.load(f)
+        return cls.from_dicts(nutr, price)
+
+    def layout(self):
+        """(header bytes, offset of the float64 block, offset of the int32 block, total size)."""
+        header = json.dumps({'keys': self.keys, 'sources': self.sources, 'columns': COLUMNS},
+                            ensure_ascii=False).encode('utf-8')
+        values_at = _align(PREFIX.size + len(header))
+        ints_at = values_at + 8 * len(self.values)
+        return header, values_at, ints_at, ints_at + 4 * 2 * len(self.keys)
+
+    def publish(self, name=None):
+        """Copy the tables into a new shared-memory block. The caller owns it:
+        close() and unlink() it once every worker is done."""
+        header, values_at, ints_at, size = self.layout()
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        PREFIX.pack_into(shm.buf, 0, MAGIC, len(header))
+        shm.buf[PREFIX.size:PREFIX.size + len(header)] = header
+        shm.buf[values_at:ints_at] = array('d', self.values).tobytes()
+        shm.buf[ints_at:size] = array('i', [*self.nutr_source, *self.price_source]).tobytes()
+        return shm
+
+    @classmethod
+    def attach(cls, name):
+        """Zero-copy view of a published block; only the key/source header is decoded."""
+        shm = _attach_block(name)
+        magic, header_len = PREFIX.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            shm.close()
+            raise ValueError(f'shared memory block {name!r} is not a lookup table')
+        header = json.loads(bytes(shm.buf[PREFIX.size:PREFIX.size + header_len]).decode('utf-8'))
+        if tuple(header['columns']) != COLUMNS:
+            shm.close()
+            raise ValueError(f'lookup table columns {header["columns"]} != {list(COLUMNS)}')
+        keys = [sys.intern(str(k)) for k in header['keys']]
+        n = len(keys)
+        values_at = _align(PREFIX.size + header_len)
+        ints_at = values_at + 8 * len(COLUMNS) * n
+        values = shm.buf[values_at:ints_at].cast('d')
+        nutr_source = shm.buf[ints_at:ints_at + 4 * n].cast('i')
+        price_source = shm.buf[ints_at + 4 * n:ints_at + 8 * n].cast('i')
+        return cls(keys, header['sources'], values, nutr_source, price_source, shm=shm)
+
+    def close(self):
+        """Release the memoryviews and detach (does not unlink)."""
+        if self.shm is None:
+            return
+        for view in (self.values, self.nutr_source, self.price_source):
+            view.release()
+        self.shm.close()
+        self.shm = None
+
+    def value(self, key_id, column):
+        x = self.values[COLUMNS.index(column) * len(self.keys) + key_id]
+        return None if math.isnan(x) else x
+
+
+class _View(Mapping):
+    """Read-only dict-of-dicts facade over one side of the tables."""
+    fields = ()
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def _source_ids(self):
+        raise NotImplementedError
+
+    def _id(self, key):
+        key_id = self.tables.ids.get(key)
+        if key_id is None or self._source_ids()[key_id] < 0:
+            raise KeyError(key)
+        return key_id
+
+    def __contains__(self, key):
+        key_id = self.tables.ids.get(key)
+        return key_id is not None and self._source_ids()[key_id] >= 0
+
+    def __iter__(self):
+        ids = self._source_ids()
+        return (k for i, k in enumerate(self.tables.keys) if ids[i] >= 0)
+
+    def __len__(self):
+        return sum(1 for i in self._source_ids() if i >= 0)
+
+    def _entry(self, key_id, values):
+        source = self.tables.sources[self._source_ids()[key_id]]
+        if source is not None:
+            values['source'] = source
+        return values
+
+    def _fields(self, key_id):
+        out = {}
+        for field in self.fields:
+            x = self.tables.value(key_id, field)
+            if x is not None:
+                out[field] = x
+        return out
+
+
+class NutritionView(_View):
+    fields = NUTRIENTS
+
+    def _source_ids(self):
+        return self.tables.nutr_source
+
+    def __getitem__(self, key):
+        key_id = self._id(key)
+        return self._entry(key_id, {'per_100g': self._fields(key_id)})
+
+
+class PriceView(_View):
+    fields = PRICES
+
+    def _source_ids(self):
+        return self.tables.price_source
+
+    def __getitem__(self, key):
+        key_id = self._id(key)
+        return self._entry(key_id, self._fields(key_id))
+
+
+def main():
+    tables = LookupTables.load()
+    _, values_at, ints_at, size = tables.layout()
+    print(f"{len(tables.keys)} keys ({len(tables.nutrition)} nutrition, {len(tables.prices)} price), "
+          f"{len(tables.sources)} sources, {len(COLUMNS)} columns")
+    print(f"block: {size} bytes (header {values_at}, float64 {ints_at - values_at}, int32 {size - ints_at})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Shopping lists: sum grams per canonical key over a meal plan, round up to
+purchasable packs and price the basket once.
+
+Usage: python shopping_list.py 1 5:2 12:0.5 [--db ../database.json]
+(recipe id, optionally :multiplier of the recipe as written)
+
+Per-recipe grams come from the derived store and are kept as sparse vectors
+(CSR-style: each recipe's key columns and grams in two flat arrays), since a
+recipe touches a dozen of the catalog's keys; a batch of plans scatters the
+multiplied vectors into one (plans x keys) array with np.bincount. Keys in
+pack_sizes.json are bought in whole packs (a shared bottle of soy sauce is
+paid for once); everything else is bought loose in LOOSE_STEP_G steps at the
+price_lookup.json rate. Requires numpy.
+"""
+import argparse
+from pathlib import Path
+import numpy as np
+import derived_store as ds
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+PACKS = ROOT / 'pack_sizes.json'
+
+LOOSE_STEP_G = 50
+EPS = 1e-6  # grams that are a float hair above a pack boundary don't buy another pack
+
+
+class ShoppingEngine:
+    """Sparse per-recipe gram vectors plus per-key purchase step and step price."""
+
+    def __init__(self, conn, source, packs):
+        self.ids = [row['id_meal'] for row in conn.execute(
+            'SELECT id_meal FROM recipes WHERE source = ? ORDER BY position', (source,))]
+        self.row = {mid: i for i, mid in enumerate(self.ids)}
+        rows = conn.execute("""
+            SELECT l.id_meal, l.key, SUM(l.grams) AS grams FROM ingredient_lines l
+            WHERE l.source = ? AND l.key IS NOT NULL AND l.grams > 0
+            GROUP BY l.id_meal, l.key""", (source,)).fetchall()
+        self.keys = sorted({row['key'] for row in rows})
+        col = {k: j for j, k in enumerate(self.keys)}
+        lines = [[] for _ in self.ids]
+        for row in rows:
+            if row['id_meal'] in self.row:
+                lines[self.row[row['id_meal']]].append((col[row['key']], row['grams']))
+        # recipe i's entries are indices/values[indptr[i]:indptr[i + 1]]
+        self.indptr = np.cumsum([0] + [len(entries) for entries in lines])
+        self.indices = np.array([j for entries in lines for j, _ in entries], dtype=np.int64)
+        self.values = np.array([g for entries in lines for _, g in entries], dtype=np.float64)
+
+        price_per_g = {row['key']: row['price_per_g'] for row in conn.execute(
+            'SELECT key, price_per_g FROM lookups WHERE price_per_g IS NOT NULL')}
+        self.units = []
+        self.step = np.full(len(self.keys), LOOSE_STEP_G, dtype=np.float64)
+        self.step_price = np.zeros(len(self.keys), dtype=np.float64)
+        self.priced = np.zeros(len(self.keys), dtype=bool)
+        for j, key in enumerate(self.keys):
+            pack = packs.get(key)
+            ppg = price_per_g.get(key)
+            if pack:
+                self.units.append(pack['unit'])
+                self.step[j] = pack['grams']
+                if 'price_php' in pack:
+                    self.step_price[j] = pack['price_php']
+                    self.priced[j] = True
+                    continue
+            else:
+                self.units.append('g')
+            if ppg is not None:
+                self.step_price[j] = self.step[j] * ppg
+                self.priced[j] = True
+
+    def plan_grams(self, plans):
+        """(plans x keys) grams for [[(idMeal, multiplier), ...], ...]."""
+        plan_of, recipe, mults = [], [], []
+        for p, plan in enumerate(plans):
+            for mid, mult in plan:
+                i = self.row.get(str(mid))
+                if i is None:
+                    raise ValueError(f'unknown recipe id {mid!r}')
+                plan_of.append(p)
+                recipe.append(i)
+                mults.append(mult)
+        recipe = np.array(recipe, dtype=np.int64)
+        lens = self.indptr[recipe + 1] - self.indptr[recipe]
+        # positions of every (plan entry, recipe key) pair in indices/values
+        pos = np.repeat(self.indptr[recipe] - np.cumsum(lens) + lens, lens) + np.arange(lens.sum())
+        cell = np.repeat(np.array(plan_of, dtype=np.int64), lens) * len(self.keys) + self.indices[pos]
+        weights = self.values[pos] * np.repeat(np.array(mults, dtype=np.float64), lens)
+        size = len(plans) * len(self.keys)
+        return np.bincount(cell, weights, minlength=size)[:size].reshape(len(plans), len(self.keys))
+
+    def totals(self, plans):
+        """(grams, packs, cost) arrays for a batch of plans: (P x K), (P x K), (P,)."""
+        grams = self.plan_grams(plans)
+        packs = np.ceil(grams / self.step - EPS)
+        np.maximum(packs, 0, out=packs)
+        return grams, packs, packs @ self.step_price
+
+    def basket(self, plan):
+        """Itemized shopping list for one plan."""
+        grams, packs, cost = self.totals([plan])
+        items = []
+        for j in np.flatnonzero(grams[0] > 0):
+            items.append({'key': self.keys[j], 'grams': round(float(grams[0, j]), 1),
+                          'unit': self.units[j], 'quantity': int(packs[0, j]),
+                          'unit_grams': float(self.step[j]),
+                          'price': round(float(packs[0, j] * self.step_price[j]), 2) if self.priced[j] else None})
+        return {'items': items, 'total': round(float(cost[0]), 2),
+                'unpriced': [i['key'] for i in items if i['price'] is None]}
+
+
+def load_engine(db_path=DB, packs_path=PACKS):
+    conn = ds.open_store()
+    ds.refresh(conn, [db_path])
+    return ShoppingEngine(conn, Path(db_path).name, ds.load(packs_path))
+
+
+def parse_plan(args):
+    plan = []
+    for a in args:
+        mid, _, mult = a.partition(':')
+        plan.append((mid, float(mult) if mult else 1.0))
+    return plan
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Aggregate recipes into a pack-rounded, priced shopping list')
+    ap.add_argument('recipes', nargs='+', help='idMeal or idMeal:multiplier')
+    ap.add_argument('--db', default=str(DB))
+    args = ap.parse_args()
+    engine = load_engine(args.db)
+    try:
+        basket = engine.basket(parse_plan(args.recipes))
+    except ValueError as e:
+        ap.error(str(e))
+    for item in basket['items']:
+        qty = f"{item['quantity']} x {item['unit']}" if item['unit'] != 'g' else f"{int(item['quantity'] * item['unit_grams'])} g"
+        price = f"{item['price']:.2f}" if item['price'] is not None else 'n/a'
+        print(f"{item['key']:<28} {item['grams']:>9.1f} g -> {qty:<14} PHP {price}")
+    print(f"Total: PHP {basket['total']:.2f}" + (f" ({len(basket['unpriced'])} unpriced keys)" if basket['unpriced'] else ''))
+
+
+if __name__ == '__main__':
+    main()
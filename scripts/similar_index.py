@@ -0,0 +1,259 @@
+"""Similar-recipe index: top-N neighbors per recipe from ingredient TF-IDF plus
+per-serving macros and price.
+
+Usage: python similar_index.py [--db ../database.json] [--full]
+
+similar_index.json keeps the build state (idf, macro scales, per-recipe
+features and scored neighbor lists) so a later run only touches recipes that
+changed and the lists they appear in. ../similar_recipes.json is the compact
+id -> [neighbor ids] table the API serves.
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import math
+from collections import defaultdict
+from pathlib import Path
+import coverage_index as ci
+import ingredient_parser as ip
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+STATE = ROOT / 'similar_index.json'
+TABLE = ROOT.parent / 'similar_recipes.json'
+
+STATE_VERSION = 1
+TOP_N = 10
+NUMERIC_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'price_per_serving')
+ING_WEIGHT = 0.7
+NUM_WEIGHT = 0.3
+STOP_DF = 0.2     # keys in more than 20% of recipes (garlic, onion, salt) don't generate candidates
+DRIFT = 0.25      # rebuild idf/scales from scratch once the catalog grew or shrank this much
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def recipe_numbers(r):
+    """Per-serving calories/protein/carbs/fat and price, so batch size doesn't dominate."""
+    n = ip.recipe_servings(r)
+    out = [float(r.get(f) or 0) / n for f in NUMERIC_FIELDS[:4]]
+    pps = r.get('price_per_serving')
+    if pps is None:
+        pps = float(r.get('price_planned') or 0) / n
+    out.append(float(pps))
+    return out
+
+
+def recipe_features(r, spellings):
+    keys = set()
+    for ing in ci.recipe_spellings(r):
+        key = spellings.get(ing)
+        if key is None:
+            key = spellings[ing] = ip.canonicalize_ingredient(ing)
+        keys.add(key)
+    keys = sorted(keys)
+    numbers = [round(x, 3) for x in recipe_numbers(r)]
+    fingerprint = hashlib.sha1(json.dumps([keys, numbers]).encode('utf-8')).hexdigest()
+    return {'fingerprint': fingerprint, 'keys': keys, 'numbers': numbers}
+
+
+def new_state():
+    return {'version': STATE_VERSION, 'map_fingerprint': ci.map_fingerprint(), 'built_for': 0,
+            'idf': {}, 'default_idf': 1.0, 'scales': [1.0] * len(NUMERIC_FIELDS),
+            'recipes': {}, 'neighbors': {}}
+
+
+def fit(state):
+    """Derive idf and macro scales from the current recipe features."""
+    recipes = state['recipes']
+    n = len(recipes)
+    df = defaultdict(int)
+    for rec in recipes.values():
+        for key in rec['keys']:
+            df[key] += 1
+    state['idf'] = {k: math.log((n + 1) / (c + 1)) + 1 for k, c in df.items()}
+    state['default_idf'] = math.log(n + 1) + 1
+    scales = []
+    for i in range(len(NUMERIC_FIELDS)):
+        values = [rec['numbers'][i] for rec in recipes.values()]
+        mean = sum(values) / len(values) if values else 0.0
+        var = sum((v - mean) ** 2 for v in values) / len(values) if values else 0.0
+        scales.append(math.sqrt(var) or 1.0)
+    state['scales'] = scales
+    state['built_for'] = n
+
+
+def rank(entry):
+    """Neighbor order: best score first, ties broken by id."""
+    return -entry[1], entry[0]
+
+
+class Model:
+    """In-memory view of the state: weighted ingredient vectors and an inverted index."""
+
+    def __init__(self, state):
+        self.state = state
+        self.idf = state['idf']
+        self.default_idf = state['default_idf']
+        self.scales = state['scales']
+        self.vectors = {}
+        self.postings = defaultdict(set)
+        for mid, rec in state['recipes'].items():
+            self.add(mid, rec)
+
+    def weights(self, keys):
+        w = {k: self.idf.get(k, self.default_idf) for k in keys}
+        norm = math.sqrt(sum(x * x for x in w.values())) or 1.0
+        return {k: x / norm for k, x in w.items()}
+
+    def add(self, mid, rec):
+        self.vectors[mid] = (self.weights(rec['keys']), rec['numbers'])
+        for key in rec['keys']:
+            self.postings[key].add(mid)
+
+    def remove(self, mid):
+        vec, _ = self.vectors.pop(mid, ({}, None))
+        for key in vec:
+            self.postings[key].discard(mid)
+
+    def numeric_similarity(self, a, b):
+        d2 = sum(((x - y) / s) ** 2 for x, y, s in zip(a, b, self.scales))
+        return 1.0 / (1.0 + math.sqrt(d2))
+
+    def candidates(self, mid):
+        """Dot products against recipes sharing a rare key; common keys are only
+        used when the rare ones don't yield enough candidates."""
+        vec, _ = self.vectors[mid]
+        limit = STOP_DF * len(self.vectors)
+        dots = defaultdict(float)
+        common = []
+        for key, w in vec.items():
+            posting = self.postings[key]
+            if len(posting) > limit:
+                common.append((key, w))
+                continue
+            for other in posting:
+                dots[other] += w * self.vectors[other][0][key]
+        dots.pop(mid, None)
+        if len(dots) < TOP_N and common:
+            for key, w in common:
+                for other in self.postings[key]:
+                    dots[other] += w * self.vectors[other][0][key]
+            dots.pop(mid, None)
+        return dots
+
+    def score(self, mid, other, dot):
+        return ING_WEIGHT * dot + NUM_WEIGHT * self.numeric_similarity(self.vectors[mid][1], self.vectors[other][1])
+
+    def top(self, mid):
+        scored = ([o, round(self.score(mid, o, d), 4)] for o, d in self.candidates(mid).items())
+        return heapq.nsmallest(TOP_N, scored, key=rank)
+
+
+def build(state, recipes, spellings):
+    state.update(new_state())
+    state['recipes'] = {r.get('idMeal'): recipe_features(r, spellings) for r in recipes}
+    fit(state)
+    model = Model(state)
+    state['neighbors'] = {mid: model.top(mid) for mid in state['recipes']}
+    return {'full': True, 'added': len(state['recipes']), 'changed': 0, 'removed': 0, 'recomputed': len(state['recipes'])}
+
+
+def offer(state, mid, other, score):
+    """Insert `other` into mid's list if it beats the current last entry."""
+    lst = state['neighbors'].setdefault(mid, [])
+    entry = [other, score]
+    if len(lst) >= TOP_N and rank(entry) >= rank(lst[-1]):
+        return
+    lst[:] = [e for e in lst if e[0] != other]
+    lst.append(entry)
+    lst.sort(key=rank)
+    del lst[TOP_N:]
+
+
+def update(state, recipes, spellings):
+    """Apply catalog changes to an existing state. Lists that lost a neighbor
+    are recomputed; every other list only considers the new/changed recipes."""
+    current = {r.get('idMeal'): recipe_features(r, spellings) for r in recipes}
+    old = state['recipes']
+    removed = [m for m in old if m not in current]
+    changed = [m for m, f in current.items() if m in old and old[m]['fingerprint'] != f['fingerprint']]
+    added = [m for m in current if m not in old]
+    stats = {'full': False, 'added': len(added), 'changed': len(changed), 'removed': len(removed), 'recomputed': 0}
+    if not (removed or changed or added):
+        return stats
+
+    model = Model(state)
+    gone = set(removed) | set(changed)
+    for mid in gone:
+        model.remove(mid)
+        old.pop(mid, None)
+        state['neighbors'].pop(mid, None)
+    dirty = {m for m, lst in state['neighbors'].items() if any(o in gone for o, _ in lst)}
+    fresh = changed + added
+    for mid in fresh:
+        old[mid] = current[mid]
+        model.add(mid, current[mid])
+    for mid in fresh:
+        state['neighbors'][mid] = model.top(mid)
+        for other, dot in model.candidates(mid).items():
+            if other not in dirty and other not in fresh:
+                offer(state, other, mid, round(model.score(other, mid, dot), 4))
+    for mid in dirty:
+        state['neighbors'][mid] = model.top(mid)
+    stats['recomputed'] = len(fresh) + len(dirty)
+    return stats
+
+
+def refresh(state, recipes, full=False):
+    spellings = {}
+    n = len(recipes)
+    stale = (full or not state['recipes'] or state.get('map_fingerprint') != ci.map_fingerprint()
+             or abs(n - state['built_for']) > DRIFT * max(state['built_for'], 1))
+    if stale:
+        return build(state, recipes, spellings)
+    return update(state, recipes, spellings)
+
+
+def neighbor_table(state):
+    return {mid: [o for o, _ in lst] for mid, lst in state['neighbors'].items()}
+
+
+def load_state(path=STATE):
+    try:
+        raw = load(path)
+    except (OSError, ValueError):
+        return new_state()
+    if raw.get('version') != STATE_VERSION:
+        return new_state()
+    return raw
+
+
+def write_json(obj, path, **kwargs):
+    tmp = Path(str(path) + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, **kwargs)
+    tmp.replace(path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Build the similar-recipe neighbor table')
+    ap.add_argument('--db', default=str(DB))
+    ap.add_argument('--full', action='store_true', help='ignore the saved state and rebuild')
+    args = ap.parse_args()
+    state = load_state()
+    stats = refresh(state, load(args.db).get('recipes', []), full=args.full)
+    write_json(state, STATE, separators=(',', ':'))
+    write_json(neighbor_table(state), TABLE, separators=(',', ':'))
+    mode = 'full build' if stats['full'] else 'incremental'
+    print(f"{len(state['recipes'])} recipes ({mode}: added {stats['added']}, changed {stats['changed']}, "
+          f"removed {stats['removed']}, recomputed {stats['recomputed']} lists)")
+    print(f'Wrote {TABLE}')
+
+
+if __name__ == '__main__':
+    main()
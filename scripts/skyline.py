@@ -0,0 +1,225 @@
+"""Layered cost-vs-nutrition skylines (Pareto frontiers) per category.
+
+Usage: python skyline.py [--db ../database.json] [--full]   (writes ../recipe_skyline.json)
+
+A view is a set of per-serving objectives, e.g. protein_per_peso = lowest
+price and most protein. A recipe is on the view's 1st frontier when no other
+recipe is at least as good on every objective and better on one; the 2nd
+frontier is the skyline of what remains, and so on. Layers are assigned with
+a sort-based pass: recipes sorted lexicographically on their (sign-adjusted)
+objectives can only be dominated by earlier ones, and the first layer without
+a dominator is found by binary search over the layers (a dominator in layer
+j+1 implies one in layer j).
+
+skyline_index.json keeps every recipe's values and layer for each view and
+category ('*' = all), so a run after a recompute only re-layers what a change
+can reach: removing or adding a point at layer k leaves layers < k as they
+are, so only the points from layer k down are sorted again. The
+../recipe_skyline.json table served by /api/skyline holds the first
+SERVED_LAYERS frontiers per view and category, each sorted by price, so a
+query is a few list slices (a max price cut is a binary search) instead of a
+scan.
+"""
+import argparse
+import bisect
+import math
+from pathlib import Path
+import catalog_context
+import ingredient_parser as ip
+import similar_index
+
+ROOT = Path(__file__).resolve().parent
+DB = ROOT.parent / 'database.json'
+STATE = ROOT / 'skyline_index.json'
+TABLE = ROOT.parent / 'recipe_skyline.json'
+
+STATE_VERSION = 1
+SERVED_LAYERS = 3
+ALL = '*'
+# per-serving values, in the order they are stored; price is always the first
+FIELDS = ('price_per_serving', 'calories_per_serving', 'protein_per_serving', 'fat_per_serving')
+VIEWS = {
+    'protein_per_peso': (('price_per_serving', 'min'), ('protein_per_serving', 'max')),
+    'low_calorie': (('price_per_serving', 'min'), ('calories_per_serving', 'min')),
+    'lean_protein': (('price_per_serving', 'min'), ('protein_per_serving', 'max'), ('fat_per_serving', 'min')),
+    'balanced': (('price_per_serving', 'min'), ('calories_per_serving', 'min'),
+                 ('protein_per_serving', 'max'), ('fat_per_serving', 'min')),
+}
+
+
+def recipe_values(r):
+    """[price, calories, protein, fat] per serving, as /api/recipes/:id/similar sees them."""
+    cal, protein, _carbs, fat, pps = similar_index.recipe_numbers(r)
+    return [round(pps, 2), round(cal, 2), round(protein, 2), round(fat, 2)]
+
+
+def objective(dims):
+    """values -> tuple where smaller is better on every coordinate."""
+    idx = [(FIELDS.index(f), -1 if d == 'max' else 1) for f, d in dims]
+    return lambda values: tuple(sign * values[j] for j, sign in idx)
+
+
+def dominates(a, b):
+    return a != b and all(x <= y for x, y in zip(a, b))
+
+
+def assign_layers(points, start=1):
+    """{id: layer} for [(id, vector)], layers numbered from `start`."""
+    layers = []
+    out = {}
+    for vec, rid in sorted((vec, rid) for rid, vec in points):
+        lo, hi = 0, len(layers)
+        while lo < hi:  # first layer with no dominator of vec
+            j = (lo + hi) // 2
+            if any(dominates(v, vec) for v in layers[j]):
+                lo = j + 1
+            else:
+                hi = j
+        if lo == len(layers):
+            layers.append([])
+        layers[lo].append(vec)
+        out[rid] = start + lo
+    return out
+
+
+def relayer(layer_of, vec_of, removed, added):
+    """Apply removed ids and added ids (vectors in vec_of) to one {id: layer}
+    map in place; returns how many points had to be layered again."""
+    k = min((layer_of[m] for m in removed if m in layer_of), default=math.inf)
+    for m in removed:
+        layer_of.pop(m, None)
+    if added:
+        prefix = {}
+        for m, layer in layer_of.items():
+            if layer < k:
+                prefix.setdefault(layer, []).append(vec_of[m])
+        for m in added:
+            vec = vec_of[m]
+            j = 1
+            while j in prefix and any(dominates(v, vec) for v in prefix[j]):
+                j += 1
+            k = min(k, j)
+    if k == math.inf:
+        return 0
+    suffix = [m for m, layer in layer_of.items() if layer >= k] + list(added)
+    layer_of.update(assign_layers([(m, vec_of[m]) for m in suffix], start=k))
+    return len(suffix)
+
+
+def new_state():
+    return {'version': STATE_VERSION, 'views': {}, 'recipes': {}, 'layers': {}}
+
+
+def view_key(dims):
+    return [list(d) for d in dims]
+
+
+def update(state, recipes, full=False):
+    """Bring the state in line with `recipes`; re-layers only what changed."""
+    current = {str(r.get('idMeal')): {'category': r.get('strCategory') or '', 'values': recipe_values(r)}
+               for r in recipes if r.get('idMeal') is not None}
+    if full or state.get('version') != STATE_VERSION:
+        state.clear()
+        state.update(new_state())
+    old = state['recipes']
+    gone = [m for m in old if m not in current or old[m] != current[m]]
+    fresh = [m for m in current if m not in old or old[m] != current[m]]
+    stats = {'added': sum(m not in old for m in fresh), 'changed': sum(m in current for m in gone),
+             'removed': sum(m not in current for m in gone), 'relayered': 0}
+
+    for name, dims in VIEWS.items():
+        key = objective(dims)
+        vec_of = {m: key(rec['values']) for m, rec in current.items()}
+        if state['views'].get(name) != view_key(dims) or name not in state['layers']:
+            state['views'][name] = view_key(dims)
+            by_cat = {ALL: list(current)}
+            for m, rec in current.items():
+                by_cat.setdefault(rec['category'], []).append(m)
+            state['layers'][name] = {cat: assign_layers([(m, vec_of[m]) for m in ids]) for cat, ids in by_cat.items()}
+            stats['relayered'] += sum(len(ids) for ids in by_cat.values())
+            continue
+        layers = state['layers'][name]
+        touched = {ALL: ([], [])}
+        for m in gone:
+            touched.setdefault(old[m]['category'], ([], []))[0].append(m)
+            touched[ALL][0].append(m)
+        for m in fresh:
+            touched.setdefault(current[m]['category'], ([], []))[1].append(m)
+            touched[ALL][1].append(m)
+        for cat, (removed, added) in touched.items():
+            stats['relayered'] += relayer(layers.setdefault(cat, {}), vec_of, removed, added)
+            if not layers[cat]:
+                del layers[cat]
+    for name in [n for n in state['layers'] if n not in VIEWS]:
+        del state['layers'][name]
+        del state['views'][name]
+    state['recipes'] = current
+    return stats
+
+
+def frontier_table(state, depth=SERVED_LAYERS):
+    """The served table: the first `depth` frontiers per view and category, price-sorted."""
+    recipes = state['recipes']
+    frontiers, used = {}, set()
+    for name, by_cat in state['layers'].items():
+        frontiers[name] = {}
+        for cat, layer_of in sorted(by_cat.items()):
+            lists = [[] for _ in range(depth)]
+            for m, layer in layer_of.items():
+                if layer <= depth:
+                    lists[layer - 1].append(m)
+            for lst in lists:
+                lst.sort(key=lambda m: (recipes[m]['values'][0], m))
+                used.update(lst)
+            frontiers[name][cat] = [lst for lst in lists if lst]
+    return {
+        'fields': list(FIELDS),
+        'layers': depth,
+        'views': {name: view_key(dims) for name, dims in VIEWS.items()},
+        'values': {m: recipes[m]['values'] for m in sorted(used, key=lambda m: (len(m), m))},
+        'frontiers': frontiers,
+    }
+
+
+def query(table, view, category=ALL, layers=1, max_price=None):
+    """Ids of the first `layers` frontiers, each cut at max_price (client-side twin of /api/skyline)."""
+    out = []
+    for lst in table['frontiers'][view].get(category, [])[:layers]:
+        if max_price is not None:
+            prices = [table['values'][m][0] for m in lst]
+            lst = lst[:bisect.bisect_right(prices, max_price)]
+        out.append(lst)
+    return out
+
+
+def load_state(path=STATE):
+    try:
+        return ip.load_json(path)
+    except (OSError, ValueError):
+        return new_state()
+
+
+def export(db_path=DB, ctx=None, full=False, state_path=STATE, table_path=TABLE):
+    ctx = ctx or catalog_context.Context()
+    state = load_state(state_path)
+    stats = update(state, ctx.json(db_path).get('recipes', []), full=full)
+    catalog_context.write_json(state_path, state, None, separators=(',', ':'))
+    catalog_context.write_json(table_path, frontier_table(state), None, separators=(',', ':'))
+    return state, stats
+
+
+def main(ctx=None, db_path=DB, full=False):
+    state, stats = export(db_path, ctx=ctx, full=full)
+    sizes = ', '.join(f"{name} {sum(layer == 1 for layer in state['layers'][name].get(ALL, {}).values())}"
+                      for name in VIEWS)
+    print(f"{len(state['recipes'])} recipes (added {stats['added']}, changed {stats['changed']}, "
+          f"removed {stats['removed']}; {stats['relayered']} points layered); 1st frontier: {sizes}")
+    print(f'Wrote {TABLE}')
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Build layered price/nutrition skylines per category')
+    ap.add_argument('--db', type=Path, default=DB)
+    ap.add_argument('--full', action='store_true', help='ignore the saved state and rebuild')
+    args = ap.parse_args()
+    main(db_path=args.db, full=args.full)
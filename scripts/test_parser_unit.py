@@ -38,3 +38,739 @@ def test_no_missing_lookups_or_outliers():
     assert report.get('missing_price', {}) == {}
     assert report.get('outliers', []) == []
 
+
+
+def test_coverage_index_complete():
+    import coverage_index as ci
+    index = ci.load_index()
+    assert index['keys']
+    missing_nut, missing_price = ci.missing(index)
+    assert missing_nut == {}
+    assert missing_price == {}
+
+
+def test_coverage_index_incremental():
+    import coverage_index as ci
+    index = ci.new_index()
+    nutr = {'garlic': {}}
+    price = {}
+    ci.add_recipe(index, {'idMeal': '1', 'strIngredient1': 'Garlic', 'strIngredient2': 'Dragon Fruit'}, nutr, price)
+    ci.add_recipe(index, {'idMeal': '2', 'strIngredient1': 'garlic'}, nutr, price)
+    missing_nut, missing_price = ci.missing(index)
+    assert set(missing_nut) == {'dragon_fruit'}
+    assert missing_price['garlic'] == ['Garlic', 'garlic']
+    price['garlic'] = {}
+    ci.update_lookup(index, 'garlic', nutr, price)
+    ci.remove_recipe(index, '1')
+    missing_nut, missing_price = ci.missing(index)
+    assert missing_nut == {} and missing_price == {}
+    assert ci.recipes_using(index, 'garlic') == ['2']
+
+
+def test_placeholder_rules_priority():
+    from auto_fill_missing_lookups import classify_many, explain, fill
+    keys = ['banana_leaves', 'green_mango', 'mung_bean_sprouts', 'fish_sauce', 'lumpia_wrapper', 'shrimp_paste', 'egg_noodle', 'jackfruit']
+    names = [rule['name'] for _, rule in classify_many(keys)]
+    assert names == ['vegetable', 'vegetable', 'legume', 'seafood', 'processed food', 'seafood', 'starch', 'generic']
+    assert explain('oyster_sauce') == ('condiment', "contains 'sauce'")
+    nut, price = {}, {'jackfruit': {'price_php_per_kg': 90}}
+    assert fill({'jackfruit'}, nut, price) == (1, 0)
+    assert nut['jackfruit']['source'] == 'Estimated placeholder (generic)'
+
+
+def test_ingest_batches(tmp_path):
+    import json
+    import ingest
+    import ingredient_parser as ip
+    db = tmp_path / 'catalog.json'
+    db.write_text(json.dumps({'recipes': [{'idMeal': '7', 'strMeal': 'Adobo', 'strCategory': 'Pork'}]}), encoding='utf-8')
+    jsonl = tmp_path / 'batch.jsonl'
+    jsonl.write_text('\n'.join([
+        json.dumps({'strMeal': 'Ginisang Sayote', 'strCategory': 'Vegetable',
+                    'ingredients': [['Sayote', '2 pieces'], {'name': 'Garlic', 'measure': '3 cloves'}]}),
+        json.dumps({'strCategory': 'Vegetable', 'ingredients': [['Garlic', '1 clove']]}),
+        '{"strMeal": "Laswa",',
+        json.dumps({'strMeal': 123, 'strCategory': 'Vegetable', 'ingredients': [['Garlic', '1 clove']]}),
+        json.dumps({'strMeal': 'Laswa', 'strCategory': 'Vegetable', 'strInstructions': ['Boil.'],
+                    'ingredients': [['Okra', '5 pieces']]}),
+    ]) + '\n', encoding='utf-8')
+    csv_path = tmp_path / 'batch.csv'
+    csv_path.write_text('strMeal,strCategory,strIngredient1,strMeasure1,strIngredient2,strMeasure2,servings\n'
+                        'Pechay Guisado,Vegetable,Pechay,1 bunch,Onion,1 piece,3\n', encoding='utf-8')
+    stats = ingest.ingest_files([jsonl, csv_path], db_path=db, workers=1)
+    assert (stats['read'], stats['accepted'], stats['rejected']) == (6, 2, 4)
+    assert [(r['line'], r['errors']) for r in stats['rejects']][0] == (2, ['missing strMeal'])
+    assert stats['rejects'][1]['line'] == 3 and stats['rejects'][1]['errors'][0].startswith('invalid JSON')
+    assert [(r['line'], r['errors']) for r in stats['rejects'][2:]] == [
+        (4, ['strMeal is not a string']), (5, ['strInstructions is not a string'])]
+    recipes = ip.load_json(db)['recipes']
+    assert [r['idMeal'] for r in recipes] == ['7', '8', '9']
+    assert recipes[1]['strIngredient2'] == 'Garlic' and recipes[1]['strIngredient10'] == ''
+    assert recipes[2]['strMeal'] == 'Pechay Guisado' and recipes[2]['good_for'] == 3
+    assert recipes[2]['price'] > 0 and recipes[2]['calculated_at'].endswith('Z')
+    # the id high-water mark is kept next to this catalog, not shared with database.json
+    assert ip.load_json(ingest.state_path(db)) == {'next_id': 10}
+    stats = ingest.ingest_files([csv_path], db_path=db, workers=1)
+    assert stats['first_id'] == 10 and ip.load_json(db)['recipes'][-1]['idMeal'] == '10'
+
+
+def test_dedup_merge_suggestions():
+    from dedup import find_duplicates, merge_suggestions
+    block = {f'strIngredient{i}': ing for i, ing in enumerate(['Pork', 'Soy Sauce', 'Vinegar', 'Garlic', 'Bay Leaves'], start=1)}
+    recipes = [
+        dict(block, idMeal='87', strMeal='Pork Adobo'),
+        dict(block, idMeal='12', strMeal='Pork  adobo!'),
+        dict(block, idMeal='40', strMeal='Vinegar Braised Pork'),
+        {'idMeal': '5', 'strMeal': 'Leche Flan', 'strIngredient1': 'Eggs', 'strIngredient2': 'Sugar', 'strIngredient3': 'Milk'},
+    ]
+    pairs, info, _ = find_duplicates(recipes)
+    assert merge_suggestions(pairs, info) == [{'keep': '12', 'name': 'Pork  adobo!', 'merge': [{'idMeal': '87', 'name': 'Pork Adobo'}]}]
+    assert all('5' not in (p['a'], p['b']) for p in pairs)
+    assert any(p['kind'] == 'shared_ingredients' and '40' in (p['a'], p['b']) for p in pairs)
+
+
+def test_similar_index_incremental():
+    import similar_index as si
+    def recipe(mid, name, ings, calories):
+        r = {'idMeal': mid, 'strMeal': name, 'calories': calories, 'good_for': 4, 'price_planned': 200}
+        r.update({f'strIngredient{i}': ing for i, ing in enumerate(ings, start=1)})
+        return r
+    recipes = [
+        recipe('1', 'Adobo', ['Pork', 'Soy Sauce', 'Vinegar', 'Garlic'], 1600),
+        recipe('2', 'Chicken Adobo', ['Chicken', 'Soy Sauce', 'Vinegar', 'Garlic'], 1400),
+        recipe('3', 'Leche Flan', ['Eggs', 'Sugar', 'Condensed Milk'], 1800),
+        recipe('4', 'Tinola', ['Chicken', 'Ginger', 'Green Papaya'], 900),
+    ]
+    state = si.new_state()
+    si.refresh(state, recipes, full=True)
+    assert state['neighbors']['1'][0][0] == '2'
+    stats = si.refresh(state, recipes + [recipe('5', 'Pork Adobo', ['Pork', 'Soy Sauce', 'Vinegar', 'Garlic'], 1600)])
+    assert not stats['full'] and stats['added'] == 1
+    assert state['neighbors']['1'][0][0] == '5'
+    model = si.Model(state)
+    assert state['neighbors'] == {mid: model.top(mid) for mid in state['recipes']}
+    si.refresh(state, recipes)
+    assert all('5' not in [o for o, _ in lst] for lst in state['neighbors'].values())
+
+
+def test_unit_table_provenance():
+    import ingredient_parser as ip
+    table = ip.CONFIG.unit_table
+    assert table[('garlic', 'cloves')] == (5, 'override:garlic')
+    assert table[('rice', 'cups')] == (185, 'override:rice')
+    assert table[('egg', 'whole')] == (50, 'per_item_mass:egg')
+    assert ip.resolve_unit('mixed_vegetables', 'cup') == (120, 'override:vegetable (fuzzy)')
+    assert ip.resolve_unit('dragon_fruit', 'bunch') == (ip.CONFIG.default_piece_g, 'default_piece')
+    assert ip.unit_grams('dragon_fruit', 'tsp') == 5
+    assert ('dragon_fruit', 'tsp') in table
+
+
+def test_derived_store_incremental(tmp_path):
+    import json
+    import derived_store as ds
+    src = tmp_path / 'catalog.json'
+    recipes = [{'idMeal': '1', 'strMeal': 'Garlic Rice', 'strIngredient1': 'Garlic', 'strMeasure1': '3 cloves', 'strIngredient2': 'White Rice', 'strMeasure2': '200'}]
+    src.write_text(json.dumps({'recipes': recipes}), encoding='utf-8')
+    nutr = {'rice': {'per_100g': {'calories': 130}}}
+    price = {'garlic': {'price_php_per_kg': 200}}
+    conn = ds.open_store(tmp_path / 'store.sqlite')
+    assert ds.refresh(conn, [src], nutr, price)['catalog.json'] == {'parsed': 1, 'removed': 0}
+    rows = [dict(r) for r in conn.execute('SELECT key, grams, rule, kcal, price FROM ingredient_lines ORDER BY slot')]
+    assert rows == [{'key': 'garlic', 'grams': 15, 'rule': 'count', 'kcal': 0.0, 'price': 3.0},
+                    {'key': 'rice', 'grams': 200.0, 'rule': 'bare_number', 'kcal': 260.0, 'price': 0.0}]
+    nutr['garlic'] = {'per_100g': {'calories': 150}}
+    stats = ds.refresh(conn, [src], nutr, price)
+    assert stats['lookups'] == 1 and stats['catalog.json']['parsed'] == 0
+    assert conn.execute("SELECT kcal FROM ingredient_lines WHERE key = 'garlic'").fetchone()[0] == 22.5
+    src.write_text(json.dumps({'recipes': []}), encoding='utf-8')
+    assert ds.refresh(conn, [src], nutr, price)['catalog.json'] == {'parsed': 0, 'removed': 1}
+    assert conn.execute('SELECT count(*) FROM ingredient_lines').fetchone()[0] == 0
+
+
+def test_price_ranges_widen_with_ambiguity():
+    import numpy as np
+    from price_ranges import sample_ranges, apply_ranges, grams_sigma
+    assert grams_sigma('paren:mass') == grams_sigma('mass') < grams_sigma('count') < grams_sigma('to_taste')
+    base = np.array([[60, 40], [60, 40], [0, 0]], dtype=np.float32)
+    sigma = np.array([[0, 0], [0.2, 0.6], [0, 0]], dtype=np.float32)
+    pct = sample_ranges(base, sigma, samples=20000, seed=7)
+    assert np.allclose(pct[0], 100, rtol=1e-5)
+    assert pct[1][0] < 95 and pct[1][2] > 105 and abs(pct[1][1] - 100) < 10
+    recipes = [{'idMeal': '1', 'good_for': 4}, {'idMeal': '2', 'price_min': 5}]
+    assert apply_ranges(recipes, {'1': (90.2, 100.0, 121.0)}) == 1
+    assert recipes[0]['price_max'] == 121 and recipes[0]['price_per_serving_planned'] == 25
+    assert recipes[1] == {'idMeal': '2', 'price_min': 5}
+
+
+def test_shopping_list_shares_packs(tmp_path):
+    import json
+    import pytest
+    import derived_store as ds
+    from shopping_list import ShoppingEngine
+    src = tmp_path / 'catalog.json'
+    recipes = [
+        {'idMeal': '1', 'strIngredient1': 'Soy Sauce', 'strMeasure1': '3 tbsp', 'strIngredient2': 'Onion', 'strMeasure2': '120g'},
+        {'idMeal': '2', 'strIngredient1': 'Soy Sauce', 'strMeasure1': '2 tbsp', 'strIngredient2': 'Onion', 'strMeasure2': '1 piece'},
+    ]
+    src.write_text(json.dumps({'recipes': recipes}), encoding='utf-8')
+    conn = ds.open_store(tmp_path / 'store.sqlite')
+    ds.refresh(conn, [src], {}, {'onion': {'price_php_per_kg': 100}})
+    engine = ShoppingEngine(conn, 'catalog.json', {'soy_sauce': {'unit': 'bottle', 'grams': 385, 'price_php': 45}})
+    basket = engine.basket([('1', 1), ('2', 2)])
+    items = {i['key']: i for i in basket['items']}
+    assert items['soy_sauce']['grams'] == 105 and items['soy_sauce']['quantity'] == 1
+    assert items['onion']['grams'] == 420 and items['onion']['quantity'] * items['onion']['unit_grams'] == 450
+    assert basket['total'] == 45 + 45.0
+    _, packs, cost = engine.totals([[('1', 1)], [('1', 40)]])
+    assert list(cost) == [45 + 15.0, 5 * 45 + 480.0]
+    with pytest.raises(ValueError, match="unknown recipe id '99'"):
+        engine.basket([('99', 1)])
+
+
+def test_export_static_payloads(tmp_path):
+    import gzip
+    import json
+    import export_static as es
+    db = {'recipes': [{'idMeal': str(i), 'strMeal': f'Dish {i}', 'strCategory': 'Pork' if i % 2 else 'Beef',
+                       'good_for': 4, 'price_planned': 100.0 + i} for i in range(25)]
+                      + [{'idMeal': '99', 'strMeal': 'Lumpia', 'strMealType': 'side', 'calories': 0.5}],
+          'categories': [{'strCategory': 'Pork'}]}
+    src = tmp_path / 'database.json'
+    src.write_text(json.dumps(db), encoding='utf-8')
+    out = tmp_path / 'static'
+    manifest = es.export(src, out)
+    routes = manifest['routes']
+    assert '/api/recipes?page=2&limit=20' in routes and '/api/recipes?page=3&limit=20' not in routes
+    assert '/api/lookup?i=99' in routes and '/api/filter?c=Pork' in routes
+    digest = routes['/api/recipes?page=2&limit=20']
+    body = (out / digest[:2] / (digest + '.json')).read_bytes()
+    assert gzip.decompress((out / digest[:2] / (digest + '.json.gz')).read_bytes()) == body
+    page = json.loads(body)
+    assert (page['count'], page['total']) == (6, 26)
+    # JSON.stringify shape: no whitespace, 101.0 -> 101, undefined fields dropped, default meal type
+    assert b'"price_planned":120}' in body and b'"strMealType":"side"}' in body
+    assert json.loads((out / routes['/api/stats'][:2] / (routes['/api/stats'] + '.json')).read_bytes())['byMealType'] == {'main': 25, 'side': 1}
+    assert manifest['payloads'][digest]['gzip']['etag'] == f'"{digest}-gzip"'
+    assert manifest['stats']['written'] == len(manifest['payloads']) * len(manifest['encodings'])
+
+    db['recipes'][0]['strMeal'] = 'Renamed'
+    src.write_text(json.dumps(db), encoding='utf-8')
+    again = es.export(src, out)
+    # lookup 0, page 1 and the Beef filter changed; old files are dropped
+    assert again['stats']['written'] == 3 * len(again['encodings']) == again['stats']['removed']
+    assert again['routes']['/api/stats'] == routes['/api/stats']
+
+
+def test_alias_graph_classes():
+    import pytest
+    import ingredient_parser as ip
+    assert ip.normalize_name('Quail_Eggs (optional)') == ip.normalize_name('quail egg') == 'quail egg'
+    assert ip.normalize_name('Fresh Bay Leaves') == 'bay leaf'
+    for name in ('Pechay', 'petsay', 'Bok Choy', 'Pak Choi (optional)', 'Pork Leg (Pata)'):
+        assert canonicalize_ingredient(name) == ('pork_hock' if 'Pata' in name else 'bok_choy')
+    assert canonicalize_ingredient('Water Spinach') == 'kangkong'
+    assert canonicalize_ingredient('Onions') == 'onion'
+    assert {'pechay', 'bok choy', 'pak choi'} <= set(ip.CONFIG.alias_classes['bok_choy'])
+    data = ip.CONFIG.to_dict()
+    data['ing_aliases'].append(['sugar', 'salt'])
+    with pytest.raises(ValueError):
+        ip.ParserConfig(data, unit_keys=())
+
+
+def test_shared_lookups_match_dicts():
+    import ingredient_parser as ip
+    from shared_lookups import LookupTables
+    nutr = {'egg': {'name': 'Egg', 'per_100g': {'calories': 143, 'protein': 12.6, 'carbs': 0.7, 'fat': 9.5}, 'source': 'USDA'},
+            'salt': {'per_100g': {'calories': 0}, 'source': 'USDA'}}
+    price = {'egg': {'price_php_per_kg': 160, 'source': 'Market'}, 'soy_sauce': {'price_php_per_liter': 90}}
+    shm = LookupTables.from_dicts(nutr, price).publish()
+    try:
+        view = LookupTables.attach(shm.name)
+        assert set(view.nutrition) == {'egg', 'salt'} and 'soy_sauce' not in view.nutrition
+        assert view.nutrition['salt'] == {'per_100g': {'calories': 0.0}, 'source': 'USDA'}
+        assert view.prices['soy_sauce'] == {'price_php_per_liter': 90.0} and view.prices.get('salt') is None
+        recipe = {'strIngredient1': 'Eggs', 'strMeasure1': '2 pieces', 'strIngredient2': 'Soy Sauce', 'strMeasure2': '2 tbsp',
+                  'strIngredient3': 'Salt', 'strMeasure3': '1 tsp'}
+        assert ip.compute_totals(recipe, view.nutrition, view.prices) == ip.compute_totals(recipe, nutr, price)
+        view.close()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_parser_config_versioned_hot_swap(tmp_path):
+    import json
+    import pytest
+    import ingredient_parser as ip
+    cfg = ip.CONFIG
+    with pytest.raises(AttributeError):
+        cfg.ing_map = {}
+    with pytest.raises(TypeError):
+        cfg.ing_map['tofu'] = 'tofu'
+    data = cfg.to_dict()
+    assert ip.ParserConfig(data, unit_keys=()).version == cfg.version
+    data['ing_map']['tokwa'] = 'tofu'
+    data['per_item_mass']['tofu'] = 120
+    path = tmp_path / 'parser_config.json'
+    path.write_text(json.dumps(data), encoding='utf-8')
+    try:
+        new = ip.reload_config(path)
+        assert new is ip.CONFIG and new.version != cfg.version and new.versions['names'] != cfg.versions['names']
+        assert canonicalize_ingredient('Tokwa') == 'tofu' and parse_measure('2 pieces', 'tofu') == 240
+        assert ip.reload_config(path) is new  # unchanged file: no rebuild
+        # the old config still answers for callers holding it
+        assert canonicalize_ingredient('Tokwa', cfg) == 'tokwa' and parse_measure('2 pieces', 'tofu', cfg) == 20
+    finally:
+        ip.swap_config(cfg)
+
+
+def test_recompute_daemon_rpc(tmp_path):
+    import json
+    import threading
+    import pytest
+    import ingredient_parser as ip
+    import recompute_daemon as rd
+    recipe = {'idMeal': '1', 'strMeal': 'Tortang Talong', 'servings': 2, 'calories': 0,
+              'strIngredient1': 'Eggplant', 'strMeasure1': '2 pieces',
+              'strIngredient2': 'Eggs', 'strMeasure2': '3 pieces'}
+    db = tmp_path / 'database.json'
+    db.write_text(json.dumps({'recipes': [recipe]}), encoding='utf-8')
+    daemon = rd.Daemon(db)
+    server = rd.make_server(daemon, port=0)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        calc, _ = ip.recalculate(recipe, daemon.lookups.nutr, daemon.lookups.price)
+        res = rd.call('recompute', port, ids=['1', '404'])
+        assert res['recipes']['1']['fields'] == calc and res['missing'] == ['404']
+        assert res['recipes']['1']['diffs']['calories'] == {'old': 0, 'new': calc['calories']}
+        lines = rd.call('breakdown', port, id=1)
+        assert [i['key'] for i in lines['items']] == ['eggplant', 'egg'] and lines['total_calories'] == calc['calories']
+        assert rd.call('cost', port, recipe=recipe)['fields'] == calc
+        with pytest.raises(RuntimeError, match='no recipe'):
+            rd.call('breakdown', port, id='404')
+        with pytest.raises(RuntimeError, match='unknown method'):
+            rd.call('drop_tables', port)
+        # the catalog follows the file on disk
+        db.write_text(json.dumps({'recipes': [recipe, dict(recipe, idMeal='2')]}), encoding='utf-8')
+        assert rd.call('status', port)['recipes'] == 2
+        assert rd.call('reload_lookups', port)['parser_version'] == ip.CONFIG.version
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_catalog_context_loads_once(tmp_path):
+    import json
+    import catalog_context
+    src = tmp_path / 'catalog.json'
+    src.write_text(json.dumps({'recipes': [{'idMeal': '1', 'strMeal': 'Ginisang Monggo',
+                                            'strIngredient1': 'Onion', 'strMeasure1': '1 piece'}]}), encoding='utf-8')
+    ctx = catalog_context.Context(store_path=tmp_path / 'derived.sqlite')
+    ctx.put(catalog_context.NUTR, {})
+    ctx.put(catalog_context.PRICE, {'onion': {'price_php_per_kg': 100}})
+    doc = ctx.json(src)
+    assert ctx.json(str(src)) is doc and ctx.reads == 1
+    assert ctx.first(tmp_path / 'missing.json', src) is doc and ctx.first(tmp_path / 'missing.json', src) is doc
+    conn = ctx.store([src])
+    assert conn.execute('SELECT count(*) FROM ingredient_lines').fetchone()[0] == 1 and ctx.reads == 1
+    edited = ctx.take(src)
+    edited['recipes'].append(dict(edited['recipes'][0], idMeal='2'))
+    ctx.put(src, edited)  # the store follows the in-memory document without re-reading the file
+    assert ctx.store([src]).execute('SELECT count(*) FROM ingredient_lines').fetchone()[0] == 2 and ctx.reads == 1
+
+
+def test_nutrient_matrix_totals():
+    import numpy as np
+    import nutrients as nm
+    nutr = {'onion': {'per_100g': {'calories': 40, 'protein': 1.1, 'carbs': 9.3, 'fat': 0.1}},
+            'pork': {'per_100g': {'calories': 250, 'protein': 20, 'carbs': 0, 'fat': 18}}}
+    extra = {'nutrients': [{'id': 'sodium', 'unit': 'mg', 'name': 'Sodium'}],
+             'per_100g': {'fish_sauce': {'sodium': 7851}, 'onion': {'sodium': 4}}}
+    matrix = nm.NutrientMatrix.from_lookups(nutr, extra)
+    assert matrix.registry.ids == ('calories', 'protein', 'carbs', 'fat', 'sodium')
+    assert matrix.values.dtype == np.float32 and matrix.values.shape == (3, 5)
+    grams = np.array([[200.0, 15.0, 500.0], [0.0, 0.0, 0.0]])
+    totals, share = matrix.totals(grams, ['onion', 'fish_sauce', 'pork'])
+    assert totals.shape == (2, 5) and abs(totals[0, 0] - (80 + 1250)) < 1e-3
+    assert abs(totals[0, 4] - (8 + 7851 * 0.15)) < 1e-2
+    # fish sauce has no macros and pork no sodium: the known share says so
+    assert abs(share[0, 0] - 700 / 715) < 1e-9 and abs(share[0, 4] - 215 / 715) < 1e-9
+    assert (share[1] == 1).all() and (totals[1] == 0).all()
+
+
+def test_recipe_nutrients_servings():
+    import catalog_context
+    import ingredient_parser as ip
+    import nutrients as nm
+    table = ip.load_json(nm.OUT)
+    # per_serving in /api/recipes/:id/nutrients divides by these: the catalog's good_for
+    for r in ip.load_json(catalog_context.DB)['recipes']:
+        assert table['recipes'][str(r['idMeal'])]['servings'] == ip.recipe_servings(r)
+
+
+def test_diet_tag_bitmaps():
+    import diet_tags as dt
+    reg = dt.TagRegistry({
+        'tags': [{'id': 'pork', 'match': ['pork']}, {'id': 'meat', 'match': ['beef'], 'implied_by': ['pork']},
+                 {'id': 'shellfish', 'match': ['shrimp']}, {'id': 'dairy', 'match': ['milk']},
+                 {'id': 'coconut', 'match': ['coconut']}],
+        'keys': {'coconut_milk': ['coconut']},
+        'diets': {'vegetarian': ['meat', 'shellfish']},
+    })
+
+    def recipe(mid, cat, *ings):
+        r = {'idMeal': mid, 'strCategory': cat}
+        for i, ing in enumerate(ings, 1):
+            r[f'strIngredient{i}'] = ing
+        return r
+    recipes = [recipe('1', 'Pork', 'Pork Belly', 'Garlic'),
+               recipe('2', 'Vegetable', 'Ground Pork/Shrimp', 'Squash'),
+               recipe('3', 'Vegetable', 'Coconut Milk', 'Squash'),
+               recipe('4', 'Dessert', 'Milk', 'Sugar')]
+    out = dt.build(recipes, reg)
+    assert [reg.names(m) for m in out['masks']] == [['pork', 'meat'], ['pork', 'meat', 'shellfish'], ['coconut'], ['dairy']]
+    assert out['bitmaps']['tag']['pork'] == [0b0011] and out['bitmaps']['category']['Vegetable'] == [0b0110]
+    assert out['facets']['Vegetable'] == {'pork': 1, 'meat': 1, 'shellfish': 1, 'dairy': 0, 'coconut': 1, 'vegetarian': 1}
+    assert out['facets']['*']['vegetarian'] == 2
+    assert dt.words(1 << 40, 41) == [0, 1 << 8]
+
+
+def test_instruction_step_timings():
+    import instructions as ins
+    text = ("1. Marinate pork in soy sauce for at least 4 hours or overnight.\\n"
+            "2. Boil pork ears until tender.\\n3. Chop and deep-fry until golden.\\n"
+            "4. Simmer 15 to 20 minutes.\\n5. Grill 5 minutes per side.")
+    out = ins.analyze(text)
+    assert [s['text'][:5] for s in out['steps']] == ['Marin', 'Boil ', 'Chop ', 'Simme', 'Grill']
+    assert [(s['active_min'], s['passive_min']) for s in out['steps']] == [
+        (0, 240), (0, ins.TENDER_MEAT_MIN), (5 + 12, 0), (0, 17.5), (10, 0)]
+    assert out['techniques'] == ['marinate', 'boil', 'cut', 'deep_fry', 'simmer', 'grill']
+    assert (out['time_active_min'], out['time_passive_min']) == (27, 298)
+    assert out['difficulty'] == 'medium'
+    assert ins.analyze('1. Serve with steamed rice.')['techniques'] == []
+    r = {'strInstructions': text}
+    assert ins.annotate(r) and not ins.annotate(r)
+    assert r['time_total_min'] == 325 and r['techniques'] == out['techniques']
+
+
+def test_market_price_refresh(tmp_path):
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlsplit
+    import market_prices as mp
+    quotes = {'garlic': {'price_php_per_kg': 220}, 'vinegar': {'price_php_per_liter': 66},
+              'onion': {'price_php_per_kg': 400}, 'salt': {'price_php_per_liter': 30}, 'saffron': {'price_php_per_kg': 1},
+              'water': {'price_php_per_liter': 5}}
+    seen = []
+
+    class Stub(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            keys = parse_qs(url.query)['keys'][0].split(',')
+            seen.append((url.path, keys, self.headers.get('If-None-Match')))
+            if url.path == '/broken':
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            etag = '"%d"' % len(keys)
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = json.dumps({'prices': {k: quotes[k] for k in keys if k in quotes}}).encode()
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    prices = tmp_path / 'price_lookup.json'
+    prices.write_bytes(json.dumps({
+        'garlic': {'price_php_per_kg': 200, 'source': 'Local market average'},
+        'onion': {'price_php_per_kg': 120, 'source': 'Local market average'},
+        'salt': {'price_php_per_kg': 25, 'source': 'Local market average'},
+        'vinegar': {'price_php_per_liter': 60, 'source': 'Supermarket price'},
+        'water': {'price_php_per_liter': 0, 'source': 'Tap water'},
+    }, indent=4).replace('\n', '\r\n').encode())
+    sources = tmp_path / 'market_sources.json'
+    sources.write_text(json.dumps({'breaker': {'failures': 2, 'cooldown': 600}, 'sources': [
+        {'name': 'stub', 'url': base + '/prices', 'batch': 3, 'ttl': 60},
+        {'name': 'down', 'url': base + '/broken', 'batch': 1, 'connections': 1},
+    ]}))
+    cache = tmp_path / 'cache.json'
+    try:
+        out = mp.refresh(sources, prices, cache, now=1000)
+        # 5 keys in batches of 3; onion (3.3x), salt (wrong unit) and water (no current price) rejected
+        assert sorted(k for p, k, _ in seen if p == '/prices') == [['garlic', 'onion', 'salt'], ['vinegar', 'water']]
+        assert out['updated'].keys() == {'garlic', 'vinegar'}
+        assert {k for _, k, _ in out['rejected']} == {'onion', 'salt', 'water'}
+        assert ('stub', 'water', 'no current price to compare') in out['rejected']
+        data = prices.read_bytes()
+        assert b'\r\n' in data and json.loads(data)['garlic']['price_php_per_kg'] == 220
+        assert json.loads(data)['onion']['price_php_per_kg'] == 120
+        # the failing source stops after two errors and stays open across runs
+        assert out['sources']['down']['failed'] == 2 and out['sources']['down']['skipped'] == 3
+        assert out['sources']['down']['breaker'] == 'open'
+        seen.clear()
+        out = mp.refresh(sources, prices, cache, now=1030)
+        assert seen == [] and out['sources']['stub']['cached'] == 2 and out['updated'] == {}
+        # after the ttl: conditional requests; after the cooldown: one probe
+        out = mp.refresh(sources, prices, cache, now=1700)
+        assert out['sources']['stub']['not_modified'] == 2
+        assert all(inm for p, _, inm in seen if p == '/prices')
+        assert [p for p, _, _ in seen].count('/broken') == 1 and out['sources']['down']['breaker'] == 'open'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_loadtest_histogram_and_compare():
+    import loadtest as lt
+    h = lt.Histogram()
+    for us in range(1, 10001):
+        h.record(us)
+    # log-linear buckets: percentiles within 1% of the exact values
+    for p, exact in ((50, 5000), (95, 9500), (99, 9900)):
+        assert exact <= h.percentile(p) <= exact * 1.01
+    assert h.percentile(100) == 10000 and h.summary()['count'] == 10000
+    for v in (0, 1, 255, 256, 257, 1000, 123456):
+        assert h._upper(h._index(v)) >= v and h._upper(h._index(v)) <= v * 1.01 + 1
+    other = lt.Histogram()
+    other.record(50000)
+    h.add(other)
+    assert h.max == 50000 and h.total == 10001
+
+    mix = lt.RequestMix([{'idMeal': '7', 'strMeal': 'Pinakbet Ilocano', 'strCategory': 'Vegetable'}],
+                        lt.parse_mix('lookup=1,filter=1,search=1'), seed=1)
+    paths = {mix.next()[1] for _ in range(50)}
+    assert paths == {'/api/lookup?i=7', '/api/filter?c=Vegetable', '/api/search?s=pinakbet', '/api/search?s=ilocano'}
+    mix.drop('search')
+    assert {mix.next()[0] for _ in range(20)} == {'lookup', 'filter'}
+
+    def result(rps, p95):
+        route = {'count': 100, 'p50_ms': 1.0, 'p95_ms': p95, 'p99_ms': 5.0}
+        return {'throughput_rps': rps, 'total': route, 'routes': {'lookup': route}}
+    assert lt.compare(result(1000, 2.0), result(1100, 1.9)) == []
+    assert [m for m, _, _ in lt.compare(result(700, 3.0), result(1000, 2.0))] == [
+        'throughput_rps', 'total.p95_ms', 'lookup.p95_ms']
+
+
+def test_skyline_layers_incremental():
+    import random
+    import skyline as sk
+
+    def peel(points):
+        left, out, layer = dict(points), {}, 1
+        while left:
+            front = [m for m, v in left.items() if not any(sk.dominates(w, v) for w in left.values())]
+            for m in front:
+                out[m] = layer
+                del left[m]
+            layer += 1
+        return out
+    rng = random.Random(7)
+    vec = {str(i): (rng.randint(0, 9), rng.randint(0, 9), rng.randint(0, 9)) for i in range(80)}
+    layers = sk.assign_layers(list(vec.items()))
+    assert layers == peel(vec)
+    # drop two points, move one, add one: only layers from the shallowest change down are redone
+    vec.pop('3'), vec.pop('40')
+    vec['7'], vec['new'] = (0, 0, 9), (1, 1, 1)
+    sk.relayer(layers, vec, ['3', '40', '7'], ['7', 'new'])
+    assert layers == peel(vec)
+
+    def recipe(mid, cat, price, protein, calories=300, fat=10):
+        return {'idMeal': mid, 'strCategory': cat, 'good_for': 1, 'price_planned': price,
+                'protein': protein, 'calories': calories, 'fat': fat}
+    recipes = [recipe('1', 'Pork', 40, 20), recipe('2', 'Pork', 60, 30), recipe('3', 'Pork', 60, 10),
+               recipe('4', 'Vegetable', 20, 5), recipe('5', 'Vegetable', 30, 4)]
+    state = sk.new_state()
+    sk.update(state, recipes)
+    table = sk.frontier_table(state)
+    assert sk.query(table, 'protein_per_peso', 'Pork', 3) == [['1', '2'], ['3']]
+    assert sk.query(table, 'protein_per_peso', '*', 2, max_price=45) == [['4', '1'], ['5']]
+    recipes[4] = recipe('5', 'Vegetable', 15, 4)
+    stats = sk.update(state, recipes)
+    assert stats['changed'] == 1 and stats['added'] == 0
+    table = sk.frontier_table(state)
+    assert sk.query(table, 'protein_per_peso', 'Vegetable', 2) == [['5', '4']]
+    assert sk.update(state, recipes)['relayered'] == 0
+
+
+def test_shards_prune_and_gather(tmp_path):
+    import json
+    import shards
+
+    bloom = shards.BloomFilter.for_capacity(100)
+    for i in range(100):
+        bloom.add(f'key{i}')
+    assert all(f'key{i}' in bloom for i in range(100))
+    assert sum(f'other{i}' in bloom for i in range(1000)) < 50
+    assert 'key7' in shards.BloomFilter.from_json(bloom.to_json())
+
+    def recipe(mid, cat, price, *ings):
+        r = {'idMeal': mid, 'strMeal': f'Meal {mid}', 'strCategory': cat, 'good_for': 1, 'price_planned': price}
+        r.update({f'strIngredient{i}': ing for i, ing in enumerate(ings, 1)})
+        return r
+    db = tmp_path / 'database.json'
+    db.write_text(json.dumps({'categories': [], 'recipes': [
+        recipe('1', 'Pork', 80, 'Pork belly', 'Garlic'), recipe('2', 'Pork', 40, 'Pork belly', 'Vinegar'),
+        recipe('3', 'Vegetable', 20, 'Eggplant', 'Garlic'), recipe('4', 'Dessert', 30, 'Sugar'),
+        recipe('5', 'Dessert', 15, 'Banana', 'Sugar')]}), encoding='utf-8')
+    out = tmp_path / 'shards'
+    manifest = shards.split(db, out, 3, by='category')
+    assert sorted(s['recipes'] for s in manifest['shards']) == [1, 2, 2]
+    assert all(len(s['categories']) == 1 for s in manifest['shards'])
+
+    result = shards.query(shards.make_spec(category='Dessert'), out, workers=1)
+    assert [m['idMeal'] for m in result['meals']] == ['5', '4'] and result['pruned'] == 2
+    result = shards.query(shards.make_spec(ingredients=['garlic'], max_price=50), out, workers=1)
+    assert [m['idMeal'] for m in result['meals']] == ['3']
+    # every recipe lands in exactly one hash shard, and a two-shard scan gathers from both
+    manifest = shards.split(db, out, 2)
+    assert sum(s['recipes'] for s in manifest['shards']) == 5 and len(list(out.glob('shard-*.json'))) == 2
+    assert [m['idMeal'] for m in shards.query(shards.make_spec(), out, limit=3, workers=2)['meals']] == ['5', '3', '4']
+
+
+def test_shards_recompute_matches_parser(tmp_path, monkeypatch):
+    import pytest
+    import catalog_context
+    import ingredient_parser as ip
+    import shards
+    monkeypatch.chdir(tmp_path)  # clamp_grams' warning log is cwd-relative
+    with pytest.raises(ValueError, match='at least 1'):
+        shards.split(catalog_context.DB, tmp_path / 'none', 0)
+    # the single-file recompute, redirected to tmp_path
+    monkeypatch.setattr(ip, 'OUT_PATH', tmp_path / 'database.updated.json')
+    ip.main(catalog_context.Context(store_path=tmp_path / 'derived.sqlite'))
+    shards.split(catalog_context.DB, tmp_path / 'shards', 3)
+    shards.run(['recompute'], tmp_path / 'shards', workers=1)
+
+    def by_id(recipes):
+        # calculated_at is the wall clock and sources are an unordered set
+        return {r['idMeal']: {**r, 'calculated_at': None, 'sources': sorted(r.get('sources', []))} for r in recipes}
+    whole = by_id(ip.load_json(tmp_path / 'database.updated.json')['recipes'])
+    sharded = by_id(r for path in sorted((tmp_path / 'shards').glob('*.updated.json'))
+                    for r in ip.load_json(path)['recipes'])
+    assert len(whole) == len(ip.load_json(catalog_context.DB)['recipes'])
+    assert sharded == whole
+
+
+def test_parity_harness_reference_and_candidates(tmp_path, monkeypatch):
+    import ingredient_parser as ip
+    import parity
+    monkeypatch.chdir(tmp_path)  # clamp_grams' warning log is cwd-relative
+
+    corpus = parity.build_corpus(parity.load_recipes(parity.catalog_paths()), fuzz=300, seed=3)
+    assert len(corpus['measure']) > 300 and any('/' in m for m, _ in corpus['measure'])
+    # the shared-memory lookups are a drop-in for the dicts: costing matches on the whole corpus
+    reports = parity.run(corpus=corpus, shared_lookups=True, repeat=1)
+    assert [r['mismatches'] for r in reports] == [0, 0, 0] and all(r['speedup'] for r in reports)
+    assert not (tmp_path / 'suspicious_parse_warnings.log').exists()
+    # drift inside the tolerance passes; a 1% change on cups is reported with the failing input
+    cases = [('300g', 'pork'), ('to taste', 'salt'), ('1 1/2 cup', 'water')]
+    rep = parity.compare('measure', ip.parse_measure, lambda m, k: ip.parse_measure(m, k) * 1.0005, cases, repeat=1)
+    assert rep['mismatches'] == 0
+    rep = parity.compare('measure', ip.parse_measure,
+                         lambda m, k: ip.parse_measure(m, k) * (1.01 if 'cup' in m else 1), cases, repeat=1)
+    assert rep['mismatches'] == 1 and rep['examples'][0]['input'] == ('1 1/2 cup', 'water')
+    assert parity.close((1.0, {'a': 2.0}), (1.0005, {'a': 2.0}), 1e-3) and not parity.close({'a': 1}, {'b': 1}, 1)
+
+
+def test_image_index_hashes_and_clusters(tmp_path):
+    import random
+    import numpy as np
+    import image_index as ii
+
+    rng = np.random.default_rng(0)
+
+    def photo():
+        a = rng.random((96, 128)) * 255
+        for _ in range(6):
+            a = (a + np.roll(a, 1, 0) + np.roll(a, -1, 0) + np.roll(a, 1, 1) + np.roll(a, -1, 1)) / 5
+        return a
+    a, b = photo(), photo()
+    # a 2x upscale and mild noise stay within a few bits; a different photo does not
+    assert ii.hamming(ii.phash(a), ii.phash(np.kron(a, np.ones((2, 2))))) <= 2
+    assert ii.hamming(ii.dhash(a), ii.dhash(a + rng.normal(0, 4, a.shape))) <= 6
+    assert ii.hamming(ii.phash(a), ii.phash(b)) > 2 * ii.DEFAULT_RADIUS
+
+    hashes = [random.Random(i).getrandbits(64) for i in range(500)]
+    tree = ii.BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, i)
+    q = hashes[7] ^ 0b1011
+    assert sorted(i for _, i in tree.query(q, 10)) == [i for i, h in enumerate(hashes) if ii.hamming(h, q) <= 10]
+
+    urls = {'https://x/sarciado.jpg': a, 'https://y/sarciado-small.jpg': np.kron(a, np.ones((2, 2))),
+            'https://x/salad.jpg': b}
+    cache = tmp_path / 'cache'
+    cache.mkdir()
+    for url, pixels in urls.items():
+        with open(cache / ii.cache_name(url), 'wb') as f:
+            np.save(f, pixels)
+    calls = []
+
+    def hasher(path):
+        calls.append(path.name)
+        pixels = np.load(path)
+        return f'{ii.phash(pixels):016x}', f'{ii.dhash(pixels):016x}', path.name
+    state = ii.new_state()
+    assert ii.update(state, cache, workers=1, hasher=hasher)['hashed'] == 3
+    assert ii.update(state, cache, workers=1, hasher=hasher) == {'hashed': 0, 'kept': 3, 'removed': 0}
+    thumbs = ii.recipe_thumbs([
+        {'idMeal': '1', 'strMeal': 'Chicken Sarciado', 'strMealThumb': 'https://x/sarciado.jpg'},
+        {'idMeal': '2', 'strMeal': 'Fish Sarciado', 'strMealThumb': 'https://x/sarciado.jpg'},
+        {'idMeal': '3', 'strMeal': 'Pork Sarciado', 'strMealThumb': 'https://y/sarciado-small.jpg'},
+        {'idMeal': '4', 'strMeal': 'Salad', 'strMealThumb': 'https://x/salad.jpg'},
+        {'idMeal': '5', 'strMeal': 'Pinakbet', 'strMealThumb': 'tbn:vegetable_5'}])
+    report = ii.build_report(thumbs, state)
+    assert [len(s['recipes']) for s in report['shared_urls']] == [2]
+    assert [p['url'] for p in report['placeholders']] == ['tbn:vegetable_5']
+    assert [[r['idMeal'] for r in c['recipes']] for c in report['clusters']] == [['1', '2', '3']]
+    assert report['clusters'][0]['kind'] == 'near_identical' and report['unavailable'] == []
+
+
+def test_aggregates_incremental_matches_rebuild():
+    import aggregates as ag
+
+    def recipe(mid, cat, price, calories, meal_type=None):
+        r = {'idMeal': mid, 'strCategory': cat, 'strArea': 'Filipino', 'good_for': 1,
+             'price_planned': price, 'calories': calories, 'protein': 20, 'carbs': 30, 'fat': 10}
+        if meal_type:
+            r['strMealType'] = meal_type
+        return r
+    recipes = [recipe('1', 'Pork', 40, 450), recipe('2', 'Pork', 60, 520), recipe('3', 'Vegetable', 20, 120, 'side'),
+               recipe('4', 'Vegetable', 30, 90, 'side'), recipe('5', 'Pork', 50, 300)]
+    state = ag.new_state()
+    assert ag.update(state, recipes) == {'added': 5, 'changed': 0, 'removed': 0}
+    pork = ag.stats_table(state)['groups']['category']['Pork']
+    assert pork['count'] == 3 and pork['price_per_serving'] == {'min': 40, 'mean': 50, 'median': 50, 'max': 60}
+    assert pork['histograms']['calories_per_serving'][3:6] == [1, 1, 1]
+    # a missing strMealType counts as main, as in server.js
+    assert {k: g['count'] for k, g in ag.stats_table(state)['groups']['meal_type'].items()} == {'main': 3, 'side': 2}
+
+    # upsert (a move to another category) and delete, then compare with a rebuild
+    assert ag.upsert(state, recipe('2', 'Beef', 90, 700)) and not ag.upsert(state, recipe('1', 'Pork', 40, 450))
+    assert ag.delete(state, '4') and not ag.delete(state, '4')
+    current = [recipes[0], recipe('2', 'Beef', 90, 700), recipes[2], recipes[4]]
+    fresh = ag.new_state()
+    ag.update(fresh, current)
+    assert ag.stats_table(state) == ag.stats_table(fresh)
+    assert 'Vegetable' in fresh['groups']['category'] and fresh['groups']['category']['Vegetable']['count'] == 1
+    assert ag.update(state, current) == {'added': 0, 'changed': 0, 'removed': 0}
+    # summaries of two halves merge into the summary of the whole
+    left, right = ag.new_state(), ag.new_state()
+    ag.update(left, current[:2])
+    ag.update(right, current[2:])
+    assert ag.merge(left['groups']['*']['*'], right['groups']['*']['*']) == fresh['groups']['*']['*']
@@ -13,6 +13,7 @@ app.use(bodyParser.json());
 
 // Database file path
 const DB_PATH = path.join(__dirname, 'database.json');
+const STATS_PATH = path.join(__dirname, 'catalog_stats.json');
 
 // Helper function to read database
 function readDatabase() {
@@ -347,22 +348,46 @@ app.get('/api/pricing/ingredients', (req, res) => {
   }
 });
 
-// GET: Get pricing analytics
+// Helper function to read the aggregates scripts/aggregates.py keeps next to the database
+function readCatalogStats() {
+  try {
+    return JSON.parse(fs.readFileSync(STATS_PATH, 'utf8'));
+  } catch (error) {
+    return null;
+  }
+}
+
+// GET: Get pricing analytics (per serving, from catalog_stats.json)
 app.get('/api/pricing/analytics', (req, res) => {
-  const db = readDatabase();
+  const stats = readCatalogStats();
   const { region = 'manila', profitMargin = 'standard' } = req.query;
+  if (!stats) {
+    return res.status(503).json({ error: 'Catalog statistics not built (run scripts/aggregates.py)' });
+  }
 
   try {
+    const price = stats.groups['*']['*']?.price_per_serving;
+    const categoryAnalysis = {};
+    Object.entries(stats.groups.category || {}).forEach(([category, group]) => {
+      categoryAnalysis[category] = {
+        recipes: group.count,
+        averageCost: group.price_per_serving?.mean ?? null,
+        medianCost: group.price_per_serving?.median ?? null,
+        minCost: group.price_per_serving?.min ?? null,
+        maxCost: group.price_per_serving?.max ?? null
+      };
+    });
     const analytics = {
-      totalRecipes: db.recipes.length,
+      totalRecipes: stats.total,
       pricingAnalysis: {
-        averageCost: 150,
-        medianCost: 140,
-        minCost: 80,
-        maxCost: 300,
-        costRange: 220
+        basis: 'per_serving',
+        averageCost: price?.mean ?? null,
+        medianCost: price?.median ?? null,
+        minCost: price?.min ?? null,
+        maxCost: price?.max ?? null,
+        costRange: price ? price.max - price.min : null
       },
-      categoryAnalysis: {},
+      categoryAnalysis,
       costDistribution: {
         ingredient: 0.6,
         labor: 0.25,
@@ -3,6 +3,7 @@ const cors = require('cors');
 const fs = require('fs');
 const path = require('path');
 const zlib = require('zlib');
+const crypto = require('crypto');
 
 const app = express();
 const PORT = process.env.PORT || 3000;
@@ -14,12 +15,19 @@ let RECIPE_MAP = {};
 let CATEGORY_MAP = {};
 let MEAL_TYPE_MAP = { main: [], side: [] };
 let PRECOMPILED_CATEGORIES = '';
+let SIMILAR_MAP = {};
+let NUTRIENTS = undefined;
+let SKYLINE = undefined;
+let STATS = undefined;
+let TAGS = null;
+let STATIC = null;
 let CACHE_SIZE = 0;
+const STATIC_DIR = path.join(__dirname, 'static_api');
 
 function loadDatabase() {
   try {
-    const data = fs.readFileSync(path.join(__dirname, 'database.json'), 'utf8');
-    const parsed = JSON.parse(data);
+    const raw = fs.readFileSync(path.join(__dirname, 'database.json'));
+    const parsed = JSON.parse(raw.toString('utf8'));
     DB = parsed.recipes || [];
     CATEGORIES = parsed.categories || [];
     
@@ -46,6 +54,19 @@ function loadDatabase() {
       else sideCount++;
     });
     
+    // id -> neighbor ids, built offline by scripts/similar_index.py
+    try {
+      SIMILAR_MAP = JSON.parse(fs.readFileSync(path.join(__dirname, 'similar_recipes.json'), 'utf8'));
+    } catch (e) {
+      SIMILAR_MAP = {};
+    }
+    NUTRIENTS = undefined;
+    SKYLINE = undefined;
+    STATS = undefined;
+    loadTags();
+    
+    loadStatic(crypto.createHash('sha256').update(raw).digest('hex'));
+    
     CACHE_SIZE = Buffer.byteLength(JSON.stringify(DB));
     PRECOMPILED_CATEGORIES = JSON.stringify({ categories: CATEGORIES });
     
@@ -56,6 +77,56 @@ function loadDatabase() {
   }
 }
 
+// Diet/allergen bitmaps written by scripts/diet_tags.py (bit i = DB[i]);
+// only used when they were built from the recipes loaded above, in this order
+function loadTags() {
+  TAGS = null;
+  try {
+    const t = JSON.parse(fs.readFileSync(path.join(__dirname, 'recipe_tags.json'), 'utf8'));
+    if (t.ids.length !== DB.length || t.ids.some((id, i) => DB[i].idMeal !== id)) {
+      console.log('⚠️ recipe_tags.json is stale, /api/browse disabled (run scripts/diet_tags.py)');
+      return;
+    }
+    const bitmaps = obj => Object.fromEntries(Object.entries(obj).map(([k, v]) => [k, Uint32Array.from(v)]));
+    const all = new Uint32Array(Math.ceil(DB.length / 32)).fill(0xFFFFFFFF);
+    if (DB.length % 32) all[all.length - 1] = (2 ** (DB.length % 32)) - 1;
+    TAGS = { tags: t.tags.map(x => x.id), diets: t.diets, tag: bitmaps(t.bitmaps.tag), category: bitmaps(t.bitmaps.category), all, dietAllowed: {} };
+    for (const [diet, excluded] of Object.entries(t.diets)) {
+      TAGS.dietAllowed[diet] = all.map((w, i) => excluded.reduce((acc, tag) => acc & ~TAGS.tag[tag][i], w));
+    }
+  } catch (e) {
+    TAGS = null;
+  }
+}
+
+function popcount(x) {
+  x -= (x >>> 1) & 0x55555555;
+  x = (x & 0x33333333) + ((x >>> 2) & 0x33333333);
+  return Math.imul((x + (x >>> 4)) & 0x0F0F0F0F, 0x01010101) >>> 24;
+}
+
+// A repeated parameter (?c=a&c=b) arrives as an array; treat anything but a string as absent
+function queryString(v) {
+  return typeof v === 'string' ? v.trim() : '';
+}
+
+// Pre-rendered payloads written by scripts/export_static.py; only used when
+// the manifest was rendered from the exact database.json loaded above
+function loadStatic(sourceHash) {
+  STATIC = null;
+  try {
+    const manifest = JSON.parse(fs.readFileSync(path.join(STATIC_DIR, 'manifest.json'), 'utf8'));
+    if (manifest.source_sha256 !== sourceHash) {
+      console.log('⚠️ static_api/ is stale, serving dynamic responses (run scripts/export_static.py)');
+      return;
+    }
+    STATIC = { routes: manifest.routes, payloads: manifest.payloads, bytes: new Map() };
+    console.log(`📄 ${Object.keys(STATIC.routes).length} pre-rendered routes`);
+  } catch (e) {
+    STATIC = null;
+  }
+}
+
 loadDatabase();
 
 // ⚡ MINIMAL MIDDLEWARE
@@ -84,6 +155,76 @@ const sendJSON = (res, data) => {
   }
 };
 
+// Route key used by the static manifest, mirroring the handlers below
+const staticKey = (req) => {
+  if (req.path === '/api/recipes') {
+    const page = Math.max(1, parseInt(req.query.page, 10) || 1);
+    const limit = Math.min(100, parseInt(req.query.limit, 10) || 20);
+    return `/api/recipes?page=${page}&limit=${limit}`;
+  }
+  if (req.path === '/api/lookup') return `/api/lookup?i=${req.query.i}`;
+  if (req.path === '/api/filter') {
+    return typeof req.query.c === 'string' && req.query.c.trim() ? `/api/filter?c=${req.query.c.trim()}` : null;
+  }
+  if (req.path === '/api/categories' || req.path === '/api/stats') return req.path;
+  const m = /^\/api\/recipes\/([^/]+)$/.exec(req.path);
+  if (m) {
+    try {
+      return `/api/lookup?i=${decodeURIComponent(m[1])}`;
+    } catch (e) {
+      return null;
+    }
+  }
+  return null;
+};
+
+const staticBytes = (digest, encoding) => {
+  const name = `${digest}${encoding}`;
+  let buf = STATIC.bytes.get(name);
+  if (!buf) {
+    const suffix = { identity: '.json', gzip: '.json.gz', br: '.json.br' }[encoding];
+    buf = fs.readFileSync(path.join(STATIC_DIR, digest.slice(0, 2), digest + suffix));
+    STATIC.bytes.set(name, buf);
+  }
+  return buf;
+};
+
+// Serve pre-rendered bytes: no stringify/gzip per request, If-None-Match -> 304
+app.use((req, res, next) => {
+  if (!STATIC || (req.method !== 'GET' && req.method !== 'HEAD')) return next();
+  const key = staticKey(req);
+  const digest = key && STATIC.routes[key];
+  if (!digest) return next();
+  
+  const variants = STATIC.payloads[digest];
+  const accept = req.headers['accept-encoding'] || '';
+  const encoding = variants.br && /\bbr\b/.test(accept) ? 'br'
+    : variants.gzip && accept.includes('gzip') ? 'gzip' : 'identity';
+  
+  res.setHeader('Content-Type', 'application/json');
+  res.setHeader('Vary', 'Accept-Encoding');
+  res.setHeader('ETag', variants[encoding].etag);
+  
+  const inm = req.headers['if-none-match'];
+  if (inm) {
+    const tags = inm.split(',').map(t => t.trim().replace(/^W\//, ''));
+    if (tags.includes('*') || Object.values(variants).some(v => tags.includes(v.etag))) {
+      res.statusCode = 304;
+      return res.end();
+    }
+  }
+  
+  let body;
+  try {
+    body = staticBytes(digest, encoding);
+  } catch (e) {
+    return next();
+  }
+  if (encoding !== 'identity') res.setHeader('Content-Encoding', encoding);
+  res.setHeader('Content-Length', body.length);
+  res.end(req.method === 'HEAD' ? undefined : body);
+});
+
 // ⚡ LIGHTNING FAST ENDPOINTS
 
 // Get paginated recipes WITH MEAL TYPE
@@ -118,6 +259,121 @@ app.get('/api/recipes/:id', (req, res) => {
   });
 });
 
+// ⭐ NEW: Similar recipes (precomputed neighbor table)
+app.get('/api/recipes/:id/similar', (req, res) => {
+  if (!RECIPE_MAP[req.params.id]) return sendJSON(res, { meals: null });
+  
+  const limit = Math.min(10, parseInt(req.query.limit, 10) || 10);
+  const meals = (SIMILAR_MAP[req.params.id] || [])
+    .filter(id => RECIPE_MAP[id])
+    .slice(0, limit)
+    .map(id => {
+      const r = RECIPE_MAP[id];
+      return {
+        idMeal: r.idMeal,
+        strMeal: r.strMeal,
+        strMealThumb: r.strMealThumb,
+        strCategory: r.strCategory,
+        strMealType: r.strMealType || 'main',
+        good_for: r.good_for,
+        price_planned: r.price_planned
+      };
+    });
+  
+  sendJSON(res, { meals: meals.length > 0 ? meals : null });
+});
+
+// Micronutrient totals (scripts/nutrients.py), read on first use: the file
+// grows with every nutrient added and most clients never ask for it
+function nutrientTable() {
+  if (NUTRIENTS === undefined) {
+    try {
+      NUTRIENTS = JSON.parse(fs.readFileSync(path.join(__dirname, 'recipe_nutrients.json'), 'utf8'));
+    } catch (e) {
+      NUTRIENTS = null;
+    }
+  }
+  return NUTRIENTS;
+}
+
+app.get('/api/recipes/:id/nutrients', (req, res) => {
+  const table = nutrientTable();
+  const row = table && RECIPE_MAP[req.params.id] ? table.recipes[req.params.id] : null;
+  if (!row) return sendJSON(res, { nutrients: null });
+  
+  sendJSON(res, {
+    idMeal: req.params.id,
+    servings: row.servings,
+    nutrients: table.nutrients.map((n, j) => ({
+      id: n.id,
+      name: n.name,
+      unit: n.unit,
+      total: row.total[j],
+      per_serving: Math.round(row.total[j] / row.servings * 10) / 10,
+      known_pct: row.known_pct[j]
+    }))
+  });
+});
+
+// Layered price/nutrition frontiers (scripts/skyline.py): per view and category,
+// up to 3 lists sorted by price per serving, so a query is a few slices
+function skylineTable() {
+  if (SKYLINE === undefined) {
+    try {
+      SKYLINE = JSON.parse(fs.readFileSync(path.join(__dirname, 'recipe_skyline.json'), 'utf8'));
+    } catch (e) {
+      SKYLINE = null;
+    }
+  }
+  return SKYLINE;
+}
+
+// e.g. /api/skyline?view=protein_per_peso&c=Pork&layers=2
+//      /api/skyline?view=low_calorie&max_price=50
+app.get('/api/skyline', (req, res) => {
+  const table = skylineTable();
+  if (!table) return sendJSON(res, { error: 'Skyline index not built (run scripts/skyline.py)' });
+  
+  const view = queryString(req.query.view) || 'protein_per_peso';
+  if (!Object.hasOwn(table.frontiers, view)) return sendJSON(res, { error: `Unknown view "${view}"; expected one of ${Object.keys(table.views).join(', ')}` });
+  const category = queryString(req.query.c) || '*';
+  const depth = Math.min(table.layers, Math.max(1, parseInt(req.query.layers, 10) || 1));
+  const maxPrice = parseFloat(req.query.max_price);
+  const maxCalories = parseFloat(req.query.max_calories);
+  
+  const frontier = Object.hasOwn(table.frontiers[view], category) ? table.frontiers[view][category] : [];
+  const layers = frontier.slice(0, depth).map((ids, i) => {
+    let end = ids.length;
+    if (Number.isFinite(maxPrice)) {
+      let lo = 0;
+      while (lo < end) {
+        const mid = (lo + end) >>> 1;
+        if (table.values[ids[mid]][0] <= maxPrice) lo = mid + 1;
+        else end = mid;
+      }
+    }
+    const meals = [];
+    for (let k = 0; k < end; k++) {
+      const v = table.values[ids[k]];
+      const r = RECIPE_MAP[ids[k]];
+      if (!r || (Number.isFinite(maxCalories) && v[1] > maxCalories)) continue;
+      meals.push({
+        idMeal: r.idMeal,
+        strMeal: r.strMeal,
+        strMealThumb: r.strMealThumb,
+        strCategory: r.strCategory,
+        price_per_serving: v[0],
+        calories_per_serving: v[1],
+        protein_per_serving: v[2],
+        fat_per_serving: v[3]
+      });
+    }
+    return { layer: i + 1, meals };
+  });
+  
+  sendJSON(res, { view, objectives: table.views[view], category, layers });
+});
+
 // Legacy lookup
 app.get('/api/lookup', (req, res) => {
   const recipe = RECIPE_MAP[req.query.i];
@@ -165,6 +421,58 @@ app.get('/api/filter', (req, res) => {
   sendJSON(res, { meals: meals.length > 0 ? meals : null });
 });
 
+// Faceted browsing over the precomputed tag bitmaps, e.g.
+// /api/browse?c=Vegetable&diet=vegetarian&include=coconut&exclude=pork,shellfish
+app.get('/api/browse', (req, res) => {
+  if (!TAGS) return sendJSON(res, { error: 'Tag index not built (run scripts/diet_tags.py)' });
+  
+  const list = v => (typeof v === 'string' ? v.split(',').map(s => s.trim()).filter(Boolean) : []);
+  const include = list(req.query.include);
+  const exclude = list(req.query.exclude);
+  const diets = list(req.query.diet);
+  const unknownDiet = diets.find(d => !Object.hasOwn(TAGS.diets, d));
+  if (unknownDiet) return sendJSON(res, { error: `Unknown diet "${unknownDiet}"; expected one of ${Object.keys(TAGS.diets).join(', ')}` });
+  const unknownTag = [...include, ...exclude].find(t => !Object.hasOwn(TAGS.tag, t));
+  if (unknownTag) return sendJSON(res, { error: `Unknown tag "${unknownTag}"; expected one of ${TAGS.tags.join(', ')}` });
+  
+  const category = queryString(req.query.c);
+  const sel = category ? Uint32Array.from(Object.hasOwn(TAGS.category, category) ? TAGS.category[category] : new Uint32Array(TAGS.all.length)) : TAGS.all.slice();
+  for (let w = 0; w < sel.length; w++) {
+    for (const t of include) sel[w] &= TAGS.tag[t][w];
+    for (const t of exclude) sel[w] &= ~TAGS.tag[t][w];
+    for (const d of diets) sel[w] &= TAGS.dietAllowed[d][w];
+  }
+  
+  const count = bm => {
+    let n = 0;
+    for (let w = 0; w < sel.length; w++) n += popcount(sel[w] & bm[w]);
+    return n;
+  };
+  const facets = { categories: {}, tags: {}, diets: {} };
+  for (const [cat, bm] of Object.entries(TAGS.category)) facets.categories[cat] = count(bm);
+  for (const t of TAGS.tags) facets.tags[t] = count(TAGS.tag[t]);
+  for (const d of Object.keys(TAGS.diets)) facets.diets[d] = count(TAGS.dietAllowed[d]);
+  
+  const limit = Math.min(100, parseInt(req.query.limit, 10) || 100);
+  const meals = [];
+  for (let w = 0; w < sel.length && meals.length < limit; w++) {
+    for (let bits = sel[w]; bits && meals.length < limit; bits &= bits - 1) {
+      const r = DB[w * 32 + 31 - Math.clz32(bits & -bits)];
+      meals.push({
+        idMeal: r.idMeal,
+        strMeal: r.strMeal,
+        strMealThumb: r.strMealThumb,
+        strCategory: r.strCategory,
+        strMealType: r.strMealType || 'main',
+        good_for: r.good_for,
+        price_planned: r.price_planned
+      });
+    }
+  }
+  
+  sendJSON(res, { count: count(TAGS.all), meals: meals.length > 0 ? meals : null, facets });
+});
+
 // ⭐ NEW: Filter by meal type (main or side)
 app.get('/api/bytype/:type', (req, res) => {
   const mealType = (req.params.type || '').toLowerCase().trim();
@@ -205,6 +513,34 @@ app.get('/api/stats', (req, res) => {
   });
 });
 
+// Per category/area/meal type aggregates kept up to date by scripts/aggregates.py
+// (catalog_stats.json): count, min/mean/median/max price and calories per serving
+// and nutrient histograms, read as they are instead of scanning the recipes
+function statsTable() {
+  if (STATS === undefined) {
+    try {
+      STATS = JSON.parse(fs.readFileSync(path.join(__dirname, 'catalog_stats.json'), 'utf8'));
+    } catch (e) {
+      STATS = null;
+    }
+  }
+  return STATS;
+}
+
+// e.g. /api/stats/aggregates?by=category&v=Pork
+//      /api/stats/aggregates?by=meal_type
+app.get('/api/stats/aggregates', (req, res) => {
+  const table = statsTable();
+  if (!table) return sendJSON(res, { error: 'Catalog statistics not built (run scripts/aggregates.py)' });
+  
+  const by = queryString(req.query.by) || '*';
+  const groups = Object.hasOwn(table.groups, by) ? table.groups[by] : null;
+  if (!groups) return sendJSON(res, { error: `Unknown grouping "${by}"; expected one of ${Object.keys(table.groups).join(', ')}` });
+  const value = queryString(req.query.v);
+  if (value) return sendJSON(res, { by, value, bins: table.bins, stats: Object.hasOwn(groups, value) ? groups[value] : null });
+  sendJSON(res, { by, total: table.total, bins: table.bins, groups });
+});
+
 // Get categories (pre-compiled for max speed)
 app.get('/api/categories', (req, res) => {
   res.setHeader('Content-Type', 'application/json');